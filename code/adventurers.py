@@ -1,8 +1,13 @@
-from collections import deque
+import weakref
+from board import *
+from logs import *
+from zobrist import *
 
 class Adventurer:
     """
     The Adventurer class represents a player in the Forbidden Desert game.
+    It only holds a weak reference to the game, game_ref, so that the game and its adventurers do not keep
+    each other alive: the methods look the game up once, and hand it on to the tiles they change.
     Attributes:
         name (str): The name of the adventurer, indicating the role (e.g., 'archeologist', 'navigator').
         symbol (str): A unique symbol representing the adventurer on the board.
@@ -13,20 +18,43 @@ class Adventurer:
         __str__(): Returns a string representation of the adventurer's current state.
         move(move): Moves the adventurer to a new tile on the board, based on the provided (x, y) offsets.
         get_water(): Increases the adventurer's water level by 1, not exceeding the maximum.
-        lose_water(): Decreases the adventurer's water level by 1, not falling below zero.
+        lose_water(): Decreases the adventurer's water level by 1, not falling below zero. Ends the game if it runs out.
         give_water(other_adventurer): Transfers 1 water unit to another adventurer if possible.
+        get_state(): Returns the mutable state of the adventurer as a tuple, see Game.snapshot.
+        set_state(state): Restores a state returned by get_state.
+        reset(tile): Brings the adventurer back to the start of a game, on the given tile, see Game.reset.
+        zobrist_key(): The part of the game's Zobrist key that comes from the adventurer, see Game.position_key.
     """
 
+    # Neighbouring cells the adventurer can move to, and clear sand from. See board.py
+    move_steps = ORTHOGONAL_STEPS
+    sand_neighbours = ORTHOGONAL
+    sand_masks = ORTHOGONAL_MASKS
+
+    __slots__ = (
+        "name",
+        "symbol",
+        "tile",
+        "game_ref",
+        "water",
+        "max_water",
+        "inventory",
+        "boat_parts",
+        "solar_shield_active",
+        "index",
+    )
+
     def __init__(self, name, symbol, tile, game, water):
         self.name = name
         self.symbol = symbol
         self.tile = tile  # Current tile where the adventurer is standing
-        self.game = game
+        self.game_ref = weakref.ref(game)
         self.water = water
         self.max_water = water  # Maximum water they can carry
         self.inventory = []
         self.boat_parts = []
         self.solar_shield_active = False
+        self.index = None  # Position in Game.adventurer_list
 
     def __str__(self):
         return f"{self.name} ({self.symbol}) at {self.tile.name}. {self.water} water left. Inventory: {self.inventory}"
@@ -34,11 +62,46 @@ class Adventurer:
     def __repr__(self):
         return f"{self.name}"
 
+    def get_state(self):
+        return (
+            self.tile.index,
+            self.water,
+            tuple(item.index for item in self.inventory),
+            tuple(self.boat_parts),
+            self.solar_shield_active,
+        )
+
+    def set_state(self, state):
+        game = self.game_ref()
+        tile, self.water, inventory, boat_parts, self.solar_shield_active = state
+        self.tile = game.tile_list[tile]
+        self.inventory = [game.gear_deck.cards[index] for index in inventory]
+        self.boat_parts = list(boat_parts)
+
+    def reset(self, tile):
+        self.tile = tile
+        self.water = self.max_water
+        self.inventory.clear()
+        self.boat_parts.clear()
+        self.solar_shield_active = False
+
+    def zobrist_key(self):
+        index = self.index
+        key = ADVENTURER_TILE_KEYS[index][self.tile.index] ^ WATER_KEYS[index][self.water & 15]
+        for item in self.inventory:
+            key ^= ITEM_KEYS[index][item.index]
+        for part in self.boat_parts:
+            key ^= PART_HELD_KEYS[index][PART_KEY_INDEX[part]]
+        if self.solar_shield_active:
+            key ^= SHIELD_KEYS[index]
+        return key
+
     def can_flip(self):
         return not self.tile.flipped and self.tile.sand == 0
 
     def flip(self):
-        self.tile.flip(self)
+        game = self.game_ref()
+        self.tile.flip(game, self)
 
     def available_sand(self):
         if self.tile.blocked:
@@ -49,24 +112,14 @@ class Adventurer:
         if self.tile.sand > 0:
             accessible_tiles = [self.tile]
 
-        current_x, current_y = self.tile.x_coordinate, self.tile.y_coordinate
-
-        directions = [(-1, 0), (1, 0), (0, 1), (0, -1)]
-
-        for dx, dy in directions:
-            new_x, new_y = current_x + dx, current_y + dy
-
-            # Check if the new coordinates are within the board boundaries
-            if 0 <= new_x <= 4 and 0 <= new_y <= 4:
-                adjacent_tile = self.game.coordinate_to_tile.get((new_x, new_y))
-
-                # Check if the adjacent tile is not the storm tile
-                if (
-                    adjacent_tile
-                    and adjacent_tile.name != "storm"
-                    and adjacent_tile.sand > 0
-                ):
-                    accessible_tiles.append(adjacent_tile)
+        # Neighbouring cells with sand, the storm's excepted
+        game = self.game_ref()
+        cell = self.tile.cell
+        sandy = game.sand_board & ~game.storm_board & self.sand_masks[cell]
+        if sandy:
+            for adjacent_cell in self.sand_neighbours[cell]:
+                if sandy >> adjacent_cell & 1:
+                    accessible_tiles.append(game.cell_to_tile[adjacent_cell])
 
         return accessible_tiles
 
@@ -74,71 +127,87 @@ class Adventurer:
         if self.tile.blocked:
             return []
 
-        valid_moves = []
-        current_x, current_y = self.tile.x_coordinate, self.tile.y_coordinate
+        closed = self.closed_cells()
+        return [direction for direction, cell in self.move_steps[self.tile.cell] if not closed >> cell & 1]
 
-        directions = [(-1, 0), (1, 0), (0, 1), (0, -1)]
-
-        for dx, dy in directions:
-            new_x, new_y = current_x + dx, current_y + dy
-
-            # Check if the new coordinates are within board boundaries and not a storm tile
-            if 0 <= new_x <= 4 and 0 <= new_y <= 4:
-                adjacent_tile = self.game.coordinate_to_tile.get((new_x, new_y))
-
-                if (
-                    adjacent_tile
-                    and adjacent_tile.name != "storm"
-                    and not adjacent_tile.blocked
-                ):
-                    valid_moves.append((dx, dy))
-
-        return valid_moves
+    def closed_cells(self):
+        # Bitboard of the cells the adventurer cannot move onto, nor away from
+        game = self.game_ref()
+        return game.blocked_board | game.storm_board
 
     def move(self, move_direction):
+        game = self.game_ref()
         if move_direction in self.available_moves():
             dx, dy = move_direction
-            current_x, current_y = self.tile.x_coordinate, self.tile.y_coordinate
-
-            new_x, new_y = current_x + dx, current_y + dy
-            new_tile = self.game.coordinate_to_tile[(new_x, new_y)]
+            new_tile = game.cell_to_tile[self.tile.cell + cell_of(dx, dy)]
 
             # Update the current tile and the adventurer's position
-            self.tile.remove_adventurer(self)
-            new_tile.add_adventurer(self)
+            game.touch(self)
+            self.tile.remove_adventurer(game, self)
+            new_tile.add_adventurer(game, self)
             self.tile = new_tile
         else:
             raise ValueError("Invalid move.")
 
     def use_tunnel (self, tunnel):
         # Update the current tile and the adventurer's position
-        self.tile.remove_adventurer(self)
-        tunnel.add_adventurer(self)
+        game = self.game_ref()
+        game.touch(self)
+        self.tile.remove_adventurer(game, self)
+        tunnel.add_adventurer(game, self)
         self.tile = tunnel
 
     def get_water(self):
+        game = self.game_ref()
+        game.touch(self)
         self.water += 1
-        if self.water > 5:
+        if self.water == 1:
+            game.dry_adventurers -= 1
+        elif self.water > 5:
             self.water = 5
 
     def lose_water(self):
+        game = self.game_ref()
+        game.touch(self)
         self.water -= 1
-        if self.water < 0:
+        if self.water == 0:
+            game.dry_adventurers += 1
+            # Only the storm cards call this, so the game is lost right here, in the middle of the draw, as
+            # Deck.amount_to_draw does for the storm level. Game.check_game_status covers give_water
+            if not game.is_game_over:
+                game.is_game_over = True
+                game.outcome = "water"
+                if game.log_level >= LOG_OUTCOME:
+                    game.log_file.write(f"Game over. {self.name} has run out of water.\n\n")
+        elif self.water < 0:
             self.water = 0
 
     def give_water(self, other_adventurer):
+        game = self.game_ref()
+        game.touch(self)
+        game.touch(other_adventurer)
         self.water -= 1
+        if self.water == 0:
+            game.dry_adventurers += 1
         other_adventurer.water += 1
+        if other_adventurer.water == 1:
+            game.dry_adventurers -= 1
 
     def give_item(self, other_adventurer, item):
+        game = self.game_ref()
+        game.touch(self)
+        game.touch(other_adventurer)
         self.inventory.remove(item)
         other_adventurer.inventory.append(item)
 
     def clear_sand(self, tile_to_clear):
+        game = self.game_ref()
         if tile_to_clear in self.available_sand():
-            tile_to_clear.remove_sand()
+            tile_to_clear.remove_sand(game)
 
     def get_item(self, gear_card):
+        game = self.game_ref()
+        game.touch(self)
         self.inventory.append(gear_card)
 
     def available_items(self):
@@ -148,203 +217,167 @@ class Adventurer:
         pass
 
     def pick_part(self, part):
+        game = self.game_ref()
+        game.touch(self)
+        game.touch(self.tile)
         self.tile.boat_parts.remove(part)
         self.boat_parts.append(part)
 
     def available_tiles(self):
-        available_tiles = []
-        for tile in self.game.tiles.values():
-            if tile.blocked == False and tile.name != "storm":
-                available_tiles.append(tile)
-        return available_tiles
+        game = self.game_ref()
+        closed = game.blocked_board | game.storm_board
+        return [tile for tile in game.tile_list if not closed >> tile.cell & 1]
 
     def use_jetpack(self, landing_tile):
-        self.tile.remove_adventurer(self)
-        landing_tile.add_adventurer(self)
+        game = self.game_ref()
+        game.touch(self)
+        self.tile.remove_adventurer(game, self)
+        landing_tile.add_adventurer(game, self)
         self.tile = landing_tile
 
     def activate_solar_shield(self):
+        game = self.game_ref()
+        game.touch(self)
         self.solar_shield_active = True
     
     def deactivate_solar_shield(self):
+        game = self.game_ref()
+        game.touch(self)
         self.solar_shield_active = False
 
 
 class Archeologist(Adventurer):
+    __slots__ = ()
+
     def __init__(self, name, symbol, tile, game, water):
         super().__init__(name, symbol, tile, game, water)
 
     def ability(self, tile_to_clear):
+        game = self.game_ref()
         if tile_to_clear in self.available_sand():
-            tile_to_clear.remove_sand()
-            tile_to_clear.remove_sand()
+            tile_to_clear.remove_sand(game)
+            tile_to_clear.remove_sand(game)
 
 
 class Climber(Adventurer):
+    __slots__ = ("carrying",)
+
     def __init__(self, name, symbol, tile, game, water):
         super().__init__(name, symbol, tile, game, water)
         self.carrying = None # Track the adventurer being carried
     
+    def get_state(self):
+        carrying = self.carrying.index if self.carrying else None
+        return super().get_state() + (carrying,)
+
+    def set_state(self, state):
+        game = self.game_ref()
+        super().set_state(state[:-1])
+        carrying = state[-1]
+        self.carrying = game.adventurer_list[carrying] if carrying is not None else None
+
+    def reset(self, tile):
+        super().reset(tile)
+        self.carrying = None
+
+    def zobrist_key(self):
+        key = super().zobrist_key()
+        if self.carrying:
+            key ^= CARRYING_KEYS[self.carrying.index]
+        return key
+
     def pick_up_adventurer(self, adventurer_to_pick):
+        game = self.game_ref()
+        game.touch(self)
         self.carrying = adventurer_to_pick
     
     def drop_off_adventurer(self):
+        game = self.game_ref()
+        game.touch(self)
         self.carrying = None
 
     def available_moves(self):
-        valid_moves = []
-        current_x, current_y = self.tile.x_coordinate, self.tile.y_coordinate
-
-        directions = [(-1, 0), (1, 0), (0, 1), (0, -1)]
-
-        for dx, dy in directions:
-            new_x, new_y = current_x + dx, current_y + dy
-
-            # Check if the new coordinates are within board boundaries and not a storm tile
-            if 0 <= new_x <= 4 and 0 <= new_y <= 4:
-                adjacent_tile = self.game.coordinate_to_tile.get((new_x, new_y))
-
-                if (
-                    adjacent_tile
-                    and adjacent_tile.name != "storm"
-                ):
-                    valid_moves.append((dx, dy))
+        closed = self.closed_cells()
+        return [direction for direction, cell in self.move_steps[self.tile.cell] if not closed >> cell & 1]
 
-        return valid_moves
+    def closed_cells(self):
+        # The climber can move onto and away from blocked tiles
+        game = self.game_ref()
+        return game.storm_board
     
     def move(self, move_direction):
+        game = self.game_ref()
         dx, dy = move_direction
-        current_x, current_y = self.tile.x_coordinate, self.tile.y_coordinate
+        new_tile = game.cell_to_tile[self.tile.cell + cell_of(dx, dy)]
 
-        new_x, new_y = current_x + dx, current_y + dy
-        new_tile = self.game.coordinate_to_tile[(new_x, new_y)]
-
-        self.tile.remove_adventurer(self)
-        new_tile.add_adventurer(self)
+        game.touch(self)
+        self.tile.remove_adventurer(game, self)
+        new_tile.add_adventurer(game, self)
         self.tile = new_tile
 
         # If carrying another adventurer, update their position too
         if self.carrying:
-            self.carrying.tile.remove_adventurer(self.carrying)
-            new_tile.add_adventurer(self.carrying)
+            game.touch(self.carrying)
+            self.carrying.tile.remove_adventurer(game, self.carrying)
+            new_tile.add_adventurer(game, self.carrying)
             self.carrying.tile = new_tile
             self.drop_off_adventurer
 
     def use_tunnel (self, tunnel):
         # Update the current tile and the adventurer's position
-        self.tile.remove_adventurer(self)
-        tunnel.add_adventurer(self)
+        game = self.game_ref()
+        game.touch(self)
+        self.tile.remove_adventurer(game, self)
+        tunnel.add_adventurer(game, self)
         self.tile = tunnel
 
         # If carrying another adventurer, update their position too
         if self.carrying:
-            self.carrying.tile.remove_adventurer(self.carrying)
-            tunnel.add_adventurer(self.carrying)
+            game.touch(self.carrying)
+            self.carrying.tile.remove_adventurer(game, self.carrying)
+            tunnel.add_adventurer(game, self.carrying)
             self.carrying.tile = tunnel
             self.drop_off_adventurer
 
 
 class Explorer(Adventurer):
-    def __init__(self, name, symbol, tile, game, water):
-        super().__init__(name, symbol, tile, game, water)
-
-    def available_moves(self):
-        if self.tile.blocked:
-            return []
+    # The explorer moves and clears sand diagonally too (dune blasters included)
+    move_steps = ALL_STEPS
+    sand_neighbours = ALL_NEIGHBOURS
+    sand_masks = ALL_NEIGHBOUR_MASKS
 
-        valid_moves = []
-        current_x, current_y = self.tile.x_coordinate, self.tile.y_coordinate
-
-        # Explorer can move diagonally
-        directions = [
-            (-1, 0),
-            (1, 0),
-            (0, 1),
-            (0, -1),
-            (1, 1),
-            (1, -1),
-            (-1, 1),
-            (-1, -1),
-        ]
-
-        for dx, dy in directions:
-            new_x, new_y = current_x + dx, current_y + dy
-
-            # Check if the new coordinates are within board boundaries and not a storm tile
-            if 0 <= new_x <= 4 and 0 <= new_y <= 4:
-                adjacent_tile = self.game.coordinate_to_tile.get((new_x, new_y))
-
-                if (
-                    adjacent_tile
-                    and adjacent_tile.name != "storm"
-                    and not adjacent_tile.blocked
-                ):
-                    valid_moves.append((dx, dy))
-
-        return valid_moves
+    __slots__ = ()
 
-    def available_sand(self):
-        if self.tile.blocked:
-            return [self.tile]
-
-        accessible_tiles = []
-
-        if self.tile.sand > 0:
-            accessible_tiles = [self.tile]
-
-        current_x, current_y = self.tile.x_coordinate, self.tile.y_coordinate
-
-        # Climber can remove sand diagonally (including duneblaser.)
-        directions = [
-            (-1, 0),
-            (1, 0),
-            (0, 1),
-            (0, -1),
-            (1, 1),
-            (1, -1),
-            (-1, 1),
-            (-1, -1),
-        ]
-
-        for dx, dy in directions:
-            new_x, new_y = current_x + dx, current_y + dy
-
-            # Check if the new coordinates are within the board boundaries
-            if 0 <= new_x <= 4 and 0 <= new_y <= 4:
-                adjacent_tile = self.game.coordinate_to_tile.get((new_x, new_y))
-
-                # Check if the adjacent tile is not the storm tile
-                if (
-                    adjacent_tile
-                    and adjacent_tile.name != "storm"
-                    and adjacent_tile.sand > 0
-                ):
-                    accessible_tiles.append(adjacent_tile)
-
-        return accessible_tiles
+    def __init__(self, name, symbol, tile, game, water):
+        super().__init__(name, symbol, tile, game, water)
 
 
 class Meteorologist(Adventurer):
+    __slots__ = ()
+
     def __init__(self, name, symbol, tile, game, water):
         super().__init__(name, symbol, tile, game, water)
     
     def mitigate(self):
-        self.game.deck.mitigated += 1
+        game = self.game_ref()
+        game.touch(game.deck)
+        game.deck.mitigated += 1
 
     def peek_deck(self):
         """ 
         Peek at the number of cards equal to the current storm level, 
         or the number of cards left on the deck, whichever smaller.
         """
-        self.game.deck.amount_to_draw()
+        game = self.game_ref()
+        game.deck.amount_to_draw()
 
-        amount_to_peek = min(len(self.game.deck.deck), self.game.deck.amount)
-        peeked_cards = self.game.deck.deck[-amount_to_peek:]
+        amount_to_peek = min(len(game.deck.deck), game.deck.amount)
+        peeked_cards = game.deck.deck[-amount_to_peek:]
         return peeked_cards  # Returns n top cards without actually removing them from the deck
 
     def possible_choices(self):
         """
-        Returns peeked cards + no card for the AI to choose.
+        Returns peeked cards (by index in Deck.cards) + no card for the AI to choose.
         """
         peeked_cards = self.peek_deck()
         possible_choices = peeked_cards + [None] # Add None as an option to represent choosing no card
@@ -355,88 +388,82 @@ class Meteorologist(Adventurer):
         Places specified card at the bottom of the deck.
         If no card is chosen, no action is taken.
         """
-        if card:
-            self.game.deck.deck.remove(card)
-            self.game.deck.deck.insert(0, card)
+        game = self.game_ref()
+        if card is not None:
+            game.touch(game.deck)
+            game.deck.deck.remove(card)
+            game.deck.deck.insert(0, card)
 
 class Navigator(Adventurer):
+    __slots__ = ()
+
     def __init__(self, name, symbol, tile, game, water):
         super().__init__(name, symbol, tile, game, water)
 
     def bfs_other_adventurer_available_paths(self, adventurer):
-        # Navigator can move up to 3 tiles another adventurer
-        max_length = 3
-        initial_position = adventurer.tile
-
-        # Stores as key the tiles visited, and as value the list of moves needed to get there
-        visited_squares = {initial_position: []}
-        available_paths = {}
-        queue = deque([(initial_position, [])])
-
-        while queue:
-            current_tile, path = queue.popleft()
-            path_length = len(path)
-
-            if path_length >= max_length:
-                continue
-
-            # Generate available moves from the current tile
-            for move in self.available_moves_in_remote_tile(adventurer, path):
-                new_tile = self.calculate_new_tile(current_tile, move)
-                if new_tile not in visited_squares:
-                    # Add the new tile to the visited squares with the path taken to get there
-                    visited_squares[new_tile] = path + [move]
-                    queue.append((new_tile, path + [move]))
-                    available_paths[new_tile] = path + [move]
-        
-        # Visited squares contains the available paths that can move the aventurer up to 3 tiles
-        if available_paths:
-            return available_paths
+        """
+        Returns, for every tile the navigator can move the adventurer to (up to 3 tiles, moving the way
+        that adventurer moves), the list of moves of a shortest path there. None if there is none.
+        """
+        game = self.game_ref()
+        paths = reachable(adventurer.tile.cell, adventurer.move_steps, adventurer.closed_cells())
+        if paths:
+            cell_to_tile = game.cell_to_tile
+            return {cell_to_tile[cell]: path for cell, path in paths}
         return None
 
-    def available_moves_in_remote_tile(self, adventurer, path):
-        # Save the original position
-        original_tile = adventurer.tile
-
-        # Temporarily move the adventurer along the path
-        for move in path:
-            dx, dy = move
-            new_x = adventurer.tile.x_coordinate + dx
-            new_y = adventurer.tile.y_coordinate + dy
-            adventurer.tile = self.game.coordinate_to_tile[(new_x, new_y)]
-
-        # Now that the adventurer is "at" the end of the path, calculate available moves
-        available_moves = adventurer.available_moves()
-
-        # Reset the adventurer's position to the original tile
-        adventurer.tile = original_tile
-
-        return available_moves
+    def all_available_paths(self):
+        """
+        bfs_other_adventurer_available_paths for every other adventurer, in one pass: adventurers that
+        move the same way from the same tile share their search.
+        """
+        game = self.game_ref()
+        searches = {}
+        all_paths = []
+        for adventurer in game.adventurer_list:
+            if adventurer != self:
+                key = (id(adventurer.move_steps), adventurer.tile.cell, adventurer.closed_cells())
+                if key not in searches:
+                    searches[key] = self.bfs_other_adventurer_available_paths(adventurer)
+                all_paths.append((adventurer, searches[key]))
+        return all_paths
 
     def calculate_new_tile(self, current_tile, move):
+        game = self.game_ref()
         dx, dy = move
-        current_x, current_y = current_tile.x_coordinate, current_tile.y_coordinate
-
-        new_x, new_y = current_x + dx, current_y + dy
-        new_tile = self.game.coordinate_to_tile[(new_x, new_y)]
-
-        return new_tile
+        return game.cell_to_tile[current_tile.cell + cell_of(dx, dy)]
 
     def ability(self, other_adventurer, move):
-        x_move, y_move = move
+        game = self.game_ref()
+        new_tile = self.calculate_new_tile(other_adventurer.tile, move)
 
-        new_x = other_adventurer.tile.x_coordinate + x_move
-        new_y = other_adventurer.tile.y_coordinate + y_move
-
-        other_adventurer.tile.remove_adventurer(other_adventurer)
-        other_adventurer.tile = self.game.coordinate_to_tile[(new_x, new_y)]
-        other_adventurer.tile.add_adventurer(other_adventurer)
+        game.touch(other_adventurer)
+        other_adventurer.tile.remove_adventurer(game, other_adventurer)
+        other_adventurer.tile = new_tile
+        other_adventurer.tile.add_adventurer(game, other_adventurer)
 
 
 class WaterCarrier(Adventurer):
+    __slots__ = ()
+
     def __init__(self, name, symbol, tile, game, water):
         super().__init__(name, symbol, tile, game, water)
 
     def ability(self):
         self.get_water()
         self.get_water()
+
+
+
+"""
+The adventurers of a game, in the order of Game.adventurer_list: (key in Game.adventurers, class, symbol,
+water they start with and can carry at most). See Game.create_adventurers.
+"""
+ADVENTURER_TEMPLATES = (
+    ("archeologist", Archeologist, "A", 3),
+    ("climber", Climber, "C", 3),
+    ("explorer", Explorer, "E", 4),
+    ("meteorologist", Meteorologist, "M", 4),
+    ("navigator", Navigator, "N", 4),
+    ("water_carrier", WaterCarrier, "WC", 5),
+)
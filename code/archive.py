@@ -0,0 +1,138 @@
+import glob
+import queue
+import struct
+import sys
+import threading
+import zlib
+
+
+"""
+A log archive holds the logs of many games in a few shard files, instead of one file per game. Game i goes to
+shard i % shards. Each shard is a pair of append-only files:
+    {path}_{shard}.dat: The logs, one after the other, each compressed on its own (zlib).
+    {path}_{shard}.idx: One INDEX_ENTRY per log: game number, offset in the .dat file and compressed length.
+An index entry is only written once its log is, so an archive cut short by a crash only loses the last logs.
+"""
+INDEX_ENTRY = struct.Struct("<QQI")
+SHARDS = 4
+BATCH = 64  # Logs written at once, at most
+
+
+class ArchiveWriter:
+    """
+    The ArchiveWriter class appends game logs to an archive from a background thread, so that compressing and
+    writing them never holds up the games. Logs are queued by put() and written in batches. The queue is
+    bounded: if the disk cannot keep up, put() waits, rather than logs piling up in memory.
+    Attributes:
+        path (str): The path of the archive, without the shard suffix.
+        shards (int): The number of shards.
+
+    Methods:
+        put(game, text): Queues the log of a game.
+        close(): Writes what is left and closes the archive. Raises any error the writer ran into.
+    """
+
+    def __init__(self, path, shards=SHARDS, level=6):
+        self.path = path
+        self.shards = shards
+        self.level = level
+        self.queue = queue.Queue(maxsize=4 * BATCH)
+        self.error = None
+        self.files = [
+            (open(f"{path}_{shard}.dat", "ab"), open(f"{path}_{shard}.idx", "ab")) for shard in range(shards)
+        ]
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def put(self, game, text):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((game, text))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        for data_file, index_file in self.files:
+            data_file.close()
+            index_file.close()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        done = False
+        while not done:
+            batch = [self.queue.get()]
+            while len(batch) < BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            if self.error is None:
+                try:
+                    self.write(batch)
+                except Exception as e:
+                    self.error = e  # Raised by the next put() or by close()
+
+    def write(self, batch):
+        written = set()
+        for game, text in batch:
+            data_file, index_file = self.files[game % self.shards]
+            data = zlib.compress(text.encode(), self.level)
+            offset = data_file.tell()
+            data_file.write(data)
+            index_file.write(INDEX_ENTRY.pack(game, offset, len(data)))
+            written.add(game % self.shards)
+
+        # The logs reach the disk before their index entries
+        for shard in written:
+            data_file, index_file = self.files[shard]
+            data_file.flush()
+            index_file.flush()
+
+
+class LogArchive:
+    """
+    The LogArchive class reads the logs of an archive written by ArchiveWriter, by game number.
+    Attributes:
+        path (str): The path of the archive, without the shard suffix.
+        index (dict): The (shard, offset, length) of every game's log.
+
+    Methods:
+        read(game): Returns the log of a game.
+        games(): The numbers of the games in the archive, in order.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = {}
+        for index_path in glob.glob(f"{glob.escape(path)}_*.idx"):
+            shard = int(index_path[len(path) + 1:-len(".idx")])
+            with open(index_path, "rb") as index_file:
+                entries = index_file.read()
+            # A truncated last entry is left out
+            for position in range(0, len(entries) - INDEX_ENTRY.size + 1, INDEX_ENTRY.size):
+                game, offset, length = INDEX_ENTRY.unpack_from(entries, position)
+                self.index[game] = (shard, offset, length)
+
+    def games(self):
+        return sorted(self.index)
+
+    def read(self, game):
+        if game not in self.index:
+            raise KeyError(f"Game {game} is not in the archive {self.path}")
+        shard, offset, length = self.index[game]
+        with open(f"{self.path}_{shard}.dat", "rb") as data_file:
+            data_file.seek(offset)
+            return zlib.decompress(data_file.read(length)).decode()
+
+
+if __name__ == "__main__":
+    # Prints the log of a game from an archive
+    if len(sys.argv) < 3:
+        print("Usage: python archive.py <archive> <game>")
+        sys.exit(1)
+
+    sys.stdout.write(LogArchive(sys.argv[1]).read(int(sys.argv[2])))
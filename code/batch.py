@@ -0,0 +1,90 @@
+from array import array
+from state import *
+
+
+"""
+What a model sees of each game: sand, flipped and tile per cell, then position and water per adventurer,
+then the storm level. Slices (start, end) of the state vector, in order.
+"""
+OBSERVED = [(SAND, TILE + CELLS), (POSITION, WATER_LEFT + ADVENTURERS), (STORM_LEVEL, STORM_LEVEL + 1)]
+OBSERVATION_SIZE = sum(end - start for start, end in OBSERVED)
+
+
+def write_observation(s, observations, position=0):
+    """
+    Copies the observation of a game into the observations array, from the given position on.
+    """
+    for start, end in OBSERVED:
+        observations[position:position + end - start] = array("b", s[start:end])
+        position += end - start
+
+
+class BatchGame:
+    """
+    The BatchGame class plays many compact games (see state.py) in lockstep, one action per game at every step.
+    The games are state vectors kept side by side, with their random streams, and only the observations are
+    stacked, into one preallocated array. It is not vectorised: the project has no dependencies, so there are
+    no NumPy arrays to stack the games into, and each step runs the compact rules game by game, with no tiles,
+    adventurers or cards. Most of a step goes into legal_actions, which depends on every game's own position,
+    while the storm draws that could be applied to the whole batch at once take a few percent of it.
+    A game that is over is replaced right away by a new one, so the batch always holds n games in progress.
+    Attributes:
+        n (int): The number of games.
+        seed: The seed of the batch. The k-th game started by the batch is seeded with f"{seed}:{k}".
+        states (list): The state vector of every game.
+        storm_rngs, policy_rngs (list): The storm and policy streams of every game.
+        games_started (int): The number of games started so far.
+        observations (array): n rows of OBSERVATION_SIZE small integers, see observe().
+
+    Methods:
+        legal_actions(): The legal actions of every game, for its current adventurer.
+        step(actions): Performs an action in every game, at random if not given. Returns the outcomes.
+        observe(): Copies the observation of every game into observations, and returns it.
+    """
+
+    def __init__(self, n, seed=None):
+        self.n = n
+        self.seed = new_seed() if seed is None else seed
+        self.states = [None] * n
+        self.storm_rngs = [None] * n
+        self.policy_rngs = [None] * n
+        self.games_started = 0
+        self.observations = array("b", bytes(n * OBSERVATION_SIZE))
+        for i in range(n):
+            self.new_game(i)
+
+    def new_game(self, i):
+        layout_rng, storm_rng, gear_rng, policy_rng = make_rngs(f"{self.seed}:{self.games_started}")
+        s = new_state(layout_rng, storm_rng, gear_rng)
+        start(s, layout_rng)
+        self.states[i] = s
+        self.storm_rngs[i] = storm_rng
+        self.policy_rngs[i] = policy_rng
+        self.games_started += 1
+
+    def legal_actions(self):
+        return [legal_actions(s, current_adventurer(s)) for s in self.states]
+
+    def step(self, actions=None):
+        """
+        Performs actions[i] in game i, or a random legal action if actions is not given.
+        Returns the outcome of every game: PLAYING, or how the game ended if this step ended it.
+        Games that ended have already been replaced by new ones.
+        """
+        outcomes = [PLAYING] * self.n
+        for i, s in enumerate(self.states):
+            policy_rng = self.policy_rngs[i]
+            if actions is None:
+                action = policy_rng.choice(legal_actions(s, current_adventurer(s)))
+            else:
+                action = actions[i]
+            step(s, action, policy_rng, self.storm_rngs[i])
+            if s[OUTCOME]:
+                outcomes[i] = s[OUTCOME]
+                self.new_game(i)
+        return outcomes
+
+    def observe(self):
+        for i, s in enumerate(self.states):
+            write_observation(s, self.observations, i * OBSERVATION_SIZE)
+        return self.observations
@@ -0,0 +1,259 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from game import *
+
+
+"""
+Benchmarks of the simulator's hot paths. Every benchmark plays the same games, from fixed seeds, so two runs
+measure the same work and can be compared (see compare). Results are a flat dictionary from a metric name to
+a number: a cost (time or memory, lower is better) unless the name is listed in HIGHER_IS_BETTER.
+Each benchmark is run at least MIN_REPEATS times, and short ones again until they have run for MIN_SECONDS
+(at most MAX_REPEATS times). A metric is the median of its runs, and the lowest and highest of them are kept as
+its range, to tell a change from noise. Runs of fewer than MIN_GAMES games are too noisy to be compared at all.
+"""
+SEED = "benchmark"
+HIGHER_IS_BETTER = {"games_per_second/log none", "games_per_second/log board"}
+TOLERANCE = 0.2  # Slowdown of the median, as a fraction of the baseline, needed to flag a regression
+MIN_REPEATS = 5
+MAX_REPEATS = 50
+MIN_SECONDS = 2.0
+MIN_GAMES = 100
+
+
+class TimedGame(Game):
+    """
+    A Game that times its action generation, actions and storm draws into the dictionaries of timings
+    (see record), keyed by metric name.
+    """
+
+    def __init__(self, timings, *args, **kwargs):
+        self.timings = timings
+        super().__init__(*args, **kwargs)
+        draw = self.deck.draw
+
+        def timed_draw():
+            level = self.sand_storm_level
+            began = time.perf_counter_ns()
+            drawn_cards = draw()
+            record(self.timings, f"draw_us/storm level {min(level, 16)}", time.perf_counter_ns() - began)
+            return drawn_cards
+
+        self.deck.draw = timed_draw
+
+    def get_possible_actions(self, current_adventurer):
+        began = time.perf_counter_ns()
+        possible_actions = super().get_possible_actions(current_adventurer)
+        record(self.timings, f"possible_actions_us/round {min(self.round, 4)}", time.perf_counter_ns() - began)
+        return possible_actions
+
+    def perform_action(self, adventurer, chosen_action):
+        began = time.perf_counter_ns()
+        super().perform_action(adventurer, chosen_action)
+        record(self.timings, f"perform_action_us/{chosen_action[0]}", time.perf_counter_ns() - began)
+
+
+def record(timings, name, nanoseconds):
+    total, count = timings.get(name, (0, 0))
+    timings[name] = (total + nanoseconds, count + 1)
+
+
+def averages(timings):
+    # Average of every timing, in microseconds
+    return {name: total / count / 1000 for name, (total, count) in timings.items()}
+
+
+def bench_setup(num_games):
+    results = {}
+    began = time.perf_counter_ns()
+    games = [Game(seed=f"{SEED}:{i}", setup=False) for i in range(num_games)]
+    results["init_us"] = (time.perf_counter_ns() - began) / num_games / 1000
+
+    began = time.perf_counter_ns()
+    for game in games:
+        game.setup()
+    results["setup_us"] = (time.perf_counter_ns() - began) / num_games / 1000
+
+    # A new game from a finished one, see Game.reset
+    game = games[0]
+    began = time.perf_counter_ns()
+    for i in range(num_games):
+        game.reset(seed=f"{SEED}:{i}")
+    results["reset_us"] = (time.perf_counter_ns() - began) / num_games / 1000
+    return results
+
+
+def bench_hot_paths(num_games):
+    timings = {}
+    for i in range(num_games):
+        TimedGame(timings, seed=f"{SEED}:{i}").start_game()
+    return averages(timings)
+
+
+def bench_games(num_games):
+    results = {}
+    began = time.perf_counter()
+    for i in range(num_games):
+        Game(seed=f"{SEED}:{i}").start_game()
+    results["games_per_second/log none"] = num_games / (time.perf_counter() - began)
+
+    with open(os.devnull, "w") as log_file:
+        began = time.perf_counter()
+        for i in range(num_games):
+            Game(log_file, seed=f"{SEED}:{i}").start_game()
+        results["games_per_second/log board"] = num_games / (time.perf_counter() - began)
+    return results
+
+
+def bench_memory(num_games):
+    # Peak memory allocated while playing a game, logging off, averaged over the games
+    peak = 0
+    for i in range(num_games):
+        tracemalloc.start()
+        Game(seed=f"{SEED}:{i}").start_game()
+        peak += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {"peak_memory_kb/game": peak / num_games / 1024}
+
+
+def bench_live_games(num_games):
+    # Memory held per live game, just set up, and the time a full (generation 2) collection takes while they are
+    # alive, as in a trainer that keeps many games at once
+    gc.collect()
+    tracemalloc.start()
+    games = [Game(seed=f"{SEED}:{i}") for i in range(num_games)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    began = time.perf_counter_ns()
+    gc.collect(2)
+    collection = time.perf_counter_ns() - began
+    del games
+    return {"live_game_kb": size / num_games / 1024, "gen2_collection_us/live game": collection / num_games / 1000}
+
+
+def summarize(runs):
+    # The median and the range of every metric over the runs
+    values = {}
+    for run_results in runs:
+        for name, value in run_results.items():
+            values.setdefault(name, []).append(value)
+    medians = {name: statistics.median(run_values) for name, run_values in values.items()}
+    ranges = {name: [min(run_values), max(run_values)] for name, run_values in values.items()}
+    return medians, ranges
+
+
+def repeat(benchmark, num_games):
+    runs = []
+    began = time.perf_counter()
+    while len(runs) < MIN_REPEATS or (time.perf_counter() - began < MIN_SECONDS and len(runs) < MAX_REPEATS):
+        runs.append(measure(benchmark, num_games))
+    return runs
+
+
+def measure(benchmark, num_games):
+    # Like timeit, with the garbage collector off, so that it does not kick in at random points of the runs
+    gc.collect()
+    gc.disable()
+    try:
+        return benchmark(num_games)
+    finally:
+        gc.enable()
+
+
+def run(num_games=200):
+    results = {}
+    ranges = {}
+    for benchmark in (bench_setup, bench_hot_paths, bench_games, bench_live_games):
+        medians, benchmark_ranges = summarize(repeat(benchmark, num_games))
+        results.update(medians)
+        ranges.update(benchmark_ranges)
+    # Memory does not depend on how busy the machine is: one run will do
+    memory = bench_memory(max(1, num_games // 10))
+    results.update(memory)
+    ranges.update((name, [value, value]) for name, value in memory.items())
+    return {
+        "python": platform.python_version(),
+        "games": num_games,
+        "results": dict(sorted(results.items())),
+        "ranges": dict(sorted(ranges.items())),
+    }
+
+
+def check_comparable(baseline, num_games):
+    # Raises a ValueError unless a run of num_games games can be compared to the baseline
+    if num_games != baseline["games"]:
+        raise ValueError(f"The baseline played {baseline['games']} games per benchmark, not {num_games}")
+    if num_games < MIN_GAMES:
+        raise ValueError(f"Runs of {num_games} games are too noisy to compare, play at least {MIN_GAMES}")
+
+
+def compare(baseline, current, tolerance=TOLERANCE):
+    """
+    Prints every metric of current against the baseline, and returns the names of the metrics that got
+    worse: their median by more than the tolerance, and their whole range, so that the runs do not overlap.
+    Both runs should come from the same machine, as idle as possible, and play the same number of games,
+    at least MIN_GAMES: otherwise a ValueError is raised. Baselines without ranges are taken as exact.
+    """
+    check_comparable(baseline, current["games"])
+    regressions = []
+    for name, value in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before:
+            print(f"{name:45} {value:12.2f}  (new)")
+            continue
+        low, high = current["ranges"][name]
+        low_before, high_before = baseline.get("ranges", {}).get(name, (before, before))
+        change = value / before - 1
+        if name in HIGHER_IS_BETTER:
+            worse, apart = -change, high < low_before
+        else:
+            worse, apart = change, low > high_before
+        flag = ""
+        if worse > tolerance and apart:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:45} {value:12.2f} {before:12.2f} {100 * change:+7.1f}%{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    # Writes the results to a JSON file, and compares them to a baseline written the same way if given
+    parser = argparse.ArgumentParser(description="Benchmarks of the simulator's hot paths.")
+    parser.add_argument("results", help="JSON file to write the results to")
+    parser.add_argument("--baseline", help="JSON file of earlier results to compare to")
+    parser.add_argument("--games", type=int, default=200, help="games per benchmark (default: 200)")
+    parser.add_argument(
+        "--tolerance", type=float, default=TOLERANCE,
+        help=f"slowdown of the median, as a fraction of the baseline, needed to flag a regression (default: {TOLERANCE})",
+    )
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        # Checked before the benchmarks run, not to run them for nothing
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        try:
+            check_comparable(baseline, args.games)
+        except ValueError as error:
+            sys.exit(str(error))
+
+    results = run(args.games)
+    with open(args.results, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+
+    if baseline:
+        regressions = compare(baseline, results, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        for name, value in results["results"].items():
+            print(f"{name:45} {value:12.2f}")
@@ -0,0 +1,71 @@
+"""
+Board geometry, built once for every game. A cell is x + 5 * y, the same layout as get_board_representation.
+The steps of a cell are its neighbours as (direction, neighbouring cell) pairs, only the ones on the board,
+in the direction order of the adventurers' available_moves.
+"""
+SIZE = 5
+CELLS = SIZE * SIZE
+
+ORTHOGONAL_DIRECTIONS = [(-1, 0), (1, 0), (0, 1), (0, -1)]
+DIAGONAL_DIRECTIONS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+ALL_DIRECTIONS = ORTHOGONAL_DIRECTIONS + DIAGONAL_DIRECTIONS
+
+
+def cell_of(x, y):
+    return x + SIZE * y
+
+
+def _steps(directions):
+    table = []
+    for cell in range(CELLS):
+        x, y = cell % SIZE, cell // SIZE
+        table.append(tuple(
+            ((dx, dy), cell_of(x + dx, y + dy))
+            for dx, dy in directions
+            if 0 <= x + dx < SIZE and 0 <= y + dy < SIZE
+        ))
+    return table
+
+
+ORTHOGONAL_STEPS = _steps(ORTHOGONAL_DIRECTIONS)
+ALL_STEPS = _steps(ALL_DIRECTIONS)
+ORTHOGONAL = [tuple(n for _, n in steps) for steps in ORTHOGONAL_STEPS]
+ALL_NEIGHBOURS = [tuple(n for _, n in steps) for steps in ALL_STEPS]
+
+# Bitboards: an int with bit c set for every cell c in a set of cells
+ALL_CELLS = (1 << CELLS) - 1
+ORTHOGONAL_MASKS = [sum(1 << n for n in neighbours) for neighbours in ORTHOGONAL]
+ALL_NEIGHBOUR_MASKS = [sum(1 << n for n in neighbours) for neighbours in ALL_NEIGHBOURS]
+
+
+def bits(board):
+    # The set bits of a bitboard (its cells), or of any other mask, lowest first
+    while board:
+        low = board & -board
+        yield low.bit_length() - 1
+        board ^= low
+
+
+def reachable(start, steps, closed, depth=3):
+    """
+    Breadth-first search from the start cell, through the given steps (see above), never entering a cell
+    of the closed bitboard, and not moving at all if the start itself is closed.
+    Returns (cell, path) for every cell reached in up to depth steps, in the order they were found. The path
+    is the list of directions of the first shortest way there. Only reads its arguments.
+    """
+    found = []
+    if closed >> start & 1:
+        return found
+    visited = closed | 1 << start
+    frontier = [(start, [])]
+    for _ in range(depth):
+        next_frontier = []
+        for cell, path in frontier:
+            for direction, adjacent_cell in steps[cell]:
+                if not visited >> adjacent_cell & 1:
+                    visited |= 1 << adjacent_cell
+                    reached = (adjacent_cell, path + [direction])
+                    found.append(reached)
+                    next_frontier.append(reached)
+        frontier = next_frontier
+    return found
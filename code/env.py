@@ -0,0 +1,62 @@
+from batch import *
+
+
+"""
+Rewards, at the end of the game only.
+"""
+WIN_REWARD = 1
+LOSS_REWARD = -1
+
+NO_ACTIONS = bytes(ACTION_SPACE)  # Clears the mask
+
+
+class Env:
+    """
+    The Env class is a gym-style environment over a compact game (see state.py), seen by whoever is playing.
+    Actions are ids of the fixed action space (ACTION_TABLE), and the legal ones are flagged in a mask, so
+    the caller only ever deals with small integers. Both the observation and the mask are preallocated and
+    rewritten in place at every step.
+    Attributes:
+        state (GameState): The game being played.
+        observation (array): The observation of the game, see batch.OBSERVED.
+        mask (bytearray): 1 for every legal action id of the current adventurer, 0 otherwise. All 0 once the game is over.
+
+    Methods:
+        reset(seed): Starts a new game, from the given seed or a random one. Returns the observation.
+        step(action_id): Performs a legal action. Returns the observation, the reward, whether the game is over,
+        and a dictionary with the outcome.
+    """
+
+    def __init__(self):
+        self.state = None
+        self.observation = array("b", bytes(OBSERVATION_SIZE))
+        self.mask = bytearray(ACTION_SPACE)
+
+    def reset(self, seed=None):
+        self.state = GameState(seed=seed)
+        self.state.start()
+        self.update()
+        return self.observation
+
+    def step(self, action_id):
+        if not self.mask[action_id]:
+            raise ValueError(f"Action {action_id} is not legal")
+        self.state.step(action_from_id(action_id, self.state.current_adventurer))
+        self.update()
+
+        outcome = self.state.outcome
+        reward = 0
+        if outcome == WON:
+            reward = WIN_REWARD
+        elif outcome:
+            reward = LOSS_REWARD
+        return self.observation, reward, outcome != PLAYING, {"outcome": outcome}
+
+    def update(self):
+        s = self.state.s
+        write_observation(s, self.observation)
+        mask = self.mask
+        mask[:] = NO_ACTIONS
+        if not s[OUTCOME]:
+            for action in legal_actions(s, current_adventurer(s)):
+                mask[action_id(action)] = 1
@@ -0,0 +1,223 @@
+import gc
+from state import *
+
+
+"""
+Storm card types. Cards of the same type have the same effect, so a deck is described by how many cards of
+each type it holds: storm moves by their steps (direction and length), then Sun Beats Down and Storm Picks Up.
+"""
+CARD_TYPES = sorted(set(zip(STORM_CARD_KINDS, STORM_CARD_STEPS)))
+CARD_TYPE = [CARD_TYPES.index(card) for card in zip(STORM_CARD_KINDS, STORM_CARD_STEPS)]  # Per storm card
+
+
+def card_counts(cards):
+    counts = [0] * len(CARD_TYPES)
+    for card in cards:
+        counts[CARD_TYPE[card]] += 1
+    return tuple(counts)
+
+
+"""
+Storm draws are worked out exactly, whatever their size. Draws that end up the same are merged as the cards are
+drawn, but the number of outcomes still grows about sixfold per card: some 127000 for 6 cards, which takes
+a few seconds. Forecasts are memoized, keeping at most CACHED_OUTCOMES outcomes over all of them: the oldest
+forecasts are dropped first.
+"""
+CACHED_OUTCOMES = 200000
+
+_forecasts = {}  # (deck, discard_pile, storm_cell, draws) to forecast, oldest first
+_cached_outcomes = 0
+
+
+def storm_forecast(deck, discard_pile, storm_cell, draws):
+    """
+    The distribution of what happens when draws cards are drawn from the storm deck (Deck.draw), given the
+    number of cards of each type in the deck and in the discard pile (see card_counts), and the cell of the
+    storm. It takes into account that the deck runs out and the discard pile is shuffled back in.
+    Returns a tuple of (probability, outcome), one per possible outcome, with outcome a tuple:
+        storm_cell: The cell of the storm afterwards.
+        moved: (cell, origin) pairs, for every tile the storm pushed around: the cell the tile now stands on,
+        and the cell it stood on before the draw. Tiles not listed did not move.
+        sand: (origin, sand) pairs, for every tile that got sand, by the cell it stood on before the draw.
+        An adventurer on the tile loses that much water too.
+        sun_beats_down (int): The number of Sun Beats Down cards. Adventurers not sheltered lose that much water.
+        storm_picks_up (int): How much the storm level goes up.
+    Results are memoized, so the same draw is only worked out once, see forecast.
+    """
+    global _cached_outcomes
+    key = (deck, discard_pile, storm_cell, draws)
+    result = _forecasts.get(key)
+    if result is None:
+        result = exact_forecast(deck, discard_pile, storm_cell, draws)
+        _forecasts[key] = result
+        _cached_outcomes += len(result)
+        while _cached_outcomes > CACHED_OUTCOMES and len(_forecasts) > 1:
+            _cached_outcomes -= len(_forecasts.pop(next(iter(_forecasts))))
+    return result
+
+
+def clear_forecasts():
+    global _cached_outcomes
+    _forecasts.clear()
+    _cached_outcomes = 0
+
+
+"""
+While a draw is worked out, its outcome so far is coded as small integers, so that every card drawn only
+takes a few integer operations: (storm_cell, tiles, sand, sun_beats_down, storm_picks_up), with tiles holding
+the origin of the tile on every cell and sand the sand of every tile by origin, a byte per cell.
+The deck is coded as an integer too, with a digit of base DIGIT per card type.
+STORM_PATHS[storm_cell][card_type] are the cells a card of the type takes the storm through.
+"""
+DIGIT = 32
+PLACES = [DIGIT ** card_type for card_type in range(len(CARD_TYPES))]
+UNMOVED = int.from_bytes(bytes(range(CELLS)), "little")
+
+
+def storm_paths():
+    paths = []
+    for storm_cell in range(CELLS):
+        row = []
+        for kind, steps in CARD_TYPES:
+            cell = storm_cell
+            cells = []
+            for dx, dy in steps:
+                x, y = cell % 5 + dx, cell // 5 + dy
+                if 0 <= x <= 4 and 0 <= y <= 4:
+                    cell = x + 5 * y
+                    cells.append(cell)
+            row.append(tuple(cells))
+        paths.append(row)
+    return paths
+
+
+STORM_PATHS = storm_paths()
+
+
+def exact_forecast(deck, discard_pile, storm_cell, draws):
+    # Partial draws and their probabilities. A partial draw is the deck left and the outcome so far, both coded.
+    # Draws that end up the same are merged. The discard pile follows from the deck: until the deck runs out,
+    # it holds every other card, and then it is shuffled back in whole
+    every_card = sum((count + discarded) * place for count, discarded, place in zip(deck, discard_pile, PLACES))
+    decks = {}  # Coded deck to (coded deck after a reshuffle, [(card type, count)], number of cards)
+
+    def cards(code):
+        result = decks.get(code)
+        if result is None:
+            counts = [(card_type, code // place % DIGIT) for card_type, place in enumerate(PLACES)]
+            counts = [(card_type, count) for card_type, count in counts if count]
+            if not counts:  # Deck.reshuffle
+                result = cards(every_card)
+            else:
+                result = (code, counts, sum(count for _, count in counts))
+            decks[code] = result
+        return result
+
+    # Nothing here makes reference cycles, and pausing the collector, which would otherwise look over every
+    # partial draw again and again, makes large draws a third faster
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        start = (storm_cell, UNMOVED, 0, 0, 0)
+        if not draws:
+            return ((1.0, decode_outcome(start)),)
+        partial = {(sum(count * place for count, place in zip(deck, PLACES)), start): 1.0}
+        for _ in range(draws - 1):
+            drawn = {}
+            for (code, outcome), probability in partial.items():
+                code, counts, total = cards(code)
+                for card_type, count in counts:
+                    key = (code - PLACES[card_type], apply_card(card_type, outcome))
+                    drawn[key] = drawn.get(key, 0.0) + probability * count / total
+            partial = drawn
+
+        # The deck left after the last card does not matter: the chances of every card type are added up per
+        # outcome first, so that each outcome only draws every card type once
+        last = {}
+        for (code, outcome), probability in partial.items():
+            _, counts, total = cards(code)
+            chances = last.get(outcome)
+            if chances is None:
+                chances = last[outcome] = [0.0] * len(CARD_TYPES)
+            probability /= total
+            for card_type, count in counts:
+                chances[card_type] += probability * count
+        outcomes = {}
+        for outcome, chances in last.items():
+            for card_type, chance in enumerate(chances):
+                if chance:
+                    next_outcome = apply_card(card_type, outcome)
+                    outcomes[next_outcome] = outcomes.get(next_outcome, 0.0) + chance
+        return tuple((probability, decode_outcome(outcome)) for outcome, probability in outcomes.items())
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def apply_card(card_type, outcome):
+    # The coded outcome so far, after one more card of the type. StormCard.apply, on the tiles' origins only
+    storm_cell, tiles, sand, sun, picks = outcome
+    kind = CARD_TYPES[card_type][0]
+    if kind == STORM_MOVES:
+        for cell in STORM_PATHS[storm_cell][card_type]:
+            # The tile on the cell and the storm swap places, and the tile gets sand
+            origin = tiles >> 8 * cell & 255
+            swap = origin ^ tiles >> 8 * storm_cell & 255
+            tiles ^= swap << 8 * cell | swap << 8 * storm_cell
+            sand += 1 << 8 * origin
+            storm_cell = cell
+        return storm_cell, tiles, sand, sun, picks
+    if kind == SUN_BEATS_DOWN:
+        return storm_cell, tiles, sand, sun + 1, picks
+    return storm_cell, tiles, sand, sun, picks + 1
+
+
+def decode_outcome(outcome):
+    # The outcome as storm_forecast returns it
+    storm_cell, tiles, sand, sun, picks = outcome
+    moved = tuple(
+        (cell, origin)
+        for cell, origin in enumerate(tiles.to_bytes(CELLS, "little"))
+        if origin != cell and cell != storm_cell
+    )
+    sand = tuple((origin, count) for origin, count in enumerate(sand.to_bytes(CELLS, "little")) if count)
+    return storm_cell, moved, sand, sun, picks
+
+
+def forecast(game):
+    """
+    storm_forecast of the draw at the end of the current turn of a Game.
+    """
+    deck = game.deck
+    return storm_forecast(
+        card_counts(deck.deck),
+        card_counts(deck.discard_pile),
+        game.tiles["storm"].cell,
+        max(0, deck.cards_to_draw() - deck.mitigated),
+    )
+
+
+def forecast_state(s):
+    """
+    storm_forecast of the draw at the end of the current turn of a compact game (see state.py).
+    """
+    left = s[STORM_LEFT]
+    return storm_forecast(
+        card_counts(s[STORM_DECK:STORM_DECK + left]),
+        card_counts(s[STORM_DECK + left:STORM_DECK + STORM_CARDS]),
+        s[STORM_CELL],
+        max(0, cards_to_draw(s) - s[MITIGATED]),
+    )
+
+
+def water_lost(outcome, cell, sheltered=False):
+    """
+    The water lost in an outcome of storm_forecast by an adventurer standing on the cell before the draw,
+    not counting that a canteen cannot go below 0. Sheltered adventurers (on a flipped tunnel, or with
+    a solar shield active there) are safe from the sun.
+    """
+    _, _, sand, sun_beats_down, _ = outcome
+    lost = dict(sand).get(cell, 0)
+    if not sheltered:
+        lost += sun_beats_down
+    return lost
@@ -1,24 +1,108 @@
+import io
+import json
+import multiprocessing
 import os
 import sys
 from adventurers import *
 from geardeck import *
 from stormdeck import *
 from tiles import *
+from logs import *
+from recording import *
+from seeding import *
+from profiling import *
+from stats import *
+from archive import *
+from zobrist import *
 import random
 
 
+def random_policy(game, adventurer, possible_actions):
+    """
+    The default policy: one of the possible actions, chosen at random from the game's policy stream.
+    A policy is any function that takes the game, the adventurer whose turn it is and the possible actions,
+    and returns the action to perform.
+    """
+    return game.policy_rng.choice(possible_actions)
+
+
 class Game:
-    def __init__(self, log_file) -> None:
-        self.log_file = log_file
-        # Initialize game state
-        self.coordinate_to_tile = {}  # Holds the mapping from coordinates to tiles
-        self.tiles = {}  # Dictionary to store tiles by name
-        self.adventurers = {}  # Holds the adventurers by name
+    def __init__(
+        self,
+        log_file=None,
+        seed=None,
+        policy=random_policy,
+        log_level=LOG_BOARD,
+        record=False,
+        setup=True,
+        profile=None,
+    ) -> None:
+        # The pieces of the game, built from the templates in tiles.py, adventurers.py, stormdeck.py and geardeck.py
+        self.tiles = self.create_tiles()  # Dictionary to store tiles by name
+        self.adventurers = self.create_adventurers()  # Holds the adventurers by name
+        self.tile_list = list(self.tiles.values())  # Tiles by index, see Tile.get_state
+        self.adventurer_list = list(self.adventurers.values())  # Adventurers by index, see Adventurer.get_state
         self.deck = Deck(self)  # Creates the deck of cards
         self.gear_deck = GearDeck(self) # Creates the deck of gear cards
+        self.streams = None  # The generators of make_rngs, before any recording, see new_game
+        self.new_game(log_file, seed, policy, log_level, record)
+
+        # Times the hot paths of the game, see profiling.py. Off by default
+        self.profile = profile
+        if profile is not None:
+            profile.attach(self)
+
+        # A game built with setup=False has no board yet: it is meant to be filled by restore()
+        if setup:
+            self.setup()  # Perform initial game setup
+
+    def new_game(self, log_file, seed, policy, log_level, record):
+        # Everything about a game but its pieces, as it is before setup(). See __init__ and reset
+        # Without a log sink, nothing is logged at all
+        self.log_file = log_file or NullLog()
+        self.log_level = log_level if log_file else LOG_NONE  # See logs.py
+        self.seed = new_seed() if seed is None else seed
+        # A reset game seeds its generators again rather than making new ones
+        if self.streams is None:
+            self.streams = make_rngs(self.seed)
+        else:
+            reseed_rngs(self.streams, self.seed)
+        self.layout_rng, self.storm_rng, self.gear_rng, self.policy_rng = self.streams
+        self.recorder = None  # Writes down the game, see recording.py
+        if record:
+            self.recorder = Recorder(self.seed)
+            self.layout_rng = RecordingRandom(self.layout_rng, self.recorder, LAYOUT)
+            self.storm_rng = RecordingRandom(self.storm_rng, self.recorder, STORM)
+            self.gear_rng = RecordingRandom(self.gear_rng, self.recorder, GEAR)
+        self.deck.rng = self.storm_rng
+        self.gear_deck.rng = self.gear_rng
+        self.policy = policy  # Chooses the action to perform, see random_policy
+        # Initialize game state
+        self.coordinate_to_tile = {}  # Holds the mapping from coordinates to tiles
+        self.cell_to_tile = [None] * CELLS  # The same mapping by cell, see board.py
+        # Bitboards of the cells whose tile is blocked, flipped, has sand, is a tunnel, is the storm.
+        # Bit c stands for cell c. The tiles keep them up to date, see Tile.update_bitboards
+        self.blocked_board = 0
+        self.flipped_board = 0
+        self.sand_board = 0
+        self.tunnel_board = 0
+        self.storm_board = 0
+        # Occupancy index: the adventurers on every cell, as a mask with bit i for Game.adventurer_list[i], and
+        # the cell of every adventurer. Kept up to date by the tiles as adventurers come and go (see
+        # Tile.add_adventurer), by the storm as it moves tiles (see StormCard.apply) and by place()
+        self.occupancy = [0] * CELLS
+        self.adventurer_cells = [None] * len(self.adventurer_list)
+        # Parts of get_possible_actions, keyed by everything they depend on, so an entry is only recomputed
+        # once something it depends on has changed. See cached_actions
+        self.action_cache = {}
+        self.occupancy_version = 0  # Changes whenever an adventurer joins or leaves a tile
+        self.layout_version = 0  # Changes whenever a tile changes cells, see place, Tile.swap and StormCard.apply
+        self.sharing_pairs = (None, [])  # (occupancy_version, pairs), see get_sharing_pairs
         self.sand_storm_level = 1
         self.total_sand = 0
+        self.dry_adventurers = 0  # Adventurers out of water, counted as their water changes, see check_game_status
         self.is_game_over = False  # Status flag to control the game loop
+        self.outcome = None  # How the game ended: "won", or lost to "water", "sand" or "storm"
         self.player_order = []  # List that holds the order in which players will take turns
         
         self.round = 1 # A round is defined as a turn for each player
@@ -26,21 +110,54 @@ class Game:
         self.action = 1 # An action is defined as one of the 4 activities that an adventurer can perform in each turn
         self.action_points = 4 # Each adventurer can spend 4 action points per turn
 
-        self.setup()  # Perform initial game setup
-
         self.motor_tiles_flipped = 0
         self.propeller_tiles_flipped = 0
         self.gem_tiles_flipped = 0
         self.compass_tiles_flipped = 0
         self.boat_parts_picked = 0
 
+        self.undo_stack = None  # List of undo records, None while undo is disabled. See enable_undo
+        self.undo_record = None  # Record being filled by the action or storm draw in progress
+        self.undo_counters = None  # Game counters when the open record began
+
+        # Zobrist key of the tiles, adventurers and decks, see position_key. Components that changed since
+        # it was last brought up to date have their old part of the key taken out, and are held in unhashed
+        self.zobrist = 0
+        self.unhashed = set()
+
+    def reset(self, log_file=None, seed=None, policy=random_policy, log_level=LOG_BOARD, record=False):
+        """
+        Turns the game into a new one, the same as Game(log_file, seed, policy, log_level, record) would be,
+        but keeps its tiles, adventurers, cards and random generators rather than building them again: only
+        the layout of the board and the shuffles of the decks are new. Returns the game.
+        A profiled game cannot be reset, as its profile is attached to its pieces.
+        """
+        if self.profile is not None:
+            raise ValueError("A profiled game cannot be reset")
+        for tile in self.tile_list:
+            # Every tile gets new coordinates in initialize_tiles, so only the ones that changed are cleared
+            if tile.sand or tile.flipped or tile.occupants or tile.boat_parts:
+                tile.reset()
+        for adventurer in self.adventurer_list:
+            adventurer.reset(self.tiles["start"])
+        self.deck.reset()
+        self.gear_deck.reset()
+        self.new_game(log_file, seed, policy, log_level, record)
+        self.setup()
+        return self
+
     def setup(self):
-        # Call methods to initialize the game components
+        # Call methods to initialize the game components. The Zobrist key is left to be computed from scratch
+        # first, so that setting the pieces up does not keep it up to date for nothing
+        self.rehash()
         self.initialize_tiles()
         self.initialize_adventurers()
         self.deck.shuffle()
         self.gear_deck.shuffle()
 
+        if self.log_level < LOG_BOARD:
+            return
+
         game_state = f"Initial State:\n"
         game_state += f"Storm Level: {self.sand_storm_level}\n"
         game_state += "Game Board: \n"
@@ -50,97 +167,86 @@ class Game:
 
         self.log_file.write(game_state)
 
-    def initialize_tiles(self):
+    def create_tiles(self):
         """
         The tiles dictionary is the equivalent of the stack of tiles that comes with the boardgame.
         The same quantity and type of tiles as within the "real" boardgame is depicted here.
         Each key-value pair consists of a unique tile name and a corresponding Tile object that holds
         the tile's properties such as its symbol, coordinates, and state (flipped or not, and the amount of sand).
         """
-        tiles = {
-            "start": GearTile("start", "S", self),
-            "storm": Tile("storm", "X", self),
-            "tunnel_1": TunnelTile("tunnel_1", "T1", self),
-            "tunnel_2": TunnelTile("tunnel_2", "T2", self),
-            "tunnel_3": TunnelTile("tunnel_3", "T3", self),
-            "boat": Tile("boat", "B", self),
-            "gem_h": PartTile("gem_h", "Gh", self),
-            "gem_v": PartTile("gem_v", "Gv", self),
-            "motor_h": PartTile("motor_h", "Mh", self),
-            "motor_v": PartTile("motor_v", "Mv", self),
-            "compass_h": PartTile("compass_h", "Ch", self),
-            "compass_v": PartTile("compass_v", "Cv", self),
-            "propeller_h": PartTile("propeller_h", "Ph", self),
-            "propeller_v": PartTile("propeller_v", "Pv", self),
-            "water_1": WaterTile("water_1", "W1", self),
-            "water_2": WaterTile("water_2", "W2", self),
-            "oasis": MirageTile("mirage", "M", self),
-            "dune_1": GearTile("dune_1", "D1", self),
-            "dune_2": GearTile("dune_2", "D2", self),
-            "dune_3": GearTile("dune_3", "D3", self),
-            "dune_4": GearTile("dune_4", "D4", self),
-            "dune_5": GearTile("dune_5", "D5", self),
-            "dune_6": GearTile("dune_6", "D6", self),
-            "dune_7": GearTile("dune_7", "D7", self),
-            "dune_8": GearTile("dune_8", "D8", self),
-        }
+        tiles = {key: tile_class(name, symbol) for key, tile_class, name, symbol in TILE_TEMPLATES}
 
-        self.tiles = tiles
+        for index, tile in enumerate(tiles.values()):
+            tile.index = index
 
+        return tiles
+
+    def initialize_tiles(self):
         """
         Below, coordinates to the tiles are assigned and returns the coordinate_to_tile mapping.
         Only the "storm" tile is placed at a particular place (middle of the board: 2,2), the rest are placed at random.
         Adds initial sand to board.
         """
+        tiles = self.tiles
+
         # Assign fixed coordinates to the storm tile
-        tiles["storm"].set_coordinates(2, 2)
+        storm_tile = tiles["storm"]
+        storm_tile.set_coordinates(2, 2)
 
         # Create a list of all possible coordinates except for the storm's
-        all_coordinates = [(x, y) for x in range(5) for y in range(5)]
-        all_coordinates.remove((2, 2))  # Remove the storm's fixed coordinates
-        random.shuffle(all_coordinates)
+        all_coordinates = list(LAYOUT_COORDINATES)
+        self.layout_rng.shuffle(all_coordinates)
 
         # Initialize coordinate_to_tile with the storm tile
-        self.coordinate_to_tile = {(2, 2): tiles["storm"]}
-
-        # Assign coordinates to the rest of the tiles
-        for tile_name, tile in tiles.items():
-            if tile.x_coordinate is None and tile.y_coordinate is None:
+        coordinate_to_tile = self.coordinate_to_tile = {(2, 2): storm_tile}
+        cell_to_tile = self.cell_to_tile
+        cell_to_tile[storm_tile.cell] = storm_tile
+
+        # Assign coordinates to the rest of the tiles. No tile is flipped, blocked or has sand yet, so only
+        # the storm and the tunnels are on the bitboards
+        tunnel_board = 0
+        for tile in self.tile_list:
+            if tile is not storm_tile:
                 x, y = all_coordinates.pop()
                 tile.set_coordinates(x, y)
-                self.coordinate_to_tile[(x, y)] = tile
+                coordinate_to_tile[(x, y)] = tile
+                cell_to_tile[tile.cell] = tile
+                if tile.is_tunnel:
+                    tunnel_board |= 1 << tile.cell
+        self.blocked_board = self.flipped_board = self.sand_board = 0
+        self.tunnel_board = tunnel_board
+        self.storm_board = 1 << storm_tile.cell
 
         """
         Add initial sand using the .add_sand() method.
         """
         initial_sand = [(0, 2), (1, 1), (1, 3), (2, 0), (2, 4), (3, 1), (3, 3), (4, 2)]
         for x_sand_tile, y_sand_tile in initial_sand:
-            self.coordinate_to_tile[(x_sand_tile, y_sand_tile)].add_sand()
+            self.coordinate_to_tile[(x_sand_tile, y_sand_tile)].add_sand(self)
 
-    def initialize_adventurers(self):
+    def create_adventurers(self):
         """
-        Here the adventurers dictionary is initialized, after the board is set.
-        By default, all adventureres go to the "start" Tile.
+        Here the adventurers dictionary is created, with every adventurer standing on the "start" Tile.
         """
-
-        self.adventurers = {
-            "archeologist": Archeologist(
-                "archeologist", "A", self.tiles["start"], self, 3
-            ),
-            "climber": Climber("climber", "C", self.tiles["start"], self, 3),
-            "explorer": Explorer("explorer", "E", self.tiles["start"], self, 4),
-            "meteorologist": Meteorologist(
-                "meteorologist", "M", self.tiles["start"], self, 4
-            ),
-            "navigator": Navigator("navigator", "N", self.tiles["start"], self, 4),
-            "water_carrier": WaterCarrier(
-                "water_carrier", "WC", self.tiles["start"], self, 5
-            ),
+        start = self.tiles["start"]
+        adventurers = {
+            name: adventurer_class(name, symbol, start, self, water)
+            for name, adventurer_class, symbol, water in ADVENTURER_TEMPLATES
         }
 
+        for index, adventurer in enumerate(adventurers.values()):
+            adventurer.index = index
+
+        return adventurers
+
+    def initialize_adventurers(self):
+        """
+        Here the adventurers are placed, after the board is set.
+        By default, all adventureres go to the "start" Tile.
+        """
         # Add the adventurers to the start tile
         for adventurer in self.adventurers.values():
-            self.tiles["start"].add_adventurer(adventurer)
+            self.tiles["start"].add_adventurer(self, adventurer)
 
     def increase_storm_level(self):
         self.sand_storm_level += 1
@@ -171,6 +277,10 @@ class Game:
         game_state = f"{self.round}." + f"{self.turn}." + f"{self.action}: \n"
         game_state += f"Storm Level: {self.sand_storm_level}\n"
         game_state += f"{adventurer.name}: {chosen_action[0]}, {chosen_action[1]}. Cost: {chosen_action[2]}.\n"
+        if self.log_level < LOG_BOARD:
+            self.log_file.write(game_state + "\n")
+            return
+
         game_state += "Game Board: \n"
         game_state += self.get_board_representation()
         game_state += "\n\nAdventurers:\n"
@@ -179,6 +289,180 @@ class Game:
 
         self.log_file.write(game_state)
 
+    def get_counters(self):
+        return (
+            self.sand_storm_level,
+            self.total_sand,
+            self.dry_adventurers,
+            self.is_game_over,
+            self.outcome,
+            self.round,
+            self.turn,
+            self.action,
+            self.action_points,
+            self.motor_tiles_flipped,
+            self.propeller_tiles_flipped,
+            self.gem_tiles_flipped,
+            self.compass_tiles_flipped,
+            self.boat_parts_picked,
+            tuple(adventurer.index for adventurer in self.player_order),
+        )
+
+    def set_counters(self, counters):
+        (
+            self.sand_storm_level,
+            self.total_sand,
+            self.dry_adventurers,
+            self.is_game_over,
+            self.outcome,
+            self.round,
+            self.turn,
+            self.action,
+            self.action_points,
+            self.motor_tiles_flipped,
+            self.propeller_tiles_flipped,
+            self.gem_tiles_flipped,
+            self.compass_tiles_flipped,
+            self.boat_parts_picked,
+            player_order,
+        ) = counters
+        self.player_order = [self.adventurer_list[index] for index in player_order]
+
+    def snapshot(self):
+        """
+        Captures the whole mutable state of the game as an immutable value.
+        Tiles, adventurers and cards are referred to by index, so a snapshot holds no live objects
+        and can be restored into any Game, not only the one it was taken from.
+        """
+        return (
+            self.get_counters(),
+            tuple(tile.get_state() for tile in self.tile_list),
+            tuple(adventurer.get_state() for adventurer in self.adventurer_list),
+            self.deck.get_state(),
+            self.gear_deck.get_state(),
+        )
+
+    def restore(self, snapshot):
+        counters, tile_states, adventurer_states, deck_state, gear_deck_state = snapshot
+        self.set_counters(counters)
+        for tile, tile_state in zip(self.tile_list, tile_states):
+            tile.set_state(tile_state)
+            self.place(tile)
+        for adventurer, adventurer_state in zip(self.adventurer_list, adventurer_states):
+            adventurer.set_state(adventurer_state)
+        self.deck.set_state(deck_state)
+        self.gear_deck.set_state(gear_deck_state)
+        self.rehash()
+
+    def clone(self, log_file=None, seed=None):
+        """
+        Returns an independent copy of the game. The copy logs to log_file, at the same level as the game,
+        or nowhere if not given.
+        Without a seed, the copy carries on the random streams of the game and plays on exactly like it would;
+        with a seed, it gets fresh streams from that seed. The copy is not recorded.
+        """
+        game = Game(log_file, self.seed if seed is None else seed, self.policy, self.log_level, setup=False)
+        if seed is None:
+            for rng, copied_rng in zip(self.rngs(), game.rngs()):
+                copied_rng.setstate(rng.getstate())
+        game.restore(self.snapshot())
+        return game
+
+    def rngs(self):
+        return self.layout_rng, self.storm_rng, self.gear_rng, self.policy_rng
+
+    def enable_undo(self):
+        """
+        From now on, every perform_action and every Deck.draw pushes an undo record, and undo() reverts them
+        in reverse order. A record holds the game counters plus the previous state of only the tiles,
+        adventurers and decks that changed, so undoing does not copy the whole game.
+        """
+        self.undo_stack = []
+
+    def begin_undo_record(self):
+        self.undo_record = {}
+        self.undo_counters = self.get_counters()
+
+    def end_undo_record(self):
+        self.undo_stack.append((self.undo_counters, self.undo_record))
+        self.undo_record = None
+
+    def touch(self, component):
+        """
+        Called by tiles, adventurers and decks right before they change. While an undo record is open,
+        the first call for a component saves its state. The first call since the Zobrist key was last
+        brought up to date takes the component's part out of the key, see position_key.
+        """
+        record = self.undo_record
+        if record is not None and component not in record:
+            record[component] = component.get_state()
+        if component not in self.unhashed:
+            self.unhashed.add(component)
+            self.zobrist ^= component.zobrist_key()
+
+    def undo(self):
+        """
+        Reverts the last recorded action or storm draw, including tile swaps and total_sand.
+        """
+        counters, record = self.undo_stack.pop()
+        self.set_counters(counters)
+        for component, state in record.items():
+            self.touch(component)
+            component.set_state(state)
+            if isinstance(component, Tile):
+                self.place(component)
+
+    def place(self, tile):
+        # Puts a tile, whose state was just set, back in the mappings and bitboards. See Tile.set_state
+        self.coordinate_to_tile[(tile.x_coordinate, tile.y_coordinate)] = tile
+        self.cell_to_tile[tile.cell] = tile
+        tile.update_bitboards(self)
+        self.index_occupants(tile)
+        self.occupancy_version += 1
+        self.layout_version += 1
+
+    def index_occupants(self, tile):
+        # Writes the adventurers on a tile into the occupancy index, at the tile's cell
+        mask = 0
+        for index in tile.occupants:
+            mask |= 1 << index
+            self.adventurer_cells[index] = tile.cell
+        self.occupancy[tile.cell] = mask
+
+    def components(self):
+        return self.tile_list + self.adventurer_list + [self.deck, self.gear_deck]
+
+    def rehash(self):
+        # Takes every component out of the Zobrist key, so that position_key computes it from scratch the next
+        # time it is asked for, and a game that never asks for it does not pay for it
+        self.zobrist = 0
+        self.unhashed = set(self.components())
+
+    def position_key(self):
+        """
+        Returns the Zobrist key of the game: a 64-bit integer that stands for the position, so that searches
+        can tell positions apart, and recognise the same position reached in different ways (see
+        zobrist.TranspositionTable). Every tile, adventurer and deck adds its part of the key (zobrist_key),
+        and the changes made through them since the last call are folded in here: only the components that
+        changed are looked at again. The order of the storm and gear decks and the order in which adventurers
+        arrived at a tile are not part of the key.
+        """
+        if self.unhashed:
+            zobrist = self.zobrist
+            for component in self.unhashed:
+                zobrist ^= component.zobrist_key()
+            self.zobrist = zobrist
+            self.unhashed.clear()
+        key = (
+            self.zobrist
+            ^ STORM_LEVEL_KEYS[self.sand_storm_level & 31]
+            ^ TURN_KEYS[self.turn & 7]
+            ^ ACTION_POINTS_KEYS[self.action_points & 15]
+        )
+        if self.is_game_over:
+            key ^= GAME_OVER_KEY
+        return key
+
     def start_game(self):
         self.set_player_order()
         while not self.is_game_over:
@@ -195,7 +479,8 @@ class Game:
         for adventurer in self.adventurers.values():
             if adventurer.solar_shield_active and adventurer == current_adventurer:
                 adventurer.deactivate_solar_shield()
-                self.log_file.write(f"{adventurer.name}'s Solar Shield has worn off.\n")
+                if self.log_level >= LOG_EVENTS:
+                    self.log_file.write(f"{adventurer.name}'s Solar Shield has worn off.\n")
 
     def set_player_order(self):
         # Find the minimum water level amongst all adventurers
@@ -210,7 +495,7 @@ class Game:
                 least_water_adventurers.append(adventurer)
 
         # Between all the adventurers with the least amount of water, choose one at random
-        first_player = random.choice(least_water_adventurers)
+        first_player = self.layout_rng.choice(least_water_adventurers)
 
         # Create a list of the other players
         other_players = [
@@ -218,7 +503,7 @@ class Game:
             for adventurer in self.adventurers.values()
             if adventurer != first_player
         ]
-        random.shuffle(other_players)
+        self.layout_rng.shuffle(other_players)
 
         # Set the player order starting with the first player followed by the others
         self.player_order = [first_player] + other_players
@@ -229,9 +514,12 @@ class Game:
         
         while self.action_points > 0 and self.is_game_over == False:
             possible_actions = self.get_possible_actions(adventurer)
-            chosen_action = random.choice(possible_actions) # Select one of the actions at random
+            chosen_action = self.policy(self, adventurer, possible_actions) # Select one of the actions, at random by default
+            if self.recorder is not None:
+                self.recorder.action(possible_actions.index(chosen_action))
             if chosen_action[0] == "pass":
-                self.log_file.write(f"{adventurer} skips their turn.\n\n")
+                if self.log_level >= LOG_EVENTS:
+                    self.log_file.write(f"{adventurer} skips their turn.\n\n")
                 break
             action_cost = chosen_action[2]
             self.perform_action(adventurer, chosen_action)
@@ -246,6 +534,7 @@ class Game:
         self.turn += 1
         self.deck.draw()  # Draw cards from the StormDeck at the end of every turn
         if self.deck.mitigated != 0: #Reset the mitigation from Meteorologist to 0
+            self.touch(self.deck)
             self.deck.mitigated = 0
 
     def get_possible_actions(self, current_adventurer):
@@ -278,12 +567,24 @@ class Game:
             if adventurer.inventory:
                 for item in adventurer.inventory:
                     if isinstance(item, JetPack):
-                        for tile in adventurer.available_tiles():
-                            possible_actions.append(("use_item", (adventurer, item, tile), 0))
+                        # The bitboards are by cell and the actions hold tiles, so the layout is part of the key
+                        key = (adventurer, item, self.blocked_board | self.storm_board, self.layout_version)
+                        actions = self.cached_actions(key)
+                        if actions is None:
+                            actions = self.cache_actions(key, [
+                                ("use_item", (adventurer, item, tile), 0) for tile in adventurer.available_tiles()
+                            ])
+                        possible_actions += actions
                     elif isinstance(item, Terrascope):
-                        for tile in self.tiles.values():
-                            if not tile.flipped and tile.name != "storm":
-                                possible_actions.append(("use_item", (adventurer, item, tile), 0))
+                        key = (adventurer, item, self.flipped_board | self.storm_board, self.layout_version)
+                        actions = self.cached_actions(key)
+                        if actions is None:
+                            actions = self.cache_actions(key, [
+                                ("use_item", (adventurer, item, tile), 0)
+                                for tile in self.tile_list
+                                if not tile.flipped and not tile.is_storm
+                            ])
+                        possible_actions += actions
                     elif isinstance(item, SecretWaterReserve):
                         possible_actions.append(("use_item", (adventurer, item), 0))
                     elif isinstance(item, DuneBlaster):
@@ -304,13 +605,24 @@ class Game:
             ):
                 possible_actions.append(("ability", current_adventurer, 1))
         elif isinstance(current_adventurer, Navigator):
-            for other_adventurer in self.adventurers.values():
-                if other_adventurer != current_adventurer:
-                    if current_adventurer.bfs_other_adventurer_available_paths(other_adventurer):
-                        for path in current_adventurer.bfs_other_adventurer_available_paths(other_adventurer).values():
-                            possible_actions.append(("ability", (current_adventurer, other_adventurer, path), 1))
+            # The paths only depend on where everyone stands and on which tiles are open
+            key = (
+                tuple(adventurer.tile.cell for adventurer in self.adventurer_list),
+                self.blocked_board,
+                self.storm_board,
+            )
+            actions = self.cached_actions(key)
+            if actions is None:
+                actions = self.cache_actions(key, [
+                    ("ability", (current_adventurer, other_adventurer, path), 1)
+                    for other_adventurer, paths in current_adventurer.all_available_paths()
+                    if paths
+                    for path in paths.values()
+                ])
+            possible_actions += actions
         elif isinstance(current_adventurer, Climber):
-            for other_adventurer in current_adventurer.tile.adventurers:
+            for index in current_adventurer.tile.occupants:
+                other_adventurer = self.adventurer_list[index]
                 if other_adventurer != current_adventurer:
                     possible_actions.append(("pick_up_adventurer", (current_adventurer, other_adventurer), 0))
 
@@ -318,8 +630,7 @@ class Game:
                 possible_actions.append(("drop_off_adventurer", (current_adventurer), 0))
         elif isinstance(current_adventurer, Meteorologist):
             possible_actions.append(("peek_deck", current_adventurer, 1))
-            self.deck.amount_to_draw()
-            if self.deck.amount >= self.deck.mitigated:
+            if self.deck.cards_to_draw() >= self.deck.mitigated:
                 possible_actions.append(("mitigate", current_adventurer, 1)) 
             
         # Check if adventurer can pickup a boat piece
@@ -328,23 +639,16 @@ class Game:
                 possible_actions.append(("pick_part", (current_adventurer, item), 1))
 
         # Sharing items from inventory
-        for tile in self.tiles.values():
-            if len(tile.adventurers) > 1:  # There's potential for item sharing
-                for i, adv in enumerate(tile.adventurers):
-                    if adv.inventory:  # Check if adventurer has items to share
-                        for other_adventurer in tile.adventurers[i+1:]:
-                            for item in adv.inventory:  # Use adv.inventory instead of adventurer.inventory
-                                # Add an action for each item the adventurer can share
-                                possible_actions.append(("give_item", (adv, other_adventurer, item), 0))
-
+        sharing_pairs = self.get_sharing_pairs()
+        for adv, other_adventurer in sharing_pairs:
+            for item in adv.inventory:
+                # Add an action for each item the adventurer can share
+                possible_actions.append(("give_item", (adv, other_adventurer, item), 0))
 
         # Sharing water between adventurers in the same tile
-        for tile in self.tiles.values():
-            if len(tile.adventurers) > 1:  # There's potential for water sharing
-                for i, adventurer in enumerate(tile.adventurers):
-                    for other_adventurer in tile.adventurers[i+1:]:
-                        if other_adventurer.water < other_adventurer.max_water:
-                            possible_actions.append(("give_water", (adventurer, other_adventurer), 0))
+        for adventurer, other_adventurer in sharing_pairs:
+            if other_adventurer.water < other_adventurer.max_water:
+                possible_actions.append(("give_water", (adventurer, other_adventurer), 0))
 
         # Move between tunnel tiles
         if isinstance(current_adventurer.tile, TunnelTile):
@@ -357,7 +661,45 @@ class Game:
         
         return possible_actions
 
+    def cached_actions(self, key):
+        return self.action_cache.get(key)
+
+    def cache_actions(self, key, actions):
+        # Boards seen long ago are unlikely to come back
+        if len(self.action_cache) >= 4096:
+            self.action_cache.clear()
+        self.action_cache[key] = actions
+        return actions
+
+    def get_sharing_pairs(self):
+        """
+        Returns the (giver, receiver) pairs of adventurers standing on the same tile, where the receiver
+        arrived after the giver. Only recomputed after an adventurer joined or left a tile.
+        """
+        version, pairs = self.sharing_pairs
+        if version != self.occupancy_version:
+            pairs = []
+            adventurer_list = self.adventurer_list
+            # Only the cells with more than one adventurer have potential for sharing, taken in the order of
+            # Game.tiles
+            occupied = shared_board = 0
+            for cell in self.adventurer_cells:
+                shared_board |= occupied & 1 << cell
+                occupied |= 1 << cell
+            shared = [self.cell_to_tile[cell] for cell in bits(shared_board)]
+            if len(shared) > 1:
+                shared.sort(key=lambda tile: tile.index)
+            for tile in shared:
+                for i, index in enumerate(tile.occupants):
+                    for other_index in tile.occupants[i+1:]:
+                        pairs.append((adventurer_list[index], adventurer_list[other_index]))
+            self.sharing_pairs = (self.occupancy_version, pairs)
+        return pairs
+
     def perform_action(self, adventurer, chosen_action):
+        if self.undo_stack is not None:
+            self.begin_undo_record()
+
         action_type = chosen_action[0]
         if action_type == "move":
             adventurer.move(chosen_action[1])
@@ -389,6 +731,7 @@ class Game:
         elif action_type == "use_item":
             player = chosen_action[1][0]
             item = chosen_action[1][1]
+            self.touch(player)  # The item leaves the player's inventory
             if isinstance(item, TimeThrottle):
                 player.inventory.remove(item)
             elif isinstance(item, JetPack):
@@ -397,17 +740,18 @@ class Game:
                 player.inventory.remove(item)
             elif isinstance(item, Terrascope):
                 tile_to_reveal = chosen_action[1][2]
-                self.log_file.write(f"Tile Revealed: {tile_to_reveal.name}\n\n")
+                if self.log_level >= LOG_EVENTS:
+                    self.log_file.write(f"Tile Revealed: {tile_to_reveal.name}\n\n")
                 player.inventory.remove(item)
             elif isinstance(item, SecretWaterReserve):
-                item.apply(adventurer)
+                item.apply(self, adventurer)
                 player.inventory.remove(item)
             elif isinstance(item, DuneBlaster):
                 tile_to_clear = chosen_action[1][2]
-                item.apply(tile_to_clear)
+                item.apply(self, tile_to_clear)
                 player.inventory.remove(item)
             elif isinstance(item, SolarShield):
-                item.apply(adventurer)
+                item.apply(self, adventurer)
                 player.inventory.remove(item)
         elif action_type == "ability":
             if isinstance(adventurer, Archeologist):
@@ -431,30 +775,46 @@ class Game:
         elif action_type == "mitigate":
             adventurer.mitigate() 
         elif action_type == "peek_deck":
-            choice = random.choice(adventurer.possible_choices())           
+            choice = self.policy_rng.choice(adventurer.possible_choices())           
 
-        self.print_game(adventurer, chosen_action)
+        if self.log_level >= LOG_EVENTS:
+            self.print_game(adventurer, chosen_action)
+
+        if self.undo_stack is not None:
+            self.end_undo_record()
 
     def check_game_status(self):
-        if any(adventurer.water <= 0 for adventurer in self.adventurers.values()):
+        # Every condition is read from a counter kept up to date as the game changes, so this takes the same
+        # time at any point of the game
+        if self.dry_adventurers:
             self.is_game_over = True
-            self.log_file.write("Game over. An adventurer has run out of water.")
+            self.outcome = "water"
+            if self.log_level >= LOG_OUTCOME:
+                self.log_file.write("Game over. An adventurer has run out of water.")
         elif self.total_sand > 48:
             self.is_game_over = True
-            self.log_file.write("Game Over. Adventurers have been buried in the sand.")
+            self.outcome = "sand"
+            if self.log_level >= LOG_OUTCOME:
+                self.log_file.write("Game Over. Adventurers have been buried in the sand.")
         elif self.sand_storm_level > 15:
             self.is_game_over = True
-            self.log_file.write("Game Over. Sand Storm is too strong.")
+            self.outcome = "storm"
+            if self.log_level >= LOG_OUTCOME:
+                self.log_file.write("Game Over. Sand Storm is too strong.")
         elif self.all_parts_collected() and self.all_adventurers_on_boat():
             self.is_game_over = True
-            self.log_file.write("Game won!")
+            self.outcome = "won"
+            if self.log_level >= LOG_OUTCOME:
+                self.log_file.write("Game won!")
 
     def check_placement(self):
         if self.propeller_tiles_flipped == 2:
             propeller_x_tile = self.tiles["propeller_v"].x_coordinate
             propeller_y_tile = self.tiles["propeller_h"].y_coordinate
             propeller_tile = self.coordinate_to_tile[(propeller_x_tile, propeller_y_tile)]
-            self.log_file.write(f"Propeller has appeared at {propeller_tile.name} \n")
+            if self.log_level >= LOG_EVENTS:
+                self.log_file.write(f"Propeller has appeared at {propeller_tile.name} \n")
+            self.touch(propeller_tile)
             propeller_tile.boat_parts.append("Propeller")
             self.propeller_tiles_flipped += 1
 
@@ -462,7 +822,9 @@ class Game:
             motor_x_tile = self.tiles["motor_v"].x_coordinate
             motor_y_tile = self.tiles["motor_h"].y_coordinate
             motor_tile = self.coordinate_to_tile[(motor_x_tile, motor_y_tile)]
-            self.log_file.write(f"Motor has appeared at {motor_tile.name}\n")
+            if self.log_level >= LOG_EVENTS:
+                self.log_file.write(f"Motor has appeared at {motor_tile.name}\n")
+            self.touch(motor_tile)
             motor_tile.boat_parts.append("Motor")
             self.motor_tiles_flipped += 1
         
@@ -470,7 +832,9 @@ class Game:
             gem_x_tile = self.tiles["gem_v"].x_coordinate
             gem_y_tile = self.tiles["gem_h"].y_coordinate
             gem_tile = self.coordinate_to_tile[(gem_x_tile, gem_y_tile)]
-            self.log_file.write(f"Gem has appeared at {gem_tile.name}\n")
+            if self.log_level >= LOG_EVENTS:
+                self.log_file.write(f"Gem has appeared at {gem_tile.name}\n")
+            self.touch(gem_tile)
             gem_tile.boat_parts.append("Gem")
             self.gem_tiles_flipped += 1
         
@@ -478,7 +842,9 @@ class Game:
             compass_x_tile = self.tiles["compass_v"].x_coordinate
             compass_y_tile = self.tiles["compass_h"].y_coordinate
             compass_tile = self.coordinate_to_tile[(compass_x_tile, compass_y_tile)]
-            self.log_file.write(f"Compass has appeared at {compass_tile.name}\n")
+            if self.log_level >= LOG_EVENTS:
+                self.log_file.write(f"Compass has appeared at {compass_tile.name}\n")
+            self.touch(compass_tile)
             compass_tile.boat_parts.append("Compass")
             self.compass_tiles_flipped += 1
 
@@ -488,7 +854,8 @@ class Game:
     def all_adventurers_on_boat(self):
         boat_tile = self.tiles.get("boat")  # Get the boat tile object
         if not boat_tile.blocked:  # Check if boat tile exists and is not blocked
-            return all(adventurer.tile == boat_tile for adventurer in self.adventurers.values())
+            # Everyone is on it if its cell holds all of them, see Game.occupancy
+            return self.occupancy[boat_tile.cell] == (1 << len(self.adventurer_list)) - 1
         return False
 
 
@@ -504,9 +871,50 @@ def clear_log_directory(log_dir):
                 print(f"Failed to delete {file_path}. Reason: {e}")
 
 
-def main(num_games):
-    highest_round = 0
-    total_rounds = 0
+def play_game(task):
+    """
+    Plays game number i and returns a small record of how it went. This is what the worker processes run.
+    Each game draws from its own seed, derived from the run's seed and the game number, so a game plays
+    the same whichever worker gets it. The log of the game comes back with the record, for main to archive.
+    """
+    i, seed, log_dir, log_level, record, profile = task
+    profile = Profile() if profile else None
+    log_file = io.StringIO() if log_level != LOG_NONE else None  # With LOG_NONE, no log file is opened at all
+    game = Game(log_file, seed=f"{seed}:{i}", log_level=log_level, record=record, profile=profile)
+    if log_file:
+        print(f"Starting game {i + 1}...")
+    game.start_game()
+
+    if record:
+        # See replay.py to read it back
+        with open(os.path.join(log_dir, f"game_record_{i}.bin"), "wb") as record_file:
+            record_file.write(game.recorder.record())
+
+    result = {
+        "game": i,
+        "rounds": game.round,
+        "outcome": game.outcome,
+        "total_sand": game.total_sand,
+        "storm_level": game.sand_storm_level,
+        "parts": game.boat_parts_picked,
+        "tiles_flipped": bin(game.flipped_board).count("1"),
+    }
+    if log_level != LOG_NONE:
+        result["log"] = log_file.getvalue()
+    if profile:
+        result["profile"] = profile.as_dict()
+        with open(os.path.join(log_dir, f"game_profile_{i}.json"), "w") as profile_file:
+            json.dump(result["profile"], profile_file)
+    return result
+
+
+def main(num_games, workers=1, seed=None, log_level=LOG_BOARD, record=False, profile=False, snapshot_every=10000):
+    """
+    Plays num_games games and reports their statistics. Snapshots of the statistics are written to
+    game_logs/results.json every snapshot_every games and at the end, see stats.py. The logs of the games
+    go to the archive game_logs/game_logs, see archive.py. Returns the Stats of the run.
+    """
+    stats = Stats()
 
     # Ensure the log directory exists
     log_dir = "game_logs"
@@ -515,25 +923,68 @@ def main(num_games):
     # Clear the log directory
     clear_log_directory(log_dir)
 
-    for i in range(num_games):
-        log_file_name = os.path.join(log_dir, f"game_log_{i}.txt")
-        with open(log_file_name, "w") as log_file:
-            game = Game(log_file)
-            print(f"Starting game {i + 1}...")
-            game.start_game()
-            total_rounds += game.round
-            if game.round > highest_round:
-                highest_round = game.round
-
-    average_rounds = total_rounds / num_games
-    print(f"Average rounds per game: {average_rounds}")
-    print(f"Highest round reached in any game: {highest_round}")
-
+    if seed is None:
+        seed = new_seed()
+    tasks = ((i, seed, log_dir, log_level, record, profile) for i in range(num_games))
+    results_file = ResultsFile(os.path.join(log_dir, "results.json"))
+    archive = ArchiveWriter(os.path.join(log_dir, "game_logs")) if log_level != LOG_NONE else None
+    run_profile = Profile()  # All the games' profiles added up
+
+    if workers > 1:
+        # Games are handed out in chunks so that the workers do not wait on the parent between games
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(play_game, tasks, chunksize=max(1, num_games // (workers * 16)))
+    else:
+        pool = None
+        results = map(play_game, tasks)
+
+    try:
+        for result in results:
+            if archive:
+                archive.put(result["game"], result.pop("log"))
+            stats.add(result)
+            if stats.games % snapshot_every == 0:
+                results_file.append(stats.row())
+            if profile:
+                run_profile.merge(result["profile"])
+    finally:
+        # Even if the run is cut short, the logs queued so far are written, as the writer's thread would
+        # otherwise die with the process
+        if archive:
+            archive.close()
+
+    if pool:
+        pool.close()
+        pool.join()
+
+    if stats.games % snapshot_every:
+        results_file.append(stats.row())
+
+    rounds = stats.metrics["rounds"]
+    print(f"Average rounds per game: {rounds.average()}")
+    print(f"Highest round reached in any game: {rounds.maximum()}")
+    print(f"Average sand at the end: {stats.metrics['total_sand'].average()}")
+    print(f"Average storm level at the end: {stats.metrics['storm_level'].average()}")
+    for outcome, count in sorted(stats.outcomes.items()):
+        if count:
+            print(f"Games {'won' if outcome == 'won' else 'lost to ' + outcome}: {count} ({100 * count / num_games:.1f}%)")
+    print(stats.summary())
+    print(f"Seed: {seed}")
+
+    if profile:
+        with open(os.path.join(log_dir, "profile.json"), "w") as profile_file:
+            json.dump(run_profile.as_dict(), profile_file)
+        print(run_profile.report())
+    return stats
 
 
 if __name__ == "__main__":
-    # Default number of games
+    # Default number of games, of worker processes, and log level. Games are not recorded nor profiled by default
     num_games = 1
+    workers = 1
+    log_level = LOG_BOARD
+    record = False
+    profile = False
 
     # Check if an argument is provided
     if len(sys.argv) > 1:
@@ -544,5 +995,29 @@ if __name__ == "__main__":
         except ValueError:
             print("Invalid number of games. Please try again.")
             sys.exit(1)
-    
-    main(num_games)
+
+    if len(sys.argv) > 2:
+        try:
+            workers = int(sys.argv[2])
+            if workers <= 0:
+                raise ValueError
+        except ValueError:
+            print("Invalid number of workers. Please try again.")
+            sys.exit(1)
+
+    if len(sys.argv) > 3:
+        if sys.argv[3] not in LOG_LEVELS:
+            print(f"Invalid log level. Choose one of: {', '.join(LOG_LEVELS)}.")
+            sys.exit(1)
+        log_level = LOG_LEVELS[sys.argv[3]]
+
+    for option in sys.argv[4:]:
+        if option == "record":
+            record = True
+        elif option == "profile":
+            profile = True
+        else:
+            print("Invalid option. To record the games, add: record. To profile them, add: profile.")
+            sys.exit(1)
+
+    main(num_games, workers, log_level=log_level, record=record, profile=profile)
@@ -1,54 +1,56 @@
 import random
+import weakref
+from zobrist import *
 
 class GearDeck:
-    def __init__(self, game):
-        self.game = game
+    def __init__(self, game, rng=random):
+        self.game_ref = weakref.ref(game)  # Weak, so that the game and its deck do not keep each other alive
+        self.rng = rng  # The game's gear stream
+        self.cards = ALL_GEAR_CARDS  # Every card by index. The deck holds the indices
         self.gear_deck = self.create()
 
     def create(self):
-        # create deck of gear_cards
-        gear_deck = []
+        # create deck of gear_cards, by index in GearDeck.cards. The cards hold nothing of a game, so all games share them
+        return list(range(len(self.cards)))
 
-        # 3 DuneBlaster
-        for i in range(3):
-            gear_deck.append(DuneBlaster(f"Dune Blaster {i+1}/3"))
-
-        # 3 JetPack
-        for i in range(3):
-            gear_deck.append(JetPack(f"Jet Pack {i+1}/3"))
-
-        # 2 Terrascope
-        for i in range(2):
-            gear_deck.append(Terrascope(f"Terrascope {i+1}/2"))
-
-        # 2 SolarShield
-        for i in range(2):
-            gear_deck.append(SolarShield(f"Solar Shield {i+1}/2"))
+    def shuffle(self):
+        self.rng.shuffle(self.gear_deck)
 
-        # 1 TimeThrottle
-        for i in range(1):
-            gear_deck.append(TimeThrottle(f"Time Throttle {i+1}/1"))
+    def reset(self):
+        # The deck as it comes out of the box, not shuffled yet, see Game.reset
+        self.gear_deck = self.create()
 
-        # 1 SecretWaterReserve
-        for i in range(1):
-            gear_deck.append(SecretWaterReserve(f"Secret Water Reserve {i+1}/1"))
+    def get_state(self):
+        return tuple(self.gear_deck)
 
-        return gear_deck
+    def set_state(self, state):
+        self.gear_deck = list(state)
 
-    def shuffle(self):
-        random.shuffle(self.gear_deck)
+    def zobrist_key(self):
+        # Which cards are still to come, not in which order
+        key = GEAR_LEFT_KEYS[len(self.gear_deck) & 15]
+        for card in self.gear_deck:
+            key ^= GEAR_IN_DECK_KEYS[card]
+        return key
 
     def draw(self, adventurer):
+        game = self.game_ref()
         if not self.gear_deck:
             return None
 
+        game.touch(self)
         card = self.gear_deck.pop()
-        adventurer.get_item(card)
+        if game.recorder is not None:
+            game.recorder.gear_draw(card)
+        adventurer.get_item(self.cards[card])
 
 
 class DuneBlaster:
+    __slots__ = ("name", "index")
+
     def __init__(self, name):
         self.name = name
+        self.index = None  # Position in GearDeck.cards
 
     def __str__(self):
         return self.name
@@ -56,15 +58,20 @@ class DuneBlaster:
     def __repr__(self):
         return f"{self.name}"
     
-    def apply(self, tile):
+    def apply(self, game, tile):
+        game.touch(tile)
         tile.sand = 0
         tile.blocked = False
+        tile.update_bitboards(game)
         #print("All sand was cleared!")
 
 
 class JetPack:
+    __slots__ = ("name", "index")
+
     def __init__(self, name):
         self.name = name
+        self.index = None  # Position in GearDeck.cards
 
     def __str__(self):
         return self.name
@@ -72,13 +79,16 @@ class JetPack:
     def __repr__(self):
         return f"{self.name}"
 
-    def apply(self, adventurer, move):
+    def apply(self, game, adventurer, move):
         adventurer.move(move)
 
 
 class Terrascope:
+    __slots__ = ("name", "index")
+
     def __init__(self, name):
         self.name = name
+        self.index = None  # Position in GearDeck.cards
 
     def __str__(self):
         return self.name
@@ -86,13 +96,16 @@ class Terrascope:
     def __repr__(self):
         return f"{self.name}"
 
-    def apply(self, tile):
+    def apply(self, game, tile):
         return tile.name
 
 
 class SolarShield:
+    __slots__ = ("name", "index")
+
     def __init__(self, name):
         self.name = name
+        self.index = None  # Position in GearDeck.cards
 
     def __str__(self):
         return self.name
@@ -100,13 +113,17 @@ class SolarShield:
     def __repr__(self):
         return f"{self.name}"
 
-    def apply(self, adventurer):
+    def apply(self, game, adventurer):
+        game.touch(adventurer)
         adventurer.solar_shield_active = True
 
 
 class TimeThrottle:
+    __slots__ = ("name", "index")
+
     def __init__(self, name):
         self.name = name
+        self.index = None  # Position in GearDeck.cards
 
     def __str__(self):
         return self.name
@@ -114,13 +131,16 @@ class TimeThrottle:
     def __repr__(self):
         return f"{self.name}"
 
-    def apply(self):
+    def apply(self, game):
         pass  # TBD
 
 
 class SecretWaterReserve:
+    __slots__ = ("name", "index")
+
     def __init__(self, name):
         self.name = name
+        self.index = None  # Position in GearDeck.cards
 
     def __str__(self):
         return self.name
@@ -128,9 +148,37 @@ class SecretWaterReserve:
     def __repr__(self):
         return f"{self.name}"
 
-    def apply(self, adventurer):
+    def apply(self, game, adventurer):
         #print(f"{adventurer.name} uses {self.name} on {adventurer.tile.name}.")
-        for adventurer in adventurer.tile.adventurers:
-            adventurer.get_water()
-            adventurer.get_water()
+        for index in adventurer.tile.occupants:
+            game.adventurer_list[index].get_water()
+            game.adventurer_list[index].get_water()
             #print(f"{adventurer.name} now has {adventurer.water} units of water.")
+
+
+"""
+The definitions of the gear cards, in the order of GearDeck.cards: (class, name).
+"""
+GEAR_CARD_TEMPLATES = tuple(
+    (card_class, f"{title} {i+1}/{copies}")
+    for card_class, title, copies in (
+        (DuneBlaster, "Dune Blaster", 3),
+        (JetPack, "Jet Pack", 3),
+        (Terrascope, "Terrascope", 2),
+        (SolarShield, "Solar Shield", 2),
+        (TimeThrottle, "Time Throttle", 1),
+        (SecretWaterReserve, "Secret Water Reserve", 1),
+    )
+    for i in range(copies)
+)
+
+
+def gear_cards():
+    cards = tuple(card_class(name) for card_class, name in GEAR_CARD_TEMPLATES)
+    for index, card in enumerate(cards):
+        card.index = index
+    return cards
+
+
+# The gear cards, built once from their definitions. A card holds nothing of a game, so all games share them
+ALL_GEAR_CARDS = gear_cards()
@@ -0,0 +1,19 @@
+"""
+Log levels. A game only writes what its level asks for, and at LOG_NONE it does not even build the strings.
+    LOG_NONE: Nothing.
+    LOG_OUTCOME: How the game ended.
+    LOG_EVENTS: Also one line per action, and the storm, gear and boat part events.
+    LOG_BOARD: Also the board and the adventurers after every action. This is the classic game log.
+"""
+LOG_NONE, LOG_OUTCOME, LOG_EVENTS, LOG_BOARD = range(4)
+LOG_LEVELS = {"none": LOG_NONE, "outcome": LOG_OUTCOME, "events": LOG_EVENTS, "board": LOG_BOARD}
+
+
+class NullLog:
+    """
+    Log sink that discards everything written to it. A log sink is any object with a write(text) method,
+    such as an open file.
+    """
+
+    def write(self, text):
+        pass
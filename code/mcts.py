@@ -0,0 +1,181 @@
+import math
+import random
+import sys
+import time
+from game import *
+from state import *
+
+
+def evaluate(s):
+    """
+    Value of a compact game for the adventurers, between 0 and 1: 1 if they won. Otherwise a mix of the
+    progress they made (boat parts picked, locator tiles flipped, tiles flipped), of the water they have
+    left, of whether they are still alive and of how long they lasted, so that rollouts that end in a loss,
+    as random ones nearly always do, still tell good moves from bad ones.
+    """
+    if s[OUTCOME] == WON:
+        return 1.0
+    flipped = sum(s[FLIPPED:FLIPPED + CELLS])
+    progress = (4 * s[PARTS_PICKED] + sum(s[PART_FLIPS:PART_FLIPS + 4]) + flipped / 8) / 27
+    if s[OUTCOME]:
+        return 0.4 * progress + 0.1 * min(s[ROUND], 10) / 10
+    water = sum(s[WATER_LEFT:WATER_LEFT + ADVENTURERS]) / sum(MAX_WATER)
+    return 0.4 * progress + 0.3 * water + 0.2 + 0.1 * min(s[ROUND], 10) / 10
+
+
+class Node:
+    """
+    A node of the search tree: the actions taken from the root lead to it, whatever the cards drawn.
+    Children are keyed by action id, see state.ACTION_TABLE.
+    """
+
+    def __init__(self):
+        self.children = {}
+        self.visits = 0
+        self.value = 0.0  # Sum of the values backed up through the node
+        self.available = 0  # Searches in which the node's action was legal
+
+
+class MCTS:
+    """
+    The MCTS class is a player: an instance is a policy (see game.random_policy), that searches for the best
+    action with Monte Carlo tree search instead of choosing at random.
+    The adventurers do not know the order of the storm and gear decks, so every search iteration plays on a
+    determinization: the compact state of the game (see state.py), with the undrawn cards of both decks
+    shuffled. The iterations share one tree of actions, in which an action is weighed against the others only
+    in the iterations it was legal in (information set MCTS). Each iteration adds one node, then plays at
+    random from there, for at most rollout_actions actions, and backs up the value of where it got (see evaluate).
+    Attributes:
+        node_budget (int): The number of nodes searched per decision, None for no limit.
+        time_budget (float): The time searched per decision, in seconds, None for no limit.
+        exploration (float): The exploration constant of UCB.
+        rollout_actions (int): The number of random actions played after the tree, at most.
+        rng (Random): The planner's random stream, for determinizations and rollouts.
+        decisions, nodes, seconds: Decisions made, nodes searched and time spent so far.
+
+    Methods:
+        search(game, adventurer, possible_actions): Returns the action chosen. Called as a policy.
+        nodes_per_second(): Nodes searched per second so far.
+    """
+
+    def __init__(
+        self, node_budget=None, time_budget=None, exploration=0.7, rollout_actions=12, seed=None
+    ):
+        if node_budget is None and time_budget is None:
+            node_budget = 1000
+        self.node_budget = node_budget
+        self.time_budget = time_budget
+        self.exploration = exploration
+        self.rollout_actions = rollout_actions
+        self.rng = random.Random(seed)
+        self.decisions = 0
+        self.nodes = 0
+        self.seconds = 0.0
+
+    def __call__(self, game, adventurer, possible_actions):
+        return self.search(game, adventurer, possible_actions)
+
+    def nodes_per_second(self):
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+    def search(self, game, adventurer, possible_actions):
+        ids = [action_id(compact_action(game, adventurer, action)) for action in possible_actions]
+        if len(set(ids)) == 1:
+            return possible_actions[0]
+
+        began = time.perf_counter()
+        root_state = GameState.from_game(game).s
+        root = Node()
+        nodes = 0
+        while True:
+            self.iterate(root, self.determinize(root_state))
+            nodes += 1
+            if self.node_budget is not None and nodes >= self.node_budget:
+                break
+            if self.time_budget is not None and time.perf_counter() - began >= self.time_budget:
+                break
+
+        self.decisions += 1
+        self.nodes += nodes
+        self.seconds += time.perf_counter() - began
+
+        # The most visited action. Duplicates of an item all lead to the same node
+        best = max(ids, key=lambda i: root.children[i].visits if i in root.children else -1)
+        return possible_actions[ids.index(best)]
+
+    def determinize(self, s):
+        s = s[:]
+        storm_left = s[STORM_LEFT]
+        storm_deck = s[STORM_DECK:STORM_DECK + storm_left]
+        self.rng.shuffle(storm_deck)
+        s[STORM_DECK:STORM_DECK + storm_left] = storm_deck
+        gear_left = s[GEAR_LEFT]
+        gear_deck = s[GEAR_DECK:GEAR_DECK + gear_left]
+        self.rng.shuffle(gear_deck)
+        s[GEAR_DECK:GEAR_DECK + gear_left] = gear_deck
+        return s
+
+    def iterate(self, root, s):
+        rng = self.rng
+        node = root
+        path = [root]
+
+        # Selection, down to the first action not tried yet, which is expanded
+        while not s[OUTCOME]:
+            untried = []
+            best = None
+            best_score = -1.0
+            seen = set()
+            for action in legal_actions(s, current_adventurer(s)):
+                i = action_id(action)
+                if i in seen:
+                    continue
+                seen.add(i)
+                child = node.children.get(i)
+                if child is None:
+                    untried.append((i, action))
+                    continue
+                child.available += 1
+                score = child.value / child.visits + self.exploration * math.sqrt(
+                    math.log(child.available) / child.visits
+                )
+                if score > best_score:
+                    best, best_score = (child, action), score
+
+            if untried:
+                i, action = rng.choice(untried)
+                node.children[i] = child = Node()
+                child.available = 1
+                step(s, action, rng, rng)
+                path.append(child)
+                break
+            child, action = best
+            step(s, action, rng, rng)
+            node = child
+            path.append(child)
+
+        # Rollout
+        for _ in range(self.rollout_actions):
+            if s[OUTCOME]:
+                break
+            step(s, rng.choice(legal_actions(s, current_adventurer(s))), rng, rng)
+
+        value = evaluate(s)
+        for node in path:
+            node.visits += 1
+            node.value += value
+
+
+if __name__ == "__main__":
+    # Plays games with the planner and reports the outcomes and the search speed
+    num_games = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    node_budget = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    planner = MCTS(node_budget=node_budget, seed=0)
+    outcomes = {}
+    for i in range(num_games):
+        game = Game(seed=f"mcts:{i}", policy=planner)
+        game.start_game()
+        outcomes[game.outcome] = outcomes.get(game.outcome, 0) + 1
+        print(f"Game {i}: {game.outcome} in round {game.round}, {game.boat_parts_picked}/4 boat parts.")
+    print(f"Outcomes: {outcomes}")
+    print(f"{planner.decisions} decisions, {planner.nodes_per_second():.0f} nodes/second.")
@@ -0,0 +1,128 @@
+import time
+from stormdeck import *
+
+
+class Profile:
+    """
+    The Profile class accumulates, for one or many games, the wall time spent in and the number of calls to
+    the simulator's hot paths: action generation, each kind of action, storm draws and card effects, checks
+    of the game status and log writes. It also counts how many actions the adventurers had to choose from,
+    per round (the branching factor).
+    It is opt-in: Game(profile=Profile()) attaches it to the game, by wrapping those methods of that game's
+    own objects only. Games without a profile run the plain methods, so profiling costs nothing when it is off.
+    Times include the calls nested in them: perform_action/flip includes the check_placement it triggers.
+    Attributes:
+        calls (dict): The number of calls, per hot path.
+        nanoseconds (dict): The total wall time, per hot path.
+        branching (dict): For every round, how many times each number of possible actions came up.
+        games (int): The number of games profiled.
+
+    Methods:
+        attach(game): Starts profiling a game.
+        merge(other): Adds up another profile, or its as_dict(), into this one.
+        as_dict(): The profile as a dictionary of plain values, to be saved as JSON or sent between processes.
+        report(): A table of the hot paths, by total time.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.nanoseconds = {}
+        self.branching = {}
+        self.games = 0
+
+    def add(self, name, nanoseconds):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.nanoseconds[name] = self.nanoseconds.get(name, 0) + nanoseconds
+
+    def timed(self, name, method):
+        def timed_method(*args):
+            began = time.perf_counter_ns()
+            result = method(*args)
+            self.add(name, time.perf_counter_ns() - began)
+            return result
+
+        return timed_method
+
+    def attach(self, game):
+        self.games += 1
+        profile = self
+        get_possible_actions = game.get_possible_actions
+        perform_action = game.perform_action
+
+        def timed_get_possible_actions(current_adventurer):
+            began = time.perf_counter_ns()
+            possible_actions = get_possible_actions(current_adventurer)
+            profile.add("get_possible_actions", time.perf_counter_ns() - began)
+            histogram = profile.branching.setdefault(game.round, {})
+            histogram[len(possible_actions)] = histogram.get(len(possible_actions), 0) + 1
+            return possible_actions
+
+        def timed_perform_action(adventurer, chosen_action):
+            began = time.perf_counter_ns()
+            perform_action(adventurer, chosen_action)
+            profile.add(f"perform_action/{chosen_action[0]}", time.perf_counter_ns() - began)
+
+        # The cards are shared by all games, so their effects are timed where the game's deck resolves them
+        resolve = game.deck.resolve
+
+        def timed_resolve(card):
+            began = time.perf_counter_ns()
+            resolve(card)
+            if STORM_CARD_KINDS[card] != STORM_PICKS_UP:
+                profile.add(f"{type(ALL_STORM_CARDS[card]).__name__}.apply", time.perf_counter_ns() - began)
+
+        game.get_possible_actions = timed_get_possible_actions
+        game.perform_action = timed_perform_action
+        game.check_game_status = self.timed("check_game_status", game.check_game_status)
+        game.deck.draw = self.timed("Deck.draw", game.deck.draw)
+        game.deck.resolve = timed_resolve
+        game.log_file = TimedLog(game.log_file, self)
+
+    def merge(self, other):
+        if isinstance(other, Profile):
+            other = other.as_dict()
+        for name, calls in other["calls"].items():
+            self.calls[name] = self.calls.get(name, 0) + calls
+            self.nanoseconds[name] = self.nanoseconds.get(name, 0) + other["nanoseconds"][name]
+        for game_round, histogram in other["branching"].items():
+            merged = self.branching.setdefault(int(game_round), {})
+            for actions, count in histogram.items():
+                merged[int(actions)] = merged.get(int(actions), 0) + count
+        self.games += other["games"]
+
+    def as_dict(self):
+        return {
+            "games": self.games,
+            "calls": dict(self.calls),
+            "nanoseconds": dict(self.nanoseconds),
+            "branching": {game_round: dict(histogram) for game_round, histogram in sorted(self.branching.items())},
+        }
+
+    def report(self):
+        lines = [f"Profile of {self.games} game(s):"]
+        lines.append(f"{'':40} {'calls':>10} {'total ms':>10} {'us/call':>10}")
+        for name, nanoseconds in sorted(self.nanoseconds.items(), key=lambda item: -item[1]):
+            calls = self.calls[name]
+            lines.append(f"{name:40} {calls:10} {nanoseconds / 1e6:10.1f} {nanoseconds / calls / 1e3:10.2f}")
+
+        lines.append("Possible actions per round (average, most):")
+        for game_round, histogram in sorted(self.branching.items()):
+            decisions = sum(histogram.values())
+            average = sum(actions * count for actions, count in histogram.items()) / decisions
+            lines.append(f"    Round {game_round}: {average:.1f}, {max(histogram)} ({decisions} decisions)")
+        return "\n".join(lines)
+
+
+class TimedLog:
+    """
+    Stands in for a game's log file, and times every write, see Profile.
+    """
+
+    def __init__(self, log_file, profile):
+        self.log_file = log_file
+        self.profile = profile
+
+    def write(self, text):
+        began = time.perf_counter_ns()
+        self.log_file.write(text)
+        self.profile.add("log write", time.perf_counter_ns() - began)
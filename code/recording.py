@@ -0,0 +1,125 @@
+"""
+Binary record of a game, for replay.py.
+A record is the game's seed followed by a stream of events, each one a few small integers, written as
+variable-length integers (7 bits per byte) so that almost every integer takes a single byte:
+    SHUFFLE stream n i1 .. in: A random stream shuffled n things into the given order (see RecordingRandom).
+    CHOICE stream i: A random stream chose the i-th of several things.
+    ACTION i: The adventurer chose the i-th of Game.get_possible_actions.
+    STORM_DRAW card: A card was drawn from the storm deck. The card is its index in Deck.cards.
+    GEAR_DRAW card: A card was drawn from the gear deck. The card is its index in GearDeck.cards.
+The first events lay out the board and the decks, the actions and the draws follow in the order they happen.
+Replaying the events alone rebuilds the game; the draws are also there to check that the replay went the same way.
+The record ends with the CRC-32 of everything before it, in CHECKSUM_BYTES bytes, so that a record cut short or
+corrupted is told apart from a game that went differently.
+"""
+import zlib
+
+MAGIC = b"FDR\x02"
+CHECKSUM_BYTES = 4
+
+# Events
+SHUFFLE, CHOICE, ACTION, STORM_DRAW, GEAR_DRAW = range(5)
+EVENT_NAMES = ["shuffle", "choice", "action", "storm draw", "gear draw"]
+
+# Random streams that get recorded. The policy stream does not: what the players chose is in the actions.
+LAYOUT, STORM, GEAR = range(3)
+STREAM_NAMES = ["layout", "storm", "gear"]
+
+
+def write_int(data, n):
+    while n >= 0x80:
+        data.append(n & 0x7F | 0x80)
+        n >>= 7
+    data.append(n)
+
+
+def read_int(data, position):
+    """
+    Returns the integer at position, and the position right after it.
+    """
+    n = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, position
+        shift += 7
+
+
+class Recorder:
+    """
+    The Recorder class writes down a game as it is played, see Game(record=True).
+    Attributes:
+        data (bytearray): The record so far, without its checksum.
+
+    Methods:
+        shuffle(stream, order), choice(stream, index): Called by the RecordingRandom of each stream.
+        action(index), storm_draw(card), gear_draw(card): Called by the game.
+        record(): The record, as it is written to a file.
+    """
+
+    def __init__(self, seed):
+        self.data = bytearray(MAGIC)
+        seed = str(seed).encode()
+        write_int(self.data, len(seed))
+        self.data += seed
+
+    def shuffle(self, stream, order):
+        self.data += bytes((SHUFFLE, stream))
+        write_int(self.data, len(order))
+        for index in order:
+            write_int(self.data, index)
+
+    def choice(self, stream, index):
+        self.data += bytes((CHOICE, stream))
+        write_int(self.data, index)
+
+    def action(self, index):
+        self.data.append(ACTION)
+        write_int(self.data, index)
+
+    def storm_draw(self, card):
+        self.data.append(STORM_DRAW)
+        write_int(self.data, card)
+
+    def gear_draw(self, card):
+        self.data.append(GEAR_DRAW)
+        write_int(self.data, card)
+
+    def record(self):
+        return bytes(self.data) + checksum(self.data)
+
+
+def checksum(data):
+    return zlib.crc32(data).to_bytes(CHECKSUM_BYTES, "little")
+
+
+class RecordingRandom:
+    """
+    Stands in for one of the game's random streams, and tells the recorder the outcome of every shuffle and choice.
+    The stream itself only ever shuffles or chooses positions, which draws exactly the same numbers from it
+    as shuffling or choosing the things themselves, so a recorded game plays like an unrecorded one.
+    """
+
+    def __init__(self, rng, recorder, stream):
+        self.rng = rng
+        self.recorder = recorder
+        self.stream = stream
+
+    def shuffle(self, things):
+        order = list(range(len(things)))
+        self.rng.shuffle(order)
+        things[:] = [things[i] for i in order]
+        self.recorder.shuffle(self.stream, order)
+
+    def choice(self, things):
+        index = self.rng.choice(range(len(things)))
+        self.recorder.choice(self.stream, index)
+        return things[index]
+
+    def getstate(self):
+        return self.rng.getstate()
+
+    def setstate(self, state):
+        self.rng.setstate(state)
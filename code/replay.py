@@ -0,0 +1,175 @@
+import sys
+from game import *
+
+
+class ReplayError(Exception):
+    pass
+
+
+class Replay:
+    """
+    The Replay class rebuilds a recorded game (see recording.py), at any point of the game.
+    Attributes:
+        seed (str): The seed of the recorded game.
+        events (list): The recorded events, as (event, stream, value) tuples. The stream is None for the
+        events that do not come from a random stream, the value is the order of a shuffle and an index otherwise.
+
+    Methods:
+        from_file(path): Reads a record written by Game(record=True).
+        game(actions, log_file, log_level): Replays the game, up to the given number of actions.
+        render(log_file): Writes the text log of the whole game, as Game writes it at LOG_BOARD.
+    """
+
+    def __init__(self, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ReplayError("Not a game record")
+        if len(data) < len(MAGIC) + CHECKSUM_BYTES or checksum(data[:-CHECKSUM_BYTES]) != data[-CHECKSUM_BYTES:]:
+            raise ReplayError("The record is cut short or corrupted")
+        data = data[:-CHECKSUM_BYTES]
+        try:
+            self.seed, self.events = parse(data)
+        except IndexError:
+            raise ReplayError("The record ends in the middle of an event")
+        self.actions = sum(1 for event, _, _ in self.events if event == ACTION)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "rb") as file:
+            return cls(file.read())
+
+    def game(self, actions=None, log_file=None, log_level=LOG_BOARD):
+        """
+        Returns the game as it was after the given number of actions (passes included), right before the
+        adventurer chose the next one, or at the end of the game if not given. It logs to log_file on the way.
+        The game can be played on: from there on, it draws from fresh random streams of the recorded seed.
+        """
+        playback = Playback(self.events, self.actions if actions is None else actions)
+        game = Game(log_file, self.seed, playback.policy, log_level, setup=False)
+        game.layout_rng = ScriptedRandom(playback, LAYOUT)
+        game.deck.rng = game.storm_rng = ScriptedRandom(playback, STORM)
+        game.gear_deck.rng = game.gear_rng = ScriptedRandom(playback, GEAR)
+        game.recorder = playback
+
+        game.setup()
+        try:
+            game.start_game()
+        except StopReplay:
+            pass
+        else:
+            if playback.position != len(self.events):
+                raise ReplayError(f"The game ended at event {playback.position} of {len(self.events)}")
+
+        game.recorder = None
+        game.policy = random_policy
+        game.layout_rng, game.storm_rng, game.gear_rng, game.policy_rng = make_rngs(self.seed)
+        game.deck.rng = game.storm_rng
+        game.gear_deck.rng = game.gear_rng
+        return game
+
+    def render(self, log_file):
+        self.game(log_file=log_file)
+
+
+def parse(data):
+    # The seed and the events of a record, without its checksum
+    length, position = read_int(data, len(MAGIC))
+    seed = bytes(data[position:position + length]).decode()
+    position += length
+
+    events = []
+    while position < len(data):
+        event = data[position]
+        position += 1
+        stream = None
+        if event in (SHUFFLE, CHOICE):
+            stream = data[position]
+            position += 1
+        if event == SHUFFLE:
+            length, position = read_int(data, position)
+            value = []
+            for _ in range(length):
+                index, position = read_int(data, position)
+                value.append(index)
+        elif event < len(EVENT_NAMES):
+            value, position = read_int(data, position)
+        else:
+            raise ReplayError(f"Unknown event {event}")
+        events.append((event, stream, value))
+    return seed, events
+
+
+class StopReplay(Exception):
+    pass
+
+
+class Playback:
+    """
+    Feeds the recorded events back to a game, in order. It chooses the game's actions, and stands in for
+    the game's recorder to check every card drawn against the record.
+    """
+
+    def __init__(self, events, actions):
+        self.events = events
+        self.position = 0
+        self.actions_left = actions
+
+    def next(self, event, stream=None):
+        if self.position == len(self.events):
+            raise ReplayError(f"The record ended, expected a {EVENT_NAMES[event]}")
+        recorded_event, recorded_stream, value = self.events[self.position]
+        if recorded_event != event or recorded_stream != stream:
+            raise ReplayError(
+                f"Expected a {EVENT_NAMES[event]} at event {self.position}, found a {EVENT_NAMES[recorded_event]}"
+            )
+        self.position += 1
+        return value
+
+    def policy(self, game, adventurer, possible_actions):
+        if self.actions_left == 0:
+            raise StopReplay
+        self.actions_left -= 1
+        index = self.next(ACTION)
+        if index >= len(possible_actions):
+            raise ReplayError(f"Recorded action {index} of {len(possible_actions)} at event {self.position - 1}")
+        return possible_actions[index]
+
+    def action(self, index):
+        pass  # Already taken from the record by policy()
+
+    def storm_draw(self, card):
+        if self.next(STORM_DRAW) != card:
+            raise ReplayError(f"A different storm card was drawn at event {self.position - 1}")
+
+    def gear_draw(self, card):
+        if self.next(GEAR_DRAW) != card:
+            raise ReplayError(f"A different gear card was drawn at event {self.position - 1}")
+
+
+class ScriptedRandom:
+    """
+    Stands in for one of the game's random streams, and repeats the recorded shuffles and choices.
+    """
+
+    def __init__(self, playback, stream):
+        self.playback = playback
+        self.stream = stream
+
+    def shuffle(self, things):
+        order = self.playback.next(SHUFFLE, self.stream)
+        if len(order) != len(things):
+            raise ReplayError(f"Recorded a shuffle of {len(order)} things, not {len(things)}")
+        things[:] = [things[i] for i in order]
+
+    def choice(self, things):
+        return things[self.playback.next(CHOICE, self.stream)]
+
+
+if __name__ == "__main__":
+    # Writes the log of a recorded game, optionally only up to a number of actions
+    if len(sys.argv) < 2:
+        print("Usage: python replay.py <record> [actions]")
+        sys.exit(1)
+
+    replay = Replay.from_file(sys.argv[1])
+    actions = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    replay.game(actions, sys.stdout)
@@ -0,0 +1,30 @@
+import random
+
+
+STREAMS = ("layout", "storm", "gear", "policy")
+
+
+def make_rngs(seed):
+    """
+    Every game owns its random number generators, all derived from the game's seed:
+        layout: where the tiles go and the player order.
+        storm: the order of the storm deck, including reshuffles.
+        gear: the order of the gear deck.
+        policy: the choices made by the players.
+    Being separate streams, two games with the same seed get the same board and the same storms
+    whatever their players do, and no game touches the shared random module.
+    """
+    return tuple(random.Random(f"{seed}:{stream}") for stream in STREAMS)
+
+
+def reseed_rngs(rngs, seed):
+    """
+    Turns the generators of make_rngs into the ones of make_rngs(seed), in place, and returns them.
+    """
+    for rng, stream in zip(rngs, STREAMS):
+        rng.seed(f"{seed}:{stream}")
+    return rngs
+
+
+def new_seed():
+    return random.randrange(2**63)
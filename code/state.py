@@ -0,0 +1,946 @@
+from board import *
+from geardeck import *
+from seeding import *
+from stormdeck import *
+
+
+"""
+Static tables of the compact engine.
+Tiles, adventurers, cards and items are all identified by small integers. The orderings follow the
+ones used by Game: tiles and adventurers in the order of Game.tiles/Game.adventurers, storm and gear
+cards in the order of Deck.create/GearDeck.create.
+"""
+ADVENTURERS = 6
+ITEMS = 6
+
+# Tiles, in the same order as Game.initialize_tiles
+TILE_NAMES = [
+    "start", "storm", "tunnel_1", "tunnel_2", "tunnel_3", "boat",
+    "gem_h", "gem_v", "motor_h", "motor_v", "compass_h", "compass_v", "propeller_h", "propeller_v",
+    "water_1", "water_2", "mirage",
+    "dune_1", "dune_2", "dune_3", "dune_4", "dune_5", "dune_6", "dune_7", "dune_8",
+]
+TILE_SYMBOLS = [
+    "S", "X", "T1", "T2", "T3", "B",
+    "Gh", "Gv", "Mh", "Mv", "Ch", "Cv", "Ph", "Pv",
+    "W1", "W2", "M",
+    "D1", "D2", "D3", "D4", "D5", "D6", "D7", "D8",
+]
+START, STORM, BOAT = 0, 1, 5
+TUNNELS = (2, 3, 4)
+
+# What happens when a tile is flipped
+PLAIN, GEAR, TUNNEL, PART, WATER, MIRAGE = range(6)
+TILE_KINDS = [GEAR, PLAIN, TUNNEL, TUNNEL, TUNNEL, PLAIN] + [PART] * 8 + [WATER, WATER, MIRAGE] + [GEAR] * 8
+
+# Boat parts, in the order in which Game.check_placement looks at them. Each one is a bit in the PARTS mask.
+PART_NAMES = ["Propeller", "Motor", "Gem", "Compass"]
+PART_OF_TILE = {12: 0, 13: 0, 8: 1, 9: 1, 6: 2, 7: 2, 10: 3, 11: 3}
+PART_LOCATORS = [(12, 13), (8, 9), (6, 7), (10, 11)]  # (horizontal tile, vertical tile) for each part
+
+# Adventurers, in the same order as Game.initialize_adventurers
+ARCHEOLOGIST, CLIMBER, EXPLORER, METEOROLOGIST, NAVIGATOR, WATER_CARRIER = range(6)
+ADVENTURER_NAMES = ["archeologist", "climber", "explorer", "meteorologist", "navigator", "water_carrier"]
+ADVENTURER_SYMBOLS = ["A", "C", "E", "M", "N", "WC"]
+MAX_WATER = [3, 3, 4, 4, 4, 5]
+
+# Gear items, in the order GearDeck.create adds them. Inventories are counts per item.
+DUNE_BLASTER, JET_PACK, TERRASCOPE, SOLAR_SHIELD, TIME_THROTTLE, SECRET_WATER_RESERVE = range(6)
+ITEM_TYPES = [DuneBlaster, JetPack, Terrascope, SolarShield, TimeThrottle, SecretWaterReserve]
+GEAR_CARD_ITEMS = [ITEM_TYPES.index(type(card)) for card in ALL_GEAR_CARDS]
+
+# Storm cards, in the order of Deck.cards. Their kinds, steps and effects on the board are in stormdeck.py.
+STORM_CARDS = len(STORM_CARD_KINDS)
+GEAR_CARDS = len(GEAR_CARD_ITEMS)
+
+# Cells are laid out as in board.py
+INITIAL_SAND = [x + 5 * y for x, y in [(0, 2), (1, 1), (1, 3), (2, 0), (2, 4), (3, 1), (3, 3), (4, 2)]]
+
+
+"""
+Layout of the state vector.
+The whole state of a game is a single flat list of small integers. Each section below is an offset
+into that list, so copying a game is one list copy and no Python objects are allocated while playing.
+"""
+SAND = 0  # Sand markers, per cell
+FLIPPED = SAND + CELLS  # 1 if the tile on the cell is flipped, per cell
+TILE = FLIPPED + CELLS  # Tile on the cell, per cell
+TILE_CELL = TILE + CELLS  # Cell of the tile, per tile
+PARTS = TILE_CELL + CELLS  # Bitmask of boat parts lying on the cell, per cell
+POSITION = PARTS + CELLS  # Cell of the adventurer, per adventurer
+WATER_LEFT = POSITION + ADVENTURERS  # Water in the canteen, per adventurer
+SHIELD = WATER_LEFT + ADVENTURERS  # 1 if the solar shield is active, per adventurer
+ARRIVAL = SHIELD + ADVENTURERS  # When the adventurer arrived at its tile (Tile.occupants order), per adventurer
+INVENTORY = ARRIVAL + ADVENTURERS  # Item counts, adventurer * ITEMS + item
+HELD = INVENTORY + ADVENTURERS * ITEMS  # Number of items held, per adventurer
+# Items in the order they are held (Adventurer.inventory order), adventurer * GEAR_CARDS + slot. Only the first
+# HELD slots are in use
+ITEM_ORDER = HELD + ADVENTURERS
+PLAYER_ORDER = ITEM_ORDER + ADVENTURERS * GEAR_CARDS  # Adventurers in turn order
+STORM_DECK = PLAYER_ORDER + ADVENTURERS  # Storm card order. The first STORM_LEFT cards are the draw pile, top last
+GEAR_DECK = STORM_DECK + STORM_CARDS  # Gear card order. The first GEAR_LEFT cards are the draw pile, top last
+PART_FLIPS = GEAR_DECK + GEAR_CARDS  # Flipped locator tiles, per boat part
+STORM_CELL = PART_FLIPS + 4
+STORM_LEVEL = STORM_CELL + 1
+TOTAL_SAND = STORM_LEVEL + 1
+STORM_LEFT = TOTAL_SAND + 1
+GEAR_LEFT = STORM_LEFT + 1
+AMOUNT = GEAR_LEFT + 1  # Deck.amount
+MITIGATED = AMOUNT + 1  # Deck.mitigated
+CARRYING = MITIGATED + 1  # Adventurer carried by the climber, -1 if none
+PARTS_PICKED = CARRYING + 1
+ROUND = PARTS_PICKED + 1
+TURN = ROUND + 1
+ACTION = TURN + 1
+ACTION_POINTS = ACTION + 1
+CLOCK = ACTION_POINTS + 1  # Next ARRIVAL stamp
+OUTCOME = CLOCK + 1
+STATE_SIZE = OUTCOME + 1
+
+# Values of OUTCOME, in the order check_game_status tests them
+PLAYING, LOST_WATER, LOST_SAND, LOST_STORM, WON = range(5)
+
+"""
+Actions are tuples of four small integers: (kind, actor, target, argument).
+    PASS:             (PASS, adventurer, 0, -1)
+    MOVE:             (MOVE, adventurer, 0, destination cell)
+    FLIP:             (FLIP, adventurer, 0, cell)
+    REMOVE_SAND:      (REMOVE_SAND, adventurer, 0, cell)
+    USE_ITEM:         (USE_ITEM, owner, item, target cell or -1)
+    ABILITY:          (ABILITY, adventurer, adventurer moved by the navigator or 0, cell)
+    PICK_UP:          (PICK_UP, climber, carried adventurer, -1)
+    DROP_OFF:         (DROP_OFF, climber, 0, -1)
+    PEEK:             (PEEK, meteorologist, 0, -1)
+    MITIGATE:         (MITIGATE, meteorologist, 0, -1)
+    PICK_PART:        (PICK_PART, adventurer, part, cell)
+    GIVE_ITEM:        (GIVE_ITEM, giver, receiver, item)
+    GIVE_WATER:       (GIVE_WATER, giver, receiver, -1)
+    USE_TUNNEL:       (USE_TUNNEL, adventurer, 0, destination cell)
+"""
+(
+    PASS, MOVE, FLIP, REMOVE_SAND, USE_ITEM, ABILITY, PICK_UP, DROP_OFF,
+    PEEK, MITIGATE, PICK_PART, GIVE_ITEM, GIVE_WATER, USE_TUNNEL,
+) = range(14)
+ACTION_NAMES = [
+    "pass", "move", "flip", "remove_sand", "use_item", "ability", "pick_up_adventurer", "drop_off_adventurer",
+    "peek_deck", "mitigate", "pick_part", "give_item", "give_water", "use_tunnel",
+]
+ACTION_COSTS = [0, 1, 1, 1, 0, 1, 0, 0, 1, 1, 1, 0, 0, 1]
+
+
+def action_cost(action):
+    if action[0] == USE_ITEM and action[2] == TIME_THROTTLE:
+        return -2
+    return ACTION_COSTS[action[0]]
+
+
+"""
+Fixed action space: every action that can ever be legal has an id, the same in every game.
+The actions of the adventurer whose turn it is leave the actor out of their id (it is stored as 0 in
+ACTION_TABLE), so that, say, moving to cell 7 has the same id whoever moves.
+"""
+CURRENT_ONLY = {PASS, MOVE, FLIP, REMOVE_SAND, ABILITY, PICK_UP, DROP_OFF, PEEK, MITIGATE, PICK_PART, USE_TUNNEL}
+
+
+def _action_table():
+    cells = range(CELLS)
+    adventurers = range(ADVENTURERS)
+    groups = [
+        (PASS, [0], [0], [-1]),
+        (MOVE, [0], [0], cells),
+        (FLIP, [0], [0], cells),
+        (REMOVE_SAND, [0], [0], cells),
+        (USE_ITEM, adventurers, [DUNE_BLASTER, JET_PACK, TERRASCOPE], cells),
+        (USE_ITEM, adventurers, [SOLAR_SHIELD, TIME_THROTTLE, SECRET_WATER_RESERVE], [-1]),
+        (ABILITY, [0], adventurers, cells),
+        (PICK_UP, [0], adventurers, [-1]),
+        (DROP_OFF, [0], [0], [-1]),
+        (PEEK, [0], [0], [-1]),
+        (MITIGATE, [0], [0], [-1]),
+        (PICK_PART, [0], range(4), cells),
+        (GIVE_ITEM, adventurers, adventurers, range(ITEMS)),
+        (GIVE_WATER, adventurers, adventurers, [-1]),
+        (USE_TUNNEL, [0], [0], cells),
+    ]
+    return [
+        (kind, actor, target, argument)
+        for kind, actors, targets, arguments in groups
+        for actor in actors
+        for target in targets
+        for argument in arguments
+    ]
+
+
+ACTION_TABLE = _action_table()
+ACTION_IDS = {action: i for i, action in enumerate(ACTION_TABLE)}
+ACTION_SPACE = len(ACTION_TABLE)
+
+
+def action_id(action):
+    kind, actor, target, argument = action
+    if kind in CURRENT_ONLY:
+        return ACTION_IDS[kind, 0, target, argument]
+    return ACTION_IDS[action]
+
+
+def action_from_id(i, current):
+    kind, actor, target, argument = ACTION_TABLE[i]
+    if kind in CURRENT_ONLY:
+        return kind, current, target, argument
+    return kind, actor, target, argument
+
+
+"""
+Rules.
+Every function below works on a state vector and mirrors the corresponding method of Game, Tile,
+Adventurer or Deck, including the order in which random numbers are drawn.
+"""
+
+
+def new_state(layout_rng, storm_rng, gear_rng):
+    """
+    Lays out a new game exactly like Game.setup: same shuffles, in the same order, on lists of the
+    same length. Given the streams of make_rngs(seed), the board and the decks are those of Game(log_file, seed).
+    """
+    s = [0] * STATE_SIZE
+
+    # Game.initialize_tiles
+    all_coordinates = [(x, y) for x in range(5) for y in range(5)]
+    all_coordinates.remove((2, 2))
+    layout_rng.shuffle(all_coordinates)
+    for tile in range(CELLS):
+        if tile == STORM:
+            cell = 12
+        else:
+            x, y = all_coordinates.pop()
+            cell = x + 5 * y
+        s[TILE + cell] = tile
+        s[TILE_CELL + tile] = cell
+    s[STORM_CELL] = 12
+    for cell in INITIAL_SAND:
+        add_sand(s, cell)
+
+    # Game.initialize_adventurers
+    start = s[TILE_CELL + START]
+    for adventurer in range(ADVENTURERS):
+        s[POSITION + adventurer] = start
+        s[WATER_LEFT + adventurer] = MAX_WATER[adventurer]
+        s[ARRIVAL + adventurer] = adventurer
+        s[PLAYER_ORDER + adventurer] = adventurer
+    s[CLOCK] = ADVENTURERS
+
+    # Deck.shuffle and GearDeck.shuffle
+    storm_deck = list(range(STORM_CARDS))
+    storm_rng.shuffle(storm_deck)
+    s[STORM_DECK:STORM_DECK + STORM_CARDS] = storm_deck
+    s[STORM_LEFT] = STORM_CARDS
+    gear_deck = list(range(GEAR_CARDS))
+    gear_rng.shuffle(gear_deck)
+    s[GEAR_DECK:GEAR_DECK + GEAR_CARDS] = gear_deck
+    s[GEAR_LEFT] = GEAR_CARDS
+
+    s[CARRYING] = -1
+    s[STORM_LEVEL] = 1
+    s[ROUND] = 1
+    s[TURN] = 1
+    s[ACTION] = 1
+    s[ACTION_POINTS] = 4
+    return s
+
+
+def add_sand(s, cell):
+    s[SAND + cell] += 1
+    s[TOTAL_SAND] += 1
+
+
+def remove_sand(s, cell):
+    # Like Tile.remove_sand, the total goes down even if the tile was already clear
+    s[TOTAL_SAND] -= 1
+    if s[SAND + cell] > 0:
+        s[SAND + cell] -= 1
+
+
+def get_water(s, adventurer):
+    water = s[WATER_LEFT + adventurer] + 1
+    s[WATER_LEFT + adventurer] = 5 if water > 5 else water
+
+
+def lose_water(s, adventurer):
+    # Like Adventurer.lose_water, a canteen emptied by give_water is also reset to 0
+    water = s[WATER_LEFT + adventurer] - 1
+    s[WATER_LEFT + adventurer] = 0 if water < 0 else water
+    # And the game is lost at once, even in the middle of a storm draw
+    if water == 0 and not s[OUTCOME]:
+        s[OUTCOME] = LOST_WATER
+
+
+def place(s, adventurer, cell):
+    # Moving onto a tile appends the adventurer to Tile.occupants, so it gets a fresh arrival stamp
+    s[POSITION + adventurer] = cell
+    s[ARRIVAL + adventurer] = s[CLOCK]
+    s[CLOCK] += 1
+
+
+def held_items(s, adventurer):
+    # The items of the adventurer, in the order of Adventurer.inventory
+    order = ITEM_ORDER + adventurer * GEAR_CARDS
+    return s[order:order + s[HELD + adventurer]]
+
+
+def add_item(s, adventurer, item):
+    # Adventurer.inventory.append
+    s[ITEM_ORDER + adventurer * GEAR_CARDS + s[HELD + adventurer]] = item
+    s[HELD + adventurer] += 1
+    s[INVENTORY + adventurer * ITEMS + item] += 1
+
+
+def take_item(s, adventurer, item):
+    # Adventurer.inventory.remove. Copies of an item are all the same action here, so the first one goes
+    order = ITEM_ORDER + adventurer * GEAR_CARDS
+    end = order + s[HELD + adventurer]
+    slot = s.index(item, order, end)
+    s[slot:end - 1] = s[slot + 1:end]
+    s[HELD + adventurer] -= 1
+    s[INVENTORY + adventurer * ITEMS + item] -= 1
+
+
+def draw_gear(s, adventurer):
+    left = s[GEAR_LEFT]
+    if left:
+        s[GEAR_LEFT] = left - 1
+        add_item(s, adventurer, GEAR_CARD_ITEMS[s[GEAR_DECK + left - 1]])
+
+
+def cards_to_draw(s):
+    level = s[STORM_LEVEL]
+    if level <= 1:
+        return 2
+    elif level <= 6:
+        return 3
+    elif level <= 10:
+        return 4
+    elif level <= 13:
+        return 5
+    elif level <= 15:
+        return 6
+    return s[AMOUNT]
+
+
+def amount_to_draw(s):
+    s[AMOUNT] = cards_to_draw(s)
+    if s[STORM_LEVEL] > 15 and not s[OUTCOME]:
+        s[OUTCOME] = LOST_STORM
+
+
+def available_moves(s, adventurer, cell):
+    """
+    Cells the adventurer could move to if it stood on the given cell (the navigator's BFS asks this
+    for cells the adventurer is not on).
+    """
+    storm = s[STORM_CELL]
+    if adventurer == CLIMBER:
+        return [n for n in ORTHOGONAL[cell] if n != storm]
+    if s[SAND + cell] > 1:
+        return []
+    neighbours = ALL_NEIGHBOURS[cell] if adventurer == EXPLORER else ORTHOGONAL[cell]
+    return [n for n in neighbours if n != storm and s[SAND + n] < 2]
+
+
+def available_sand(s, adventurer):
+    cell = s[POSITION + adventurer]
+    if s[SAND + cell] > 1:
+        return [cell]
+    accessible = [cell] if s[SAND + cell] > 0 else []
+    storm = s[STORM_CELL]
+    neighbours = ALL_NEIGHBOURS[cell] if adventurer == EXPLORER else ORTHOGONAL[cell]
+    for n in neighbours:
+        if n != storm and s[SAND + n] > 0:
+            accessible.append(n)
+    return accessible
+
+
+def navigator_destinations(s, adventurer):
+    """
+    Navigator.bfs_other_adventurer_available_paths: every cell the adventurer can be moved to in up
+    to 3 steps, in BFS order. Only the destination matters to the state, not the path.
+    """
+    start = s[POSITION + adventurer]
+    visited = {start}
+    destinations = []
+    frontier = [start]
+    for _ in range(3):
+        next_frontier = []
+        for cell in frontier:
+            for n in available_moves(s, adventurer, cell):
+                if n not in visited:
+                    visited.add(n)
+                    destinations.append(n)
+                    next_frontier.append(n)
+        frontier = next_frontier
+    return destinations
+
+
+def sharing_pairs(s):
+    """
+    (giver, receiver) pairs standing on the same tile. As with Tile.occupants in Game, an adventurer
+    only shares with the ones that arrived at the tile after it did, and the pairs come in the order of
+    Game.get_sharing_pairs: by tile, then by arrival.
+    """
+    pairs = []
+    order = sorted(range(ADVENTURERS), key=lambda a: (s[TILE + s[POSITION + a]], s[ARRIVAL + a]))
+    for i, giver in enumerate(order):
+        cell = s[POSITION + giver]
+        for receiver in order[i + 1:]:
+            if s[POSITION + receiver] != cell:
+                break
+            pairs.append((giver, receiver))
+    return pairs
+
+
+def legal_actions(s, current):
+    """
+    Game.get_possible_actions. The same actions come out in the same order; duplicates of an item
+    appear once per unit held, so a uniform choice is weighted like in Game.
+    """
+    actions = [(PASS, current, 0, -1)]
+    cell = s[POSITION + current]
+    storm = s[STORM_CELL]
+
+    for n in available_moves(s, current, cell):
+        actions.append((MOVE, current, 0, n))
+
+    if not s[FLIPPED + cell] and s[SAND + cell] == 0:
+        actions.append((FLIP, current, 0, cell))
+
+    current_sand = available_sand(s, current)
+    for n in current_sand:
+        actions.append((REMOVE_SAND, current, 0, n))
+
+    for _ in range(s[INVENTORY + current * ITEMS + TIME_THROTTLE]):
+        actions.append((USE_ITEM, current, TIME_THROTTLE, -1))
+
+    # Items any adventurer can use, in the order they are held
+    for owner in range(ADVENTURERS):
+        if not s[HELD + owner]:
+            continue
+        for item in held_items(s, owner):
+            if item == DUNE_BLASTER:
+                for n in available_sand(s, owner):
+                    actions.append((USE_ITEM, owner, DUNE_BLASTER, n))
+            elif item == JET_PACK:
+                for tile in range(CELLS):
+                    n = s[TILE_CELL + tile]
+                    if s[SAND + n] < 2 and tile != STORM:
+                        actions.append((USE_ITEM, owner, JET_PACK, n))
+            elif item == TERRASCOPE:
+                for tile in range(CELLS):
+                    n = s[TILE_CELL + tile]
+                    if not s[FLIPPED + n] and tile != STORM:
+                        actions.append((USE_ITEM, owner, TERRASCOPE, n))
+            elif item != TIME_THROTTLE:
+                actions.append((USE_ITEM, owner, item, -1))
+
+    # Special abilities
+    if current == ARCHEOLOGIST:
+        for n in current_sand:
+            actions.append((ABILITY, current, 0, n))
+    elif current == WATER_CARRIER:
+        if s[FLIPPED + cell] and TILE_KINDS[s[TILE + cell]] == WATER and s[SAND + cell] < 2:
+            actions.append((ABILITY, current, 0, cell))
+    elif current == NAVIGATOR:
+        for other in range(ADVENTURERS):
+            if other != current:
+                for n in navigator_destinations(s, other):
+                    actions.append((ABILITY, current, other, n))
+    elif current == CLIMBER:
+        # In the order of Tile.occupants, as in Game
+        others = [other for other in range(ADVENTURERS) if other != current and s[POSITION + other] == cell]
+        others.sort(key=lambda other: s[ARRIVAL + other])
+        for other in others:
+            actions.append((PICK_UP, current, other, -1))
+        if s[CARRYING] >= 0:
+            actions.append((DROP_OFF, current, 0, -1))
+    elif current == METEOROLOGIST:
+        actions.append((PEEK, current, 0, -1))
+        if cards_to_draw(s) >= s[MITIGATED]:
+            actions.append((MITIGATE, current, 0, -1))
+
+    parts = s[PARTS + cell]
+    if parts and s[FLIPPED + cell] and s[SAND + cell] < 2:
+        for part in range(4):
+            if parts & (1 << part):
+                actions.append((PICK_PART, current, part, cell))
+
+    pairs = sharing_pairs(s)
+    for giver, receiver in pairs:
+        if s[HELD + giver]:
+            for item in held_items(s, giver):
+                actions.append((GIVE_ITEM, giver, receiver, item))
+    for giver, receiver in pairs:
+        if s[WATER_LEFT + receiver] < MAX_WATER[receiver]:
+            actions.append((GIVE_WATER, giver, receiver, -1))
+
+    if TILE_KINDS[s[TILE + cell]] == TUNNEL and s[FLIPPED + cell] and s[SAND + cell] < 2:
+        for tunnel in TUNNELS:
+            n = s[TILE_CELL + tunnel]
+            if n != cell and s[FLIPPED + n] and s[SAND + n] < 2:
+                actions.append((USE_TUNNEL, current, 0, n))
+
+    return actions
+
+
+def move_climber(s, cell):
+    place(s, CLIMBER, cell)
+    carried = s[CARRYING]
+    if carried >= 0:
+        place(s, carried, cell)
+
+
+def flip(s, adventurer):
+    cell = s[POSITION + adventurer]
+    s[FLIPPED + cell] = 1
+    tile = s[TILE + cell]
+    kind = TILE_KINDS[tile]
+    if kind == GEAR or kind == TUNNEL:
+        draw_gear(s, adventurer)
+    elif kind == WATER:
+        for other in range(ADVENTURERS):
+            if s[POSITION + other] == cell:
+                get_water(s, other)
+                get_water(s, other)
+    elif kind == PART:
+        s[PART_FLIPS + PART_OF_TILE[tile]] += 1
+        check_placement(s)
+
+
+def check_placement(s):
+    for part in range(4):
+        if s[PART_FLIPS + part] == 2:
+            horizontal, vertical = PART_LOCATORS[part]
+            x = s[TILE_CELL + vertical] % 5
+            y = s[TILE_CELL + horizontal] // 5
+            s[PARTS + x + 5 * y] |= 1 << part
+            s[PART_FLIPS + part] += 1
+            return
+
+
+def apply_action(s, current, action, policy_rng):
+    """
+    Game.perform_action. current is the adventurer whose turn it is; as in Game, the Secret Water
+    Reserve and the Solar Shield take effect on it whoever owns the card.
+    """
+    kind, actor, target, argument = action
+    if kind == MOVE:
+        if actor == CLIMBER:
+            move_climber(s, argument)
+        else:
+            place(s, actor, argument)
+    elif kind == FLIP:
+        flip(s, actor)
+    elif kind == REMOVE_SAND:
+        remove_sand(s, argument)
+    elif kind == GIVE_WATER:
+        s[WATER_LEFT + actor] -= 1
+        s[WATER_LEFT + target] += 1
+    elif kind == GIVE_ITEM:
+        take_item(s, actor, argument)
+        add_item(s, target, argument)
+    elif kind == PICK_PART:
+        s[PARTS + argument] &= ~(1 << target)
+        s[PARTS_PICKED] += 1
+    elif kind == USE_TUNNEL:
+        if actor == CLIMBER:
+            move_climber(s, argument)
+        else:
+            place(s, actor, argument)
+    elif kind == USE_ITEM:
+        take_item(s, actor, target)
+        if target == JET_PACK:
+            place(s, actor, argument)
+        elif target == SECRET_WATER_RESERVE:
+            cell = s[POSITION + current]
+            for other in range(ADVENTURERS):
+                if s[POSITION + other] == cell:
+                    get_water(s, other)
+                    get_water(s, other)
+        elif target == DUNE_BLASTER:
+            s[SAND + argument] = 0
+        elif target == SOLAR_SHIELD:
+            s[SHIELD + current] = 1
+    elif kind == ABILITY:
+        if actor == ARCHEOLOGIST:
+            remove_sand(s, argument)
+            remove_sand(s, argument)
+        elif actor == WATER_CARRIER:
+            get_water(s, actor)
+            get_water(s, actor)
+        elif actor == NAVIGATOR:
+            place(s, target, argument)
+    elif kind == PICK_UP:
+        s[CARRYING] = target
+    elif kind == DROP_OFF:
+        s[CARRYING] = -1
+    elif kind == MITIGATE:
+        s[MITIGATED] += 1
+    elif kind == PEEK:
+        # Meteorologist.possible_choices: the choice is drawn and then discarded, as in Game
+        amount_to_draw(s)
+        policy_rng.choice(range(min(s[STORM_LEFT], s[AMOUNT]) + 1))
+
+
+def move_storm(s, card):
+    # StormCard.apply: the whole move at once, from STORM_MOVE_TABLE
+    storm = s[STORM_CELL]
+    destination, sand_cells, tile_cells = STORM_MOVE_TABLE[storm][card]
+    if not sand_cells:
+        return
+    for cell in sand_cells:
+        add_sand(s, cell)
+    for adventurer in range(ADVENTURERS):
+        position = s[POSITION + adventurer]
+        if position in sand_cells:
+            lose_water(s, adventurer)
+            # The adventurers move with their tile
+            s[POSITION + adventurer] = tile_cells[sand_cells.index(position)]
+
+    # Every tile steps back into the cell the storm left. Boat parts stay on their cell, so the ones lying on
+    # the storm are handed over to the first tile to take its place
+    parts = s[PARTS + storm]
+    for cell, tile_cell in zip(sand_cells, tile_cells):
+        tile = s[TILE + cell]
+        s[SAND + tile_cell] = s[SAND + cell]
+        s[FLIPPED + tile_cell] = s[FLIPPED + cell]
+        s[PARTS + tile_cell] = s[PARTS + cell]
+        s[TILE + tile_cell] = tile
+        s[TILE_CELL + tile] = tile_cell
+    s[PARTS + storm] |= parts
+    s[SAND + destination] = 0
+    s[FLIPPED + destination] = 0
+    s[PARTS + destination] = 0
+    s[TILE + destination] = STORM
+    s[TILE_CELL + STORM] = destination
+    s[STORM_CELL] = destination
+
+
+def sun_beats_down(s):
+    # A cell is sheltered if anyone on it has an active solar shield
+    sheltered = 0
+    for adventurer in range(ADVENTURERS):
+        if s[SHIELD + adventurer]:
+            sheltered |= 1 << s[POSITION + adventurer]
+    for adventurer in range(ADVENTURERS):
+        cell = s[POSITION + adventurer]
+        if sheltered >> cell & 1 or (s[FLIPPED + cell] and TILE_KINDS[s[TILE + cell]] == TUNNEL):
+            continue
+        lose_water(s, adventurer)
+
+
+def reshuffle(s, storm_rng):
+    # Deck.reshuffle: the discard pile, in the order the cards were drawn, is shuffled into the new deck
+    discard_pile = s[STORM_DECK:STORM_DECK + STORM_CARDS]
+    discard_pile.reverse()
+    storm_rng.shuffle(discard_pile)
+    s[STORM_DECK:STORM_DECK + STORM_CARDS] = discard_pile
+    s[STORM_LEFT] = STORM_CARDS
+
+
+def draw_storm(s, storm_rng):
+    """
+    Deck.draw. Returns the storm cards drawn.
+    """
+    drawn_cards = []
+    amount_to_draw(s)
+    for _ in range(s[AMOUNT] - s[MITIGATED]):
+        if not s[STORM_LEFT]:
+            reshuffle(s, storm_rng)
+        s[STORM_LEFT] -= 1
+        card = s[STORM_DECK + s[STORM_LEFT]]
+        drawn_cards.append(card)
+        kind = STORM_CARD_KINDS[card]
+        if kind == STORM_MOVES:
+            move_storm(s, card)
+        elif kind == SUN_BEATS_DOWN:
+            sun_beats_down(s)
+        else:
+            s[STORM_LEVEL] += 1
+    return drawn_cards
+
+
+def check_game_status(s):
+    boat = s[TILE_CELL + BOAT]
+    if any(s[WATER_LEFT + adventurer] <= 0 for adventurer in range(ADVENTURERS)):
+        s[OUTCOME] = LOST_WATER
+    elif s[TOTAL_SAND] > 48:
+        s[OUTCOME] = LOST_SAND
+    elif s[STORM_LEVEL] > 15:
+        s[OUTCOME] = LOST_STORM
+    elif (
+        s[PARTS_PICKED] == 4
+        and s[SAND + boat] < 2
+        and all(s[POSITION + adventurer] == boat for adventurer in range(ADVENTURERS))
+    ):
+        s[OUTCOME] = WON
+
+
+def set_player_order(s, layout_rng):
+    min_water_level = min(s[WATER_LEFT:WATER_LEFT + ADVENTURERS])
+    least_water_adventurers = [a for a in range(ADVENTURERS) if s[WATER_LEFT + a] == min_water_level]
+    first_player = layout_rng.choice(least_water_adventurers)
+    other_players = [a for a in range(ADVENTURERS) if a != first_player]
+    layout_rng.shuffle(other_players)
+    s[PLAYER_ORDER:PLAYER_ORDER + ADVENTURERS] = [first_player] + other_players
+
+
+def execute_turn(s, adventurer, policy_rng, storm_rng):
+    s[ACTION] = 1
+    s[ACTION_POINTS] = 4
+    while s[ACTION_POINTS] > 0 and not s[OUTCOME]:
+        chosen_action = policy_rng.choice(legal_actions(s, adventurer))
+        if chosen_action[0] == PASS:
+            break
+        cost = action_cost(chosen_action)
+        apply_action(s, adventurer, chosen_action, policy_rng)
+        if cost > 0:
+            s[ACTION] += 1
+        s[ACTION_POINTS] -= cost
+        check_game_status(s)
+
+    s[CARRYING] = -1
+    s[TURN] += 1
+    draw_storm(s, storm_rng)
+    s[MITIGATED] = 0
+
+
+def play(s, layout_rng, policy_rng, storm_rng):
+    """
+    Game.start_game with random play, until the game is over. Returns the outcome.
+    """
+    set_player_order(s, layout_rng)
+    while not s[OUTCOME]:
+        for adventurer in s[PLAYER_ORDER:PLAYER_ORDER + ADVENTURERS]:
+            s[SHIELD + adventurer] = 0  # Game.check_solar_shield
+            execute_turn(s, adventurer, policy_rng, storm_rng)
+            if s[OUTCOME]:
+                break
+        s[ROUND] += 1
+        s[TURN] = 1
+    return s[OUTCOME]
+
+
+"""
+Stepping. The same game as play(), one decision at a time, for callers that choose the actions themselves.
+Between two steps the state is always waiting for a decision of current_adventurer(s), or over.
+"""
+
+
+def current_adventurer(s):
+    return s[PLAYER_ORDER + s[TURN] - 1]
+
+
+def begin_turn(s):
+    s[SHIELD + current_adventurer(s)] = 0  # Game.check_solar_shield
+    s[ACTION] = 1
+    s[ACTION_POINTS] = 4
+
+
+def start(s, layout_rng):
+    set_player_order(s, layout_rng)
+    begin_turn(s)
+
+
+def step(s, action, policy_rng, storm_rng):
+    """
+    Performs one of legal_actions(s, current_adventurer(s)). If that ends the turn, the storm is drawn
+    and the next turn begins, exactly as in execute_turn and play.
+    """
+    if action[0] != PASS:
+        cost = action_cost(action)
+        apply_action(s, current_adventurer(s), action, policy_rng)
+        if cost > 0:
+            s[ACTION] += 1
+        s[ACTION_POINTS] -= cost
+        check_game_status(s)
+        if s[ACTION_POINTS] > 0 and not s[OUTCOME]:
+            return
+
+    s[CARRYING] = -1
+    s[TURN] += 1
+    draw_storm(s, storm_rng)
+    s[MITIGATED] = 0
+    if s[OUTCOME] or s[TURN] > ADVENTURERS:
+        s[ROUND] += 1
+        s[TURN] = 1
+    if not s[OUTCOME]:
+        begin_turn(s)
+
+
+class GameState:
+    """
+    The GameState class is the compact counterpart of Game, for bulk self-play.
+    The whole game lives in one flat list of small integers (see the layout above), so playing a
+    game allocates no tiles, adventurers or cards and a copy of a game is a single list copy.
+    Attributes:
+        s (list): The state vector.
+        seed: The seed of the game's random streams, see seeding.make_rngs. Random if not given.
+
+    Methods:
+        from_game(game): Builds the compact state of a Game, at any point of the game.
+        copy(seed): Returns an independent copy of the state, see below.
+        legal_actions(adventurer): The actions available to the adventurer, like Game.get_possible_actions.
+        apply(adventurer, action): Performs an action during the adventurer's turn, like Game.perform_action.
+        check_game_status(): Updates and returns the outcome, like Game.check_game_status.
+        draw_storm(): Draws from the storm deck at the end of a turn, like Deck.draw.
+        play(): Plays the rest of the game at random, like Game.start_game. Returns the outcome.
+        start(): Sets the player order and begins the first turn, for stepping.
+        step(action): Performs an action of the current adventurer, see step() above.
+    """
+
+    def __init__(self, s=None, seed=None, rngs=None):
+        self.seed = new_seed() if seed is None else seed
+        self.layout_rng, self.storm_rng, self.gear_rng, self.policy_rng = rngs or make_rngs(self.seed)
+        self.s = new_state(self.layout_rng, self.storm_rng, self.gear_rng) if s is None else s
+
+    @classmethod
+    def from_game(cls, game):
+        s = [0] * STATE_SIZE
+        tile_ids = {tile: i for i, tile in enumerate(game.tiles.values())}
+        adventurer_ids = {adventurer: i for i, adventurer in enumerate(game.adventurers.values())}
+
+        for tile, i in tile_ids.items():
+            cell = tile.x_coordinate + 5 * tile.y_coordinate
+            s[SAND + cell] = tile.sand
+            s[FLIPPED + cell] = int(tile.flipped)
+            s[TILE + cell] = i
+            s[TILE_CELL + i] = cell
+            s[PARTS + cell] = sum(1 << PART_NAMES.index(part) for part in tile.boat_parts)
+            # Only the order within a tile matters, so the position in Tile.occupants is enough
+            for arrival, adventurer in enumerate(tile.occupants):
+                s[ARRIVAL + adventurer] = arrival
+
+        for adventurer, i in adventurer_ids.items():
+            s[POSITION + i] = s[TILE_CELL + tile_ids[adventurer.tile]]
+            s[WATER_LEFT + i] = adventurer.water
+            s[SHIELD + i] = int(adventurer.solar_shield_active)
+            for item in adventurer.inventory:
+                add_item(s, i, ITEM_TYPES.index(type(item)))
+        order = [adventurer_ids[adventurer] for adventurer in game.player_order] or list(range(ADVENTURERS))
+        s[PLAYER_ORDER:PLAYER_ORDER + ADVENTURERS] = order
+
+        # The discard pile goes after the draw pile, most recent card first
+        s[STORM_DECK:STORM_DECK + STORM_CARDS] = game.deck.deck + game.deck.discard_pile[::-1]
+        s[STORM_LEFT] = len(game.deck.deck)
+        gear_deck = game.gear_deck.gear_deck
+        s[GEAR_DECK:GEAR_DECK + GEAR_CARDS] = gear_deck + [card for card in range(GEAR_CARDS) if card not in gear_deck]
+        s[GEAR_LEFT] = len(gear_deck)
+
+        s[PART_FLIPS:PART_FLIPS + 4] = [
+            game.propeller_tiles_flipped, game.motor_tiles_flipped, game.gem_tiles_flipped, game.compass_tiles_flipped
+        ]
+        s[STORM_CELL] = s[TILE_CELL + STORM]
+        s[STORM_LEVEL] = game.sand_storm_level
+        s[TOTAL_SAND] = game.total_sand
+        s[AMOUNT] = game.deck.amount
+        s[MITIGATED] = game.deck.mitigated
+        carrying = game.adventurers["climber"].carrying
+        s[CARRYING] = adventurer_ids[carrying] if carrying else -1
+        s[PARTS_PICKED] = game.boat_parts_picked
+        s[ROUND] = game.round
+        s[TURN] = game.turn
+        s[ACTION] = game.action
+        s[ACTION_POINTS] = game.action_points
+        s[CLOCK] = ADVENTURERS
+        if game.is_game_over:
+            check_game_status(s)
+            if not s[OUTCOME]:
+                s[OUTCOME] = LOST_STORM  # Deck.amount_to_draw ended the game
+
+        # Carry on the game's random streams
+        state = cls(s, game.seed)
+        for rng, game_rng in zip(state.rngs(), game.rngs()):
+            rng.setstate(game_rng.getstate())
+        return state
+
+    def copy(self, seed=None):
+        """
+        Without a seed, the copy shares the random streams of this state, which keeps copying down to a
+        single list copy. With a seed, it gets fresh streams of its own.
+        """
+        if seed is None:
+            return GameState(self.s[:], self.seed, self.rngs())
+        return GameState(self.s[:], seed)
+
+    def rngs(self):
+        return self.layout_rng, self.storm_rng, self.gear_rng, self.policy_rng
+
+    @property
+    def outcome(self):
+        return self.s[OUTCOME]
+
+    @property
+    def current_adventurer(self):
+        return current_adventurer(self.s)
+
+    def legal_actions(self, adventurer):
+        return legal_actions(self.s, adventurer)
+
+    def apply(self, adventurer, action):
+        apply_action(self.s, adventurer, action, self.policy_rng)
+
+    def check_game_status(self):
+        check_game_status(self.s)
+        return self.s[OUTCOME]
+
+    def draw_storm(self):
+        return draw_storm(self.s, self.storm_rng)
+
+    def play(self):
+        return play(self.s, self.layout_rng, self.policy_rng, self.storm_rng)
+
+    def start(self):
+        start(self.s, self.layout_rng)
+
+    def step(self, action):
+        step(self.s, action, self.policy_rng, self.storm_rng)
+
+
+def compact_action(game, adventurer, action):
+    """
+    Translates one of Game.get_possible_actions(adventurer) into the matching action of legal_actions, on
+    the compact state of the same game (see GameState.from_game).
+    """
+    kind = ACTION_NAMES.index(action[0])
+    current = adventurer.index
+    argument = action[1]
+    if kind in (PASS, DROP_OFF, PEEK, MITIGATE):
+        return kind, current, 0, -1
+    if kind == MOVE:
+        dx, dy = argument
+        return kind, current, 0, adventurer.tile.cell + cell_of(dx, dy)
+    if kind == FLIP:
+        return kind, current, 0, adventurer.tile.cell
+    if kind == REMOVE_SAND:
+        return kind, current, 0, argument.cell
+    if kind == USE_ITEM:
+        owner, item = argument[0], argument[1]
+        target = argument[2].cell if len(argument) > 2 else -1
+        return kind, owner.index, ITEM_TYPES.index(type(item)), target
+    if kind == ABILITY:
+        if current == NAVIGATOR:
+            _, other, path = argument
+            cell = other.tile.cell
+            for dx, dy in path:
+                cell += cell_of(dx, dy)
+            return kind, current, other.index, cell
+        if current == ARCHEOLOGIST:
+            return kind, current, 0, argument.cell
+        return kind, current, 0, adventurer.tile.cell
+    if kind == PICK_UP:
+        return kind, current, argument[1].index, -1
+    if kind == PICK_PART:
+        return kind, current, PART_NAMES.index(argument[1]), adventurer.tile.cell
+    if kind == GIVE_ITEM:
+        giver, receiver, item = argument
+        return kind, giver.index, receiver.index, ITEM_TYPES.index(type(item))
+    if kind == GIVE_WATER:
+        return kind, argument[0].index, argument[1].index, -1
+    return kind, current, 0, argument[1].cell  # USE_TUNNEL
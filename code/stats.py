@@ -0,0 +1,146 @@
+import json
+import os
+
+
+"""
+What is tracked of every game (see game.play_game), and the quantiles reported for each of them.
+"""
+METRICS = ["rounds", "parts", "tiles_flipped", "storm_level", "total_sand"]
+OUTCOMES = ["won", "water", "sand", "storm"]  # See Game.check_game_status
+QUANTILES = [0.5, 0.9, 0.99]
+
+
+class RunningStat:
+    """
+    The RunningStat class keeps the statistics of a stream of values without keeping the values: count, total,
+    mean and variance (updated online, with Welford's method), minimum and maximum. Quantiles are exact, from a histogram
+    of the values: the game metrics are small integers, so the histogram stays small however many games are added.
+    Attributes:
+        count (int): The number of values.
+        total: The sum of the values, exact for integers.
+        mean (float): The mean of the values, as updated online. It can drift from average() in the last digits.
+        histogram (dict): How many times each value came up.
+
+    Methods:
+        add(value): Adds a value.
+        average(): The mean of the values, from their total.
+        variance(): The sample variance of the values.
+        quantile(q): The smallest value that at least a fraction q of the values are at most.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared differences from the mean
+        self.histogram = {}
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.histogram[value] = self.histogram.get(value, 0) + 1
+
+    def average(self):
+        return self.total / self.count if self.count else 0.0
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def minimum(self):
+        return min(self.histogram) if self.histogram else None
+
+    def maximum(self):
+        return max(self.histogram) if self.histogram else None
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        seen = 0
+        for value in sorted(self.histogram):
+            seen += self.histogram[value]
+            if seen >= q * self.count:
+                return value
+        return value
+
+
+class Stats:
+    """
+    The Stats class aggregates the results of a run, game by game, in constant memory: the outcomes, and a
+    RunningStat for each of the METRICS.
+    Attributes:
+        games (int): The number of games added.
+        outcomes (dict): The number of games, per outcome.
+        metrics (dict): A RunningStat per metric.
+
+    Methods:
+        add(result): Adds the result of a game, as returned by game.play_game.
+        win_rate(): The fraction of games won.
+        row(): The current statistics, as a dictionary of column name to number, see ResultsFile.
+        summary(): The current statistics, as text.
+    """
+
+    def __init__(self):
+        self.games = 0
+        self.outcomes = {outcome: 0 for outcome in OUTCOMES}
+        self.metrics = {metric: RunningStat() for metric in METRICS}
+
+    def add(self, result):
+        self.games += 1
+        self.outcomes[result["outcome"]] = self.outcomes.get(result["outcome"], 0) + 1
+        for metric, stat in self.metrics.items():
+            stat.add(result[metric])
+
+    def win_rate(self):
+        return self.outcomes["won"] / self.games if self.games else 0.0
+
+    def row(self):
+        row = {"games": self.games}
+        for outcome, count in self.outcomes.items():
+            row[f"{outcome}_rate"] = count / self.games if self.games else 0.0
+        for metric, stat in self.metrics.items():
+            row[f"{metric}_mean"] = stat.average()
+            row[f"{metric}_std"] = stat.variance() ** 0.5
+            row[f"{metric}_min"] = stat.minimum()
+            row[f"{metric}_max"] = stat.maximum()
+            for q in QUANTILES:
+                row[f"{metric}_p{round(q * 100)}"] = stat.quantile(q)
+        return row
+
+    def summary(self):
+        lines = []
+        for metric, stat in self.metrics.items():
+            quantiles = ", ".join(f"p{round(q * 100)} {stat.quantile(q)}" for q in QUANTILES)
+            lines.append(
+                f"{metric}: mean {stat.average():.2f}, std {stat.variance() ** 0.5:.2f}, "
+                f"min {stat.minimum()}, max {stat.maximum()}, {quantiles}"
+            )
+        return "\n".join(lines)
+
+
+class ResultsFile:
+    """
+    The ResultsFile class writes snapshots of the statistics of a run (Stats.row) to a JSON file, by column:
+    {column name: [value at every snapshot]}, so that a campaign of any length leaves a single small file,
+    that reads straight into a table. The file is rewritten whole at every snapshot, through a temporary
+    file, so it is never left half written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = {}
+        self.snapshots = 0
+
+    def append(self, row):
+        for column, value in row.items():
+            self.columns.setdefault(column, [None] * self.snapshots).append(value)
+        self.snapshots += 1
+        for values in self.columns.values():
+            values.extend([None] * (self.snapshots - len(values)))
+
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as results_file:
+            json.dump(self.columns, results_file, separators=(",", ":"))
+        os.replace(temporary_path, self.path)
@@ -1,72 +1,51 @@
 import random
+import weakref
+from board import *
+from logs import *
+from zobrist import *
 
 class Deck:
-    def __init__(self, game):
-        self.game = game
+    def __init__(self, game, rng=random):
+        self.game_ref = weakref.ref(game)  # Weak, so that the game and its deck do not keep each other alive
+        self.rng = rng  # The game's storm stream
+        self.cards = ALL_STORM_CARDS  # Every card by index. The deck and the discard pile hold the indices
         self.deck = self.create()
         self.discard_pile = []
         self.amount = 0  # Amount to cards to draw
         self.mitigated = 0
 
     def create(self):
-        # create deck of cards
-        deck = []
+        # create deck of cards, by index in Deck.cards. The cards hold nothing of a game, so all games share them
+        return list(range(len(self.cards)))
 
-        # add storm cards
-        storm_patterns = [(1, 0), (0, 1), (-1, 0), (0, -1)]
-        # 1 move cards
-        for pattern in storm_patterns:
-            for i in range(3):
-                deck.append(StormCard(f"Storm Moves x1 {i+1}/3", [pattern], self.game))
-
-        # 2 move cards
-        for pattern in storm_patterns:
-            for i in range(2):
-                deck.append(
-                    StormCard(f"Storm Moves x2 {i+1}/2", [pattern, pattern], self.game)
-                )
-
-        # 3 move cards
-        for pattern in storm_patterns:
-            for i in range(1):
-                deck.append(
-                    StormCard(
-                        f"Storm Moves x3 {i+1}/1",
-                        [pattern, pattern, pattern],
-                        self.game,
-                    )
-                )
-
-        # add sun beats down cards
-        for i in range(4):
-            deck.append(SBDCard(f"Sun Beats Down {i+1}/4", self.game))
-
-        # add storm picks up cards
-        for i in range(3):
-            deck.append(SPUCard(f"Storm Picks Up {i+1}/3", self.game))
-
-        return deck
-
-    def amount_to_draw(self):
+    def cards_to_draw(self):
         """
-        Determine the amount of cards to draw according to the storm level.
-        Implemented for 5 players.
+        Determine the amount of cards to draw according to the storm level, without changing anything.
+        Implemented for 5 players. Past level 15 the game is lost and the last amount is kept.
         """
-        if self.game.sand_storm_level <= 1:
-            self.amount = 2 
-        elif 2 <= self.game.sand_storm_level <= 6:
-            self.amount = 3
-        elif 7 <= self.game.sand_storm_level <= 10:
-            self.amount = 4
-        elif 11 <= self.game.sand_storm_level <= 13:
-            self.amount = 5
-        elif 14 <= self.game.sand_storm_level <= 15:
-            self.amount = 6
-        elif self.game.sand_storm_level > 15:
-            self.game.is_game_over = True
+        game = self.game_ref()
+        if game.sand_storm_level <= 1:
+            return 2 
+        elif 2 <= game.sand_storm_level <= 6:
+            return 3
+        elif 7 <= game.sand_storm_level <= 10:
+            return 4
+        elif 11 <= game.sand_storm_level <= 13:
+            return 5
+        elif 14 <= game.sand_storm_level <= 15:
+            return 6
+        return self.amount
+
+    def amount_to_draw(self):
+        game = self.game_ref()
+        game.touch(self)
+        self.amount = self.cards_to_draw()
+        if game.sand_storm_level > 15:
+            game.is_game_over = True
+            game.outcome = "storm"
 
     def shuffle(self):
-        random.shuffle(self.deck)
+        self.rng.shuffle(self.deck)
 
     def reshuffle(self):
         self.deck = self.discard_pile
@@ -75,6 +54,12 @@ class Deck:
         self.shuffle()
 
     def draw(self):
+        # A whole storm resolution is undone at once, see Game.undo
+        game = self.game_ref()
+        if game.undo_stack is not None:
+            game.begin_undo_record()
+        game.touch(self)
+
         drawn_cards = []
         self.amount_to_draw()
         amount = self.amount - self.mitigated
@@ -83,79 +68,224 @@ class Deck:
                 self.reshuffle()
 
             card = self.deck.pop()
+            if game.recorder is not None:
+                game.recorder.storm_draw(card)
             self.discard_pile.append(card)
             drawn_cards.append(card)
 
             #print(card)
             # Apply the effect of the drawn card
-            if isinstance(card, StormCard):
-                card.apply()
-            elif isinstance(card, SBDCard):
-                card.apply()
-            elif isinstance(card, SPUCard):
-                self.game.increase_storm_level()
-                self.game.log_file.write(f"{card.name}. Storm Level: {self.game.sand_storm_level}. Next turn draw {self.amount} cards.\n\n")
+            self.resolve(card)
+
+        if game.undo_stack is not None:
+            game.end_undo_record()
+        return drawn_cards  # Return a list of drawn cards, by index
+
+    def resolve(self, card):
+        game = self.game_ref()
+        kind = STORM_CARD_KINDS[card]
+        if kind == STORM_PICKS_UP:
+            game.increase_storm_level()
+            if game.log_level >= LOG_EVENTS:
+                game.log_file.write(f"{self.cards[card].name}. Storm Level: {game.sand_storm_level}. Next turn draw {self.amount} cards.\n\n")
+        else:
+            self.cards[card].apply(game)
 
-        return drawn_cards  # Return a list of drawn cards
+    def get_state(self):
+        return (tuple(self.deck), tuple(self.discard_pile), self.amount, self.mitigated)
+
+    def set_state(self, state):
+        deck, discard_pile, self.amount, self.mitigated = state
+        self.deck = list(deck)
+        self.discard_pile = list(discard_pile)
+
+    def reset(self):
+        # The deck as it comes out of the box, not shuffled yet, see Game.reset
+        self.deck = self.create()
+        self.discard_pile = []
+        self.amount = 0
+        self.mitigated = 0
+
+    def zobrist_key(self):
+        # How many cards are left and which ones were discarded, so which ones are still to come: the order of
+        # the deck is hidden from the players
+        key = STORM_LEFT_KEYS[len(self.deck) & 31] ^ MITIGATED_KEYS[self.mitigated & 15]
+        for card in self.discard_pile:
+            key ^= DISCARDED_KEYS[card]
+        return key
 
     def __str__(self):
-        return "\n".join(str(card) for card in self.deck)
+        return "\n".join(str(self.cards[card]) for card in self.deck)
 
 
 class StormCard:
-    def __init__(self, name, moves, game):
+    __slots__ = ("name", "moves", "index")
+
+    def __init__(self, name, moves):
         self.name = name
         self.moves = moves
-        self.game = game
+        self.index = None  # Position in Deck.cards
+
+    def apply(self, game):
+        # The whole move at once, from STORM_MOVE_TABLE
+        storm = game.tiles["storm"]
+        if game.log_level >= LOG_EVENTS:
+            game.log_file.write(f"{self.name}, {self.moves}\n\n")
+        destination, sand_cells, tile_cells = STORM_MOVE_TABLE[storm.cell][self.index]
+        if not sand_cells:
+            return
 
-    def apply(self):
-        storm = self.game.tiles["storm"]
-        self.game.log_file.write(f"{self.name}, {self.moves}\n\n")
-        for move in self.moves:
-            x_move, y_move = move
-            new_x = storm.x_coordinate + x_move
-            new_y = storm.y_coordinate + y_move
+        cell_to_tile = game.cell_to_tile
+        tiles = [cell_to_tile[cell] for cell in sand_cells]
+        for tile in tiles:
+            tile.add_sand(game)
+            for index in tile.occupants:
+                game.adventurer_list[index].lose_water()
 
-            # Check if the move is within board boundaries
-            if 0 <= new_x <= 4 and 0 <= new_y <= 4:
-                adjacent_tile = self.game.coordinate_to_tile[(new_x, new_y)]
-                adjacent_tile.add_sand()
-                for adventurer in adjacent_tile.adventurers:
-                    adventurer.lose_water()
+        # Boat parts lying on the storm are handed over to the first tile to take its place
+        game.touch(storm)
+        if storm.boat_parts:
+            for part in storm.boat_parts:
+                if game.log_level >= LOG_EVENTS:
+                    game.log_file.write(f"{part} is now on {tiles[0]}.\n")
+            tiles[0].boat_parts.extend(storm.boat_parts)
+            storm.boat_parts.clear()
 
-                storm.swap(adjacent_tile)
+        # Every tile steps back into the cell the storm left, with its adventurers, and the storm ends on the last
+        # one's
+        occupancy = game.occupancy
+        masks = [occupancy[cell] for cell in sand_cells]
+        tiles.append(storm)
+        masks.append(0)
+        for tile, cell, mask in zip(tiles, tile_cells + (destination,), masks):
+            tile.set_coordinates(cell % SIZE, cell // SIZE)
+            game.coordinate_to_tile[(tile.x_coordinate, tile.y_coordinate)] = tile
+            cell_to_tile[cell] = tile
+            tile.update_bitboards(game)
+            occupancy[cell] = mask
+            for index in tile.occupants:
+                game.adventurer_cells[index] = cell
+        game.layout_version += 1
 
     def __str__(self):
         return f"{self.name}, {self.moves}"
 
 
 class SBDCard:
-    def __init__(self, name, game):
+    __slots__ = ("name", "index")
+
+    def __init__(self, name):
         self.name = name
-        self.game = game
-
-    def apply(self):
-        self.game.log_file.write(f"{self.name}\n\n")
-        for tile in self.game.tiles.values():
-            # Check if the tile is safe due to being flipped or a tunnel
-            safe_tunnel = tile.flipped and "tunnel" in tile.name
-            
-            # Check if any adventurer on the tile has an active solar shield
-            any_shield_active = any(adventurer.solar_shield_active for adventurer in tile.adventurers)
-            
-            if not safe_tunnel and not any_shield_active:
-                # If the tile isn't safe and no solar shields are active, adventurers lose water
-                for adventurer in tile.adventurers:
-                    adventurer.lose_water()
+        self.index = None  # Position in Deck.cards
+
+    def apply(self, game):
+        if game.log_level >= LOG_EVENTS:
+            game.log_file.write(f"{self.name}\n\n")
+        # Flipped tunnels are safe, and so is any tile where an adventurer has an active solar shield
+        safe = game.flipped_board & game.tunnel_board
+        for adventurer in game.adventurer_list:
+            if adventurer.solar_shield_active:
+                safe |= 1 << game.adventurer_cells[adventurer.index]
+
+        # Everyone else loses water: only the occupied cells that are not safe are visited
+        occupied = 0
+        for cell in game.adventurer_cells:
+            occupied |= 1 << cell
+        for cell in bits(occupied & ~safe):
+            for index in bits(game.occupancy[cell]):
+                game.adventurer_list[index].lose_water()
 
     def __str__(self):
         return self.name
 
 
 class SPUCard:
-    def __init__(self, name, game):
+    __slots__ = ("name", "index")
+
+    def __init__(self, name):
         self.name = name
-        self.game = game
+        self.index = None  # Position in Deck.cards
 
     def __str__(self):
         return self.name
+
+
+def storm_card_templates():
+    templates = []
+
+    # add storm cards: 1, 2 and 3 move cards
+    storm_patterns = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+    for moves, copies in ((1, 3), (2, 2), (3, 1)):
+        for pattern in storm_patterns:
+            for i in range(copies):
+                templates.append((StormCard, f"Storm Moves x{moves} {i+1}/{copies}", (pattern,) * moves))
+
+    # add sun beats down cards
+    for i in range(4):
+        templates.append((SBDCard, f"Sun Beats Down {i+1}/4", None))
+
+    # add storm picks up cards
+    for i in range(3):
+        templates.append((SPUCard, f"Storm Picks Up {i+1}/3", None))
+
+    return tuple(templates)
+
+
+"""
+The definitions of the storm cards, in the order of Deck.cards: (class, name, moves of a storm card).
+"""
+STORM_CARD_TEMPLATES = storm_card_templates()
+
+
+def storm_cards():
+    cards = tuple(
+        StormCard(name, list(moves)) if card_class is StormCard else card_class(name)
+        for card_class, name, moves in STORM_CARD_TEMPLATES
+    )
+    for index, card in enumerate(cards):
+        card.index = index
+    return cards
+
+
+# The storm cards, built once from their definitions. A card holds nothing of a game, so all games share them
+ALL_STORM_CARDS = storm_cards()
+
+
+"""
+The kind of every storm card, by index in Deck.cards: a storm move, a Sun Beats Down or a Storm Picks Up,
+and the steps of the storm moves, as (x, y) offsets.
+"""
+STORM_MOVES, SUN_BEATS_DOWN, STORM_PICKS_UP = range(3)
+STORM_CARD_KINDS = [
+    STORM_MOVES if isinstance(card, StormCard) else SUN_BEATS_DOWN if isinstance(card, SBDCard) else STORM_PICKS_UP
+    for card in ALL_STORM_CARDS
+]
+STORM_CARD_STEPS = [tuple(card.moves) if isinstance(card, StormCard) else () for card in ALL_STORM_CARDS]
+
+
+def storm_move_table():
+    table = []
+    for storm_cell in range(CELLS):
+        row = []
+        for steps in STORM_CARD_STEPS:
+            cell = storm_cell
+            sand_cells = []
+            tile_cells = []
+            for dx, dy in steps:
+                x, y = cell % SIZE + dx, cell // SIZE + dy
+                if 0 <= x < SIZE and 0 <= y < SIZE:  # The storm stops at the edge of the board
+                    tile_cells.append(cell)
+                    cell = cell_of(x, y)
+                    sand_cells.append(cell)
+            row.append((cell, tuple(sand_cells), tuple(tile_cells)))
+        table.append(tuple(row))
+    return tuple(table)
+
+
+"""
+What every storm card does to the board, for every cell of the storm: STORM_MOVE_TABLE[storm cell][card] is
+(destination, sand cells, tile cells). The tiles on the sand cells get a sand marker each, in order, and the
+one on sand cells[i] moves to tile cells[i], the cell the storm was on before that step. The storm ends on the
+destination. Cards that do not move the storm, or a storm against the edge, have no sand cells.
+"""
+STORM_MOVE_TABLE = storm_move_table()
@@ -1,27 +1,60 @@
+from board import *
+from logs import *
+from zobrist import *
+
+
 class Tile:
     """
     The Tile class represents a single tile on the Forbidden Desert game board.
+    A tile holds no reference to the game, nor to the adventurers on it, so that a game is freed as soon as
+    it is dropped, without waiting for the garbage collector: the methods that change the game are given it.
     Attributes:
         name (str): The name of the tile, which is unique and descriptive (e.g., 'oasis', 'water_1').
         symbol (str): A single-character or short string symbol representing the tile on the board.
         x_coordinate (int, optional): The x-coordinate of the tile on the board. Defaults to None.
         y_coordinate (int, optional): The y-coordinate of the tile on the board. Defaults to None.
+        cell (int): The cell of the tile on the board, see board.py. None until the tile is placed.
+        is_storm (bool): Whether this is the storm tile.
+        is_tunnel (bool): Whether this is a tunnel tile.
         sand (int): The number of sand markers on the tile. Initialized to 0.
         flipped (bool): A boolean indicating whether the tile has been flipped over. Defaults to False.
+        occupants (list): The indices of the adventurers on the tile (see Game.adventurer_list), in the order
+            they arrived. The game also indexes them by cell, see Game.occupancy.
 
     Methods:
-        flip(): Marks the tile as flipped over.
+        add_adventurer(game, adventurer), remove_adventurer(game, adventurer): An adventurer arrives or leaves.
+        flip(game, adventurer): Marks the tile as flipped over.
         set_coordinates(x_coordinate, y_coordinate): Sets the tile's position on the board.
-        swap(other_tile): Swaps the position of this tile with another tile on the board.
-        add_sand(): Adds a sand marker to the tile.
-        remove_sand(): Removes a sand marker from the tile, ensuring the count does not go below zero.
+        swap(game, other_tile): Swaps the position of this tile with another tile on the board.
+        add_sand(game): Adds a sand marker to the tile.
+        remove_sand(game): Removes a sand marker from the tile, ensuring the count does not go below zero.
+        get_state(): Returns the mutable state of the tile as a tuple, see Game.snapshot.
+        set_state(state): Restores a state returned by get_state. The game then puts the tile back, see Game.place.
+        reset(): Takes the tile off the board, as it comes out of the box, see Game.reset.
+        update_bitboards(game): Writes the tile into the game's bitboards, see Game.
+        zobrist_key(): The part of the game's Zobrist key that comes from the tile, see Game.position_key.
     """
 
+    __slots__ = (
+        "name",
+        "symbol",
+        "x_coordinate",
+        "y_coordinate",
+        "cell",
+        "is_storm",
+        "is_tunnel",
+        "sand",
+        "flipped",
+        "blocked",
+        "occupants",
+        "boat_parts",
+        "index",
+    )
+
     def __init__(
         self,
         name,
         symbol,
-        game,
         x_coordinate=None,
         y_coordinate=None,
         flipped=False,
@@ -29,14 +62,19 @@ class Tile:
     ):
         self.name = name
         self.symbol = symbol
-        self.game = game
         self.x_coordinate = x_coordinate
         self.y_coordinate = y_coordinate
+        self.cell = None
+        if x_coordinate is not None:
+            self.cell = cell_of(x_coordinate, y_coordinate)
+        self.is_storm = name == "storm"
+        self.is_tunnel = "tunnel" in name
         self.sand = 0
         self.flipped = flipped
         self.blocked = blocked
-        self.adventurers = []  # List of adventurers on this tile
+        self.occupants = []  # Indices of the adventurers on this tile
         self.boat_parts = [] # List of boat parts on this tile
+        self.index = None  # Position in Game.tile_list
 
     def __str__(self):
         return (
@@ -46,120 +84,241 @@ class Tile:
     def __repr__(self):
         return f"{self.name}"
 
-    def add_adventurer(self, adventurer):
-        self.adventurers.append(adventurer)
+    def add_adventurer(self, game, adventurer):
+        game.touch(self)
+        index = adventurer.index
+        self.occupants.append(index)
+        game.occupancy[self.cell] |= 1 << index
+        game.adventurer_cells[index] = self.cell
+        game.occupancy_version += 1
 
-    def remove_adventurer(self, adventurer):
-        self.adventurers.remove(adventurer)
+    def remove_adventurer(self, game, adventurer):
+        game.touch(self)
+        # occupants keeps the order the adventurers arrived in, which decides who shares water and gear with
+        # whom first (and so what the logs say), where the occupancy mask only knows who is there. The compact
+        # engine keeps an arrival stamp per adventurer instead (state.ARRIVAL); here a list of at most six is
+        # cheaper to scan than stamps are to sort every time the occupants are read
+        self.occupants.remove(adventurer.index)
+        game.occupancy[self.cell] ^= 1 << adventurer.index
+        game.occupancy_version += 1
 
-    def flip(self, adventurer):
+    def flip(self, game, adventurer):
         #print(f"{adventurer.name} has flipped tile {self.name}")
+        game.touch(self)
         self.flipped = True
-        self.apply_flip_effect(adventurer)
+        game.flipped_board |= 1 << self.cell
+        self.apply_flip_effect(game, adventurer)
 
-    def apply_flip_effect(self, adventurer):
+    def apply_flip_effect(self, game, adventurer):
         # Described in each tile sublass - vide infra.
         pass
 
     def set_coordinates(self, x_coordinate, y_coordinate):
         self.x_coordinate = x_coordinate
         self.y_coordinate = y_coordinate
+        self.cell = cell_of(x_coordinate, y_coordinate)
+
+    def swap(self, game, other_tile):
+        game.touch(self)
+        game.touch(other_tile)
 
-    def swap(self, other_tile):
         # if the storm tile (only one to trigger swap) has a boat part, give it immediately to the next tile after swap
         if self.boat_parts:
             for part in self.boat_parts[:]:  # iterating over a copy of the list
-                self.game.log_file.write(f"{part} is now on {other_tile}.\n")
+                if game.log_level >= LOG_EVENTS:
+                    game.log_file.write(f"{part} is now on {other_tile}.\n")
                 self.boat_parts.remove(part)
                 other_tile.boat_parts.append(part)
 
 
         # swap coordinates
         temp_x, temp_y = self.x_coordinate, self.y_coordinate
-        self.x_coordinate, self.y_coordinate = (
-            other_tile.x_coordinate,
-            other_tile.y_coordinate,
-        )
-        other_tile.x_coordinate, other_tile.y_coordinate = temp_x, temp_y
+        self.set_coordinates(other_tile.x_coordinate, other_tile.y_coordinate)
+        other_tile.set_coordinates(temp_x, temp_y)
 
-        # Update the shared mapping with new coordinates
-        self.game.coordinate_to_tile[(self.x_coordinate, self.y_coordinate)] = self
-        self.game.coordinate_to_tile[
+        # Update the shared mappings with new coordinates
+        game.coordinate_to_tile[(self.x_coordinate, self.y_coordinate)] = self
+        game.coordinate_to_tile[
             (other_tile.x_coordinate, other_tile.y_coordinate)
         ] = other_tile
+        game.cell_to_tile[self.cell] = self
+        game.cell_to_tile[other_tile.cell] = other_tile
+        self.update_bitboards(game)
+        other_tile.update_bitboards(game)
+        game.layout_version += 1
+
+    def get_state(self):
+        return (
+            self.x_coordinate,
+            self.y_coordinate,
+            self.sand,
+            self.flipped,
+            self.blocked,
+            tuple(self.occupants),
+            tuple(self.boat_parts),
+        )
+
+    def set_state(self, state):
+        x_coordinate, y_coordinate, self.sand, self.flipped, self.blocked, occupants, boat_parts = state
+        self.set_coordinates(x_coordinate, y_coordinate)
+        self.occupants = list(occupants)
+        self.boat_parts = list(boat_parts)
+
+    def reset(self):
+        self.x_coordinate = None
+        self.y_coordinate = None
+        self.cell = None
+        self.sand = 0
+        self.flipped = False
+        self.blocked = False
+        self.occupants.clear()
+        self.boat_parts.clear()
 
-    def add_sand(self):
+    def update_bitboards(self, game):
+        # Sets or clears the bit of the tile's cell in every bitboard
+        bit = 1 << self.cell
+        keep = ALL_CELLS ^ bit
+        game.blocked_board = game.blocked_board & keep | (bit if self.blocked else 0)
+        game.flipped_board = game.flipped_board & keep | (bit if self.flipped else 0)
+        game.sand_board = game.sand_board & keep | (bit if self.sand else 0)
+        game.tunnel_board = game.tunnel_board & keep | (bit if self.is_tunnel else 0)
+        game.storm_board = game.storm_board & keep | (bit if self.is_storm else 0)
+
+    def zobrist_key(self):
+        # The adventurers on the tile are in their own keys
+        index = self.index
+        key = TILE_CELL_KEYS[index][self.cell] ^ SAND_KEYS[index][self.sand & 63]
+        if self.flipped:
+            key ^= FLIPPED_KEYS[index]
+        for part in self.boat_parts:
+            key ^= PART_ON_TILE_KEYS[index][PART_KEY_INDEX[part]]
+        return key
+
+    def add_sand(self, game):
+        game.touch(self)
         self.sand += 1
-        self.game.total_sand += 1
+        game.total_sand += 1
+        game.sand_board |= 1 << self.cell
         if self.sand > 1:
             self.blocked = True
+            game.blocked_board |= 1 << self.cell
 
-    def remove_sand(self):
+    def remove_sand(self, game):
+        game.touch(self)
         self.sand -= 1
-        self.game.total_sand -= 1
+        game.total_sand -= 1
         if self.sand < 0:
             self.sand = 0
+        if self.sand == 0:
+            game.sand_board &= ALL_CELLS ^ 1 << self.cell
 
         if self.sand < 2:
             self.blocked = False
+            game.blocked_board &= ALL_CELLS ^ 1 << self.cell
 
 
 class WaterTile(Tile):
+    __slots__ = ()
+
     def __init__(
-        self, name, symbol, game, x_coordinate=None, y_coordinate=None
+        self, name, symbol, x_coordinate=None, y_coordinate=None
     ):
-        super().__init__(name, symbol, game, x_coordinate, y_coordinate)
+        super().__init__(name, symbol, x_coordinate, y_coordinate)
 
-    def apply_flip_effect(self, adventurer):
+    def apply_flip_effect(self, game, adventurer):
         # adventurer is actually not needed TBD
-        for adventurer in self.adventurers:
-            adventurer.get_water()
-            adventurer.get_water()
+        for index in self.occupants:
+            game.adventurer_list[index].get_water()
+            game.adventurer_list[index].get_water()
 
 
 class MirageTile(Tile):
+    __slots__ = ()
+
     def __init__(
-        self, name, symbol, game, x_coordinate=None, y_coordinate=None
+        self, name, symbol, x_coordinate=None, y_coordinate=None
     ):
-        super().__init__(name, symbol, game, x_coordinate, y_coordinate)
+        super().__init__(name, symbol, x_coordinate, y_coordinate)
 
-    def apply_flip_effect(self, adventurer):
+    def apply_flip_effect(self, game, adventurer):
         # adventurer is actually not needed TBD
         #print("The well is dry...")
         pass
 
 
 class GearTile(Tile):
+    __slots__ = ()
+
     def __init__(
-        self, name, symbol, game, x_coordinate=None, y_coordinate=None
+        self, name, symbol, x_coordinate=None, y_coordinate=None
     ):
-        super().__init__(name, symbol, game, x_coordinate, y_coordinate)
+        super().__init__(name, symbol, x_coordinate, y_coordinate)
 
-    def apply_flip_effect(self, adventurer):
-        self.game.gear_deck.draw(adventurer)
+    def apply_flip_effect(self, game, adventurer):
+        game.gear_deck.draw(adventurer)
 
 
 class TunnelTile(Tile):
+    __slots__ = ()
+
     def __init__(
-        self, name, symbol, game, x_coordinate=None, y_coordinate=None
+        self, name, symbol, x_coordinate=None, y_coordinate=None
     ):
-        super().__init__(name, symbol, game, x_coordinate, y_coordinate)
+        super().__init__(name, symbol, x_coordinate, y_coordinate)
     
-    def apply_flip_effect(self, adventurer):
-        self.game.gear_deck.draw(adventurer)
+    def apply_flip_effect(self, game, adventurer):
+        game.gear_deck.draw(adventurer)
 
 
 class PartTile(Tile):
+    __slots__ = ()
+
     def __init__(
-        self, name, symbol, game, x_coordinate=None, y_coordinate=None
+        self, name, symbol, x_coordinate=None, y_coordinate=None
     ):
-        super().__init__(name, symbol, game, x_coordinate, y_coordinate)
+        super().__init__(name, symbol, x_coordinate, y_coordinate)
     
-    def apply_flip_effect(self, adventurer):
+    def apply_flip_effect(self, game, adventurer):
         if "gem" in self.name:
-            self.game.gem_tiles_flipped += 1
+            game.gem_tiles_flipped += 1
         elif "motor" in self.name:
-            self.game.motor_tiles_flipped += 1
+            game.motor_tiles_flipped += 1
         elif "compass" in self.name:
-            self.game.compass_tiles_flipped += 1
-        elif "propeller" in self.name: self.game.propeller_tiles_flipped += 1
+            game.compass_tiles_flipped += 1
+        elif "propeller" in self.name: game.propeller_tiles_flipped += 1
+
+
+"""
+The stack of tiles that comes with the boardgame, in the order of Game.tile_list:
+(key in Game.tiles, class, name, symbol). Every game builds its tiles from it, see Game.create_tiles.
+"""
+TILE_TEMPLATES = (
+    ("start", GearTile, "start", "S"),
+    ("storm", Tile, "storm", "X"),
+    ("tunnel_1", TunnelTile, "tunnel_1", "T1"),
+    ("tunnel_2", TunnelTile, "tunnel_2", "T2"),
+    ("tunnel_3", TunnelTile, "tunnel_3", "T3"),
+    ("boat", Tile, "boat", "B"),
+    ("gem_h", PartTile, "gem_h", "Gh"),
+    ("gem_v", PartTile, "gem_v", "Gv"),
+    ("motor_h", PartTile, "motor_h", "Mh"),
+    ("motor_v", PartTile, "motor_v", "Mv"),
+    ("compass_h", PartTile, "compass_h", "Ch"),
+    ("compass_v", PartTile, "compass_v", "Cv"),
+    ("propeller_h", PartTile, "propeller_h", "Ph"),
+    ("propeller_v", PartTile, "propeller_v", "Pv"),
+    ("water_1", WaterTile, "water_1", "W1"),
+    ("water_2", WaterTile, "water_2", "W2"),
+    ("oasis", MirageTile, "mirage", "M"),
+    ("dune_1", GearTile, "dune_1", "D1"),
+    ("dune_2", GearTile, "dune_2", "D2"),
+    ("dune_3", GearTile, "dune_3", "D3"),
+    ("dune_4", GearTile, "dune_4", "D4"),
+    ("dune_5", GearTile, "dune_5", "D5"),
+    ("dune_6", GearTile, "dune_6", "D6"),
+    ("dune_7", GearTile, "dune_7", "D7"),
+    ("dune_8", GearTile, "dune_8", "D8"),
+)
+
+# The coordinates the tiles other than the storm are dealt to, before they are shuffled. See Game.initialize_tiles
+LAYOUT_COORDINATES = tuple((x, y) for x in range(5) for y in range(5) if (x, y) != (2, 2))
@@ -0,0 +1,110 @@
+import random
+
+
+"""
+Zobrist keys. The key of a position is the XOR of one random 64-bit number per feature of the position,
+so a change to the position changes the key by a couple of XORs. See Game.position_key.
+The numbers come from a fixed seed: keys are the same in every game and every process.
+"""
+_rng = random.Random("zobrist")
+
+
+def _keys(*shape):
+    if len(shape) == 1:
+        return [_rng.getrandbits(64) for _ in range(shape[0])]
+    return [_keys(*shape[1:]) for _ in range(shape[0])]
+
+
+PART_KEY_INDEX = {"Propeller": 0, "Motor": 1, "Gem": 2, "Compass": 3}
+
+# Tiles, by tile index
+TILE_CELL_KEYS = _keys(25, 25)  # By cell, see board.py
+SAND_KEYS = _keys(25, 64)  # By number of sand markers, modulo 64
+FLIPPED_KEYS = _keys(25)
+PART_ON_TILE_KEYS = _keys(25, 4)  # By PART_KEY_INDEX
+
+# Adventurers, by adventurer index
+ADVENTURER_TILE_KEYS = _keys(6, 25)  # By tile index
+WATER_KEYS = _keys(6, 16)  # Modulo 16
+ITEM_KEYS = _keys(6, 12)  # By gear card index
+PART_HELD_KEYS = _keys(6, 4)
+SHIELD_KEYS = _keys(6)
+CARRYING_KEYS = _keys(6)  # By index of the adventurer carried by the climber
+
+# Decks and counters
+STORM_LEFT_KEYS = _keys(32)  # Cards left in the storm deck
+DISCARDED_KEYS = _keys(32)  # By storm card index, for every card in the discard pile
+MITIGATED_KEYS = _keys(16)
+GEAR_LEFT_KEYS = _keys(16)
+GEAR_IN_DECK_KEYS = _keys(16)  # By gear card index, for every card still in the gear deck
+STORM_LEVEL_KEYS = _keys(32)
+TURN_KEYS = _keys(8)
+ACTION_POINTS_KEYS = _keys(16)
+GAME_OVER_KEY = _keys(1)[0]
+
+
+class TranspositionTable:
+    """
+    The TranspositionTable class holds search results by position key (see Game.position_key), in a fixed
+    number of slots, so that a search can share what it learned about a position reached in different ways.
+    Each key goes to a single slot. A stored entry is replaced by the same position, by an entry of a later
+    search (see new_search), or by an entry searched at least as deeply; otherwise the new entry is dropped.
+    Attributes:
+        size (int): The number of slots, a power of 2.
+        generation (int): The search the entries belong to.
+        hits, misses, stores, rejections (int): Counts of lookups that found or did not find their key,
+        and of entries stored or dropped.
+
+    Methods:
+        get(key): Returns (value, visits, depth) of the position, or None if it is not in the table.
+        store(key, value, visits, depth): Stores a search result. Returns whether it was kept.
+        new_search(): Lets the next search replace the entries of the previous ones.
+    """
+
+    def __init__(self, size=1 << 16):
+        self.size = 1 << max(0, size - 1).bit_length()
+        self.mask = self.size - 1
+        self.keys = [None] * self.size
+        self.values = [0.0] * self.size
+        self.visits = [0] * self.size
+        self.depths = [0] * self.size
+        self.generations = [0] * self.size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.rejections = 0
+
+    def __len__(self):
+        return self.size - self.keys.count(None)
+
+    def get(self, key):
+        slot = key & self.mask
+        if self.keys[slot] == key:
+            self.hits += 1
+            return self.values[slot], self.visits[slot], self.depths[slot]
+        self.misses += 1
+        return None
+
+    def store(self, key, value, visits=1, depth=0):
+        slot = key & self.mask
+        stored_key = self.keys[slot]
+        if (
+            stored_key is not None
+            and stored_key != key
+            and self.generations[slot] == self.generation
+            and depth < self.depths[slot]
+        ):
+            self.rejections += 1
+            return False
+
+        self.keys[slot] = key
+        self.values[slot] = value
+        self.visits[slot] = visits
+        self.depths[slot] = depth
+        self.generations[slot] = self.generation
+        self.stores += 1
+        return True
+
+    def new_search(self):
+        self.generation += 1
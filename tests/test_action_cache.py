@@ -0,0 +1,75 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "code"))
+from game import *
+
+
+def checking_policy(test):
+    # Plays like random_policy, after checking the actions against the ones computed with empty caches
+    def policy(game, adventurer, possible_actions):
+        action_cache, sharing_pairs = game.action_cache, game.sharing_pairs
+        game.action_cache, game.sharing_pairs = {}, (None, [])
+        fresh_actions = game.get_possible_actions(adventurer)
+        game.action_cache, game.sharing_pairs = action_cache, sharing_pairs
+        test.assertEqual(possible_actions, fresh_actions, f"seed {game.seed}, round {game.round}")
+        test.decisions += 1
+        return random_policy(game, adventurer, possible_actions)
+
+    return policy
+
+
+def play_long_game(game, rounds):
+    # Keeps the game going whatever happens, with the storm weak, so the storm moves the tiles around for many rounds
+    game.set_player_order()
+    for _ in range(rounds):
+        for adventurer in game.player_order:
+            for other_adventurer in game.adventurer_list:
+                while other_adventurer.water < 2:
+                    other_adventurer.get_water()
+            game.sand_storm_level = min(game.sand_storm_level, 6)
+            game.is_game_over = False
+            game.outcome = None
+            game.check_solar_shield(adventurer)
+            game.execute_turn(adventurer)
+        game.round += 1
+        game.turn = 1
+
+
+class ActionCacheTest(unittest.TestCase):
+    """
+    The cached parts of get_possible_actions (see Game.cached_actions) against the same actions computed
+    from scratch, at every decision of long games, across storm draws that move the tiles around.
+    """
+
+    def test_jet_pack_targets_follow_the_tiles(self):
+        # Two tiles trade places, and which one is blocked, so the blocked cells are the same as before
+        game = Game(seed=0)
+        adventurer = game.adventurer_list[0]
+        jet_pack = next(card for card in ALL_GEAR_CARDS if isinstance(card, JetPack))
+        adventurer.inventory.append(jet_pack)
+        first, second = [tile for tile in game.tile_list if not tile.is_storm and not tile.blocked][:2]
+        first.add_sand(game)
+        first.add_sand(game)
+        before = game.get_possible_actions(adventurer)
+        self.assertNotIn(("use_item", (adventurer, jet_pack, first), 0), before)
+
+        first.remove_sand(game)
+        first.remove_sand(game)
+        second.add_sand(game)
+        second.add_sand(game)
+        first.swap(game, second)
+        after = game.get_possible_actions(adventurer)
+        self.assertIn(("use_item", (adventurer, jet_pack, first), 0), after)
+        self.assertNotIn(("use_item", (adventurer, jet_pack, second), 0), after)
+
+    def test_cached_actions_match_fresh_ones(self):
+        self.decisions = 0
+        for seed in range(150):
+            play_long_game(Game(seed=seed, policy=checking_policy(self)), 20)
+        self.assertGreater(self.decisions, 10000)
+
+
+if __name__ == "__main__":
+    unittest.main()
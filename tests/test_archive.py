@@ -0,0 +1,89 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "code"))
+from game import *
+
+
+def log_text(game):
+    # Logs of different lengths, so that offsets are checked too
+    return f"Game {game}\n" + "Storm Moves\n" * (game % 7)
+
+
+class ArchiveTest(unittest.TestCase):
+    """
+    ArchiveWriter and LogArchive: every log put in the archive reads back, whichever shard it went to, and
+    closing the writer writes all of them.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "game_logs")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, games, shards=SHARDS):
+        writer = ArchiveWriter(self.path, shards)
+        for game in games:
+            writer.put(game, log_text(game))
+        writer.close()
+
+    def check(self, games):
+        archive = LogArchive(self.path)
+        self.assertEqual(archive.games(), sorted(games))
+        for game in games:
+            self.assertEqual(archive.read(game), log_text(game))
+
+    def test_read_back(self):
+        # More logs than the queue holds, in many batches, over every shard
+        games = range(10 * BATCH)
+        self.write(games)
+        self.check(games)
+        self.assertEqual(len(os.listdir(self.directory.name)), 2 * SHARDS)
+
+    def test_append(self):
+        # A second writer carries on the shards of the first
+        self.write(range(10))
+        self.write(range(10, 25))
+        self.check(range(25))
+
+    def test_one_shard(self):
+        self.write(range(30), shards=1)
+        self.check(range(30))
+
+    def test_truncated_index(self):
+        # As after a crash in the middle of an index entry: only that game is lost
+        self.write(range(8))
+        with open(f"{self.path}_3.idx", "r+b") as index_file:
+            index_file.truncate(2 * INDEX_ENTRY.size - 1)
+        self.check([0, 1, 2, 3, 4, 5, 6])
+        with self.assertRaises(KeyError):
+            LogArchive(self.path).read(7)
+
+    def test_main_archives_every_game(self):
+        # main closes the archive before it returns, so that its writer is done: the last logs are in it,
+        # as play_game wrote them
+        cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        try:
+            threads = threading.active_count()
+            with contextlib.redirect_stdout(io.StringIO()):
+                main(9, seed="archive", snapshot_every=4)
+            self.assertEqual(threading.active_count(), threads)
+            with contextlib.redirect_stdout(io.StringIO()):
+                logs = [play_game((i, "archive", "game_logs", LOG_BOARD, False, False))["log"] for i in range(9)]
+            archive = LogArchive(os.path.join("game_logs", "game_logs"))
+            self.assertEqual(archive.games(), list(range(9)))
+            self.assertEqual([archive.read(i) for i in range(9)], logs)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "code"))
+from env import *
+
+
+def play_alone(seed):
+    # The final state of a compact game played at random by itself
+    state = GameState(seed=seed)
+    state.start()
+    while not state.outcome:
+        state.step(state.policy_rng.choice(state.legal_actions(state.current_adventurer)))
+    return state.s
+
+
+class BatchGameTest(unittest.TestCase):
+    """
+    BatchGame against compact games played one by one.
+    """
+
+    def test_games_are_played_as_alone(self):
+        batch = BatchGame(4, seed="batch")
+        started = list(range(4))  # The game each slot of the batch holds
+        final_states = {}
+        while len(final_states) < 20:
+            next_game = batch.games_started
+            states = [s[:] for s in batch.states]
+            for i, outcome in enumerate(batch.step()):
+                if outcome:
+                    # The game ended in this step: it was replaced by a new one, started from its seed
+                    final_states[started[i]] = outcome
+                    self.assertEqual(batch.states[i][ROUND], 1)
+                    self.assertNotEqual(batch.states[i], states[i])
+                    started[i] = next_game
+                    next_game += 1
+            self.assertEqual(batch.games_started, next_game)
+        for k, outcome in final_states.items():
+            self.assertEqual(play_alone(f"batch:{k}")[OUTCOME], outcome, f"game {k}")
+
+    def test_given_actions(self):
+        batch = BatchGame(3, seed="batch")
+        states = [GameState(seed=f"batch:{k}") for k in range(3)]
+        for state in states:
+            state.start()
+        for _ in range(10):
+            actions = [legal[-1] for legal in batch.legal_actions()]
+            self.assertEqual(batch.legal_actions(), [state.legal_actions(state.current_adventurer) for state in states])
+            outcomes = batch.step(actions)
+            if any(outcomes):
+                break
+            for state, action in zip(states, actions):
+                state.step(action)
+            self.assertEqual(batch.states, [state.s for state in states])
+
+    def test_observations(self):
+        batch = BatchGame(3, seed="batch")
+        batch.step()
+        observations = batch.observe()
+        self.assertEqual(len(observations), 3 * OBSERVATION_SIZE)
+        for i, s in enumerate(batch.states):
+            row = observations[i * OBSERVATION_SIZE:(i + 1) * OBSERVATION_SIZE]
+            self.assertEqual(list(row), [value for start, end in OBSERVED for value in s[start:end]])
+
+
+class EnvTest(unittest.TestCase):
+    """
+    Env: the action mask, the end of a game and starting the next one.
+    """
+
+    def check_mask(self, env):
+        s = env.state.s
+        legal = set()
+        if not s[OUTCOME]:
+            legal = {action_id(action) for action in legal_actions(s, current_adventurer(s))}
+        self.assertEqual({i for i, flag in enumerate(env.mask) if flag}, legal)
+
+    def test_mask_and_rewards(self):
+        env = Env()
+        for seed in range(50):
+            observation = env.reset(seed=f"env:{seed}")
+            self.assertEqual(observation[-1], 1)  # Storm level
+            done = False
+            while not done:
+                self.check_mask(env)
+                legal = [i for i, flag in enumerate(env.mask) if flag]
+                observation, reward, done, info = env.step(env.state.policy_rng.choice(legal))
+            self.check_mask(env)
+            self.assertFalse(any(env.mask))
+            self.assertEqual(reward, WIN_REWARD if info["outcome"] == WON else LOSS_REWARD)
+
+    def test_illegal_action(self):
+        env = Env()
+        env.reset(seed="env")
+        illegal = env.mask.index(0)
+        with self.assertRaises(ValueError):
+            env.step(illegal)
+
+    def test_reset_after_the_end(self):
+        env = Env()
+        first = list(env.reset(seed="env"))
+        done = False
+        while not done:
+            _, _, done, _ = env.step(env.mask.index(1))
+        self.assertEqual(list(env.reset(seed="env")), first)
+        self.check_mask(env)
+        self.assertTrue(any(env.mask))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "code"))
+from benchmark import *
+
+
+def results(games, **metrics):
+    # A run of the benchmarks, from (median, low, high) per metric
+    return {
+        "games": games,
+        "results": {name: median for name, (median, _, _) in metrics.items()},
+        "ranges": {name: [low, high] for name, (_, low, high) in metrics.items()},
+    }
+
+
+class CompareTest(unittest.TestCase):
+    """
+    compare: only slowdowns beyond the tolerance, whose runs do not overlap the baseline's, are regressions.
+    """
+
+    def compare(self, baseline, current):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return compare(baseline, current)
+
+    def test_overlapping_runs_are_noise(self):
+        baseline = results(MIN_GAMES, setup_us=(100, 90, 140))
+        self.assertEqual(self.compare(baseline, results(MIN_GAMES, setup_us=(130, 95, 150))), [])
+
+    def test_slowdowns(self):
+        baseline = results(MIN_GAMES, setup_us=(100, 95, 105), **{"games_per_second/log none": (1000, 950, 1050)})
+        current = results(MIN_GAMES, setup_us=(130, 125, 135), **{"games_per_second/log none": (700, 650, 750)})
+        self.assertEqual(sorted(self.compare(baseline, current)), ["games_per_second/log none", "setup_us"])
+        # Apart, but within the tolerance
+        self.assertEqual(self.compare(baseline, results(MIN_GAMES, setup_us=(110, 108, 112))), [])
+
+    def test_baseline_without_ranges(self):
+        baseline = results(MIN_GAMES, setup_us=(100, 100, 100))
+        del baseline["ranges"]
+        self.assertEqual(self.compare(baseline, results(MIN_GAMES, setup_us=(130, 125, 135))), ["setup_us"])
+
+    def test_runs_that_cannot_be_compared(self):
+        with self.assertRaises(ValueError):
+            self.compare(results(MIN_GAMES, setup_us=(1, 1, 1)), results(2 * MIN_GAMES, setup_us=(1, 1, 1)))
+        with self.assertRaises(ValueError):
+            self.compare(results(20, setup_us=(1, 1, 1)), results(20, setup_us=(1, 1, 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
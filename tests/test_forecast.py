@@ -0,0 +1,65 @@
+import os
+import sys
+import unittest
+from math import comb
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "code"))
+from forecast import *
+import forecast  # The module, in place of its forecast function, to reach its settings
+
+
+class ForecastTest(unittest.TestCase):
+    """
+    storm_forecast: the distribution of a storm draw, worked out exactly for draws of any size, and the bound on
+    its cache.
+    """
+
+    def setUp(self):
+        clear_forecasts()
+
+    def check_counts(self, result, drawn, draws):
+        # The Sun Beats Down and Storm Picks Up cards of the outcomes, against the hypergeometric distribution of
+        # draws cards from the whole deck, on top of the ones already drawn before a reshuffle
+        full_deck = card_counts(range(STORM_CARDS))
+        for kind, field in ((SUN_BEATS_DOWN, 3), (STORM_PICKS_UP, 4)):
+            cards = sum(count for (card_kind, _), count in zip(CARD_TYPES, full_deck) if card_kind == kind)
+            already = sum(count for (card_kind, _), count in zip(CARD_TYPES, drawn) if card_kind == kind)
+            chances = [0.0] * (already + draws + 1)
+            for probability, outcome in result:
+                chances[outcome[field]] += probability
+            for k in range(draws + 1):
+                expected = comb(cards, k) * comb(STORM_CARDS - cards, draws - k) / comb(STORM_CARDS, draws)
+                self.assertAlmostEqual(chances[already + k], expected, places=12)
+
+    def test_large_draws_are_exact(self):
+        result = storm_forecast(card_counts(range(STORM_CARDS)), card_counts([]), 12, 5)
+        self.assertAlmostEqual(sum(probability for probability, _ in result), 1.0, places=12)
+        self.check_counts(result, card_counts([]), 5)
+
+    def test_reshuffle(self):
+        # 6 cards, with the whole deck shuffled back in after the first 2
+        result = storm_forecast(card_counts([0, 30]), card_counts(range(1, 30)), 12, 6)
+        self.assertAlmostEqual(sum(probability for probability, _ in result), 1.0, places=12)
+        self.check_counts(result, card_counts([0, 30]), 4)
+        self.assertIs(storm_forecast(card_counts([0, 30]), card_counts(range(1, 30)), 12, 6), result)
+
+    def test_cache_is_bounded_by_outcomes(self):
+        cached_outcomes = forecast.CACHED_OUTCOMES
+        forecast.CACHED_OUTCOMES = 2000
+        try:
+            for storm_cell in range(CELLS):
+                storm_forecast(card_counts(range(STORM_CARDS)), card_counts([]), storm_cell, 3)
+                self.assertLessEqual(forecast._cached_outcomes, 2000)
+        finally:
+            forecast.CACHED_OUTCOMES = cached_outcomes
+            clear_forecasts()
+
+    def test_forecast_of_a_compact_game(self):
+        state = GameState(seed="forecast")
+        state.start()
+        result = forecast_state(state.s)
+        self.assertAlmostEqual(sum(probability for probability, _ in result), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
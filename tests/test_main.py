@@ -0,0 +1,51 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "code"))
+from game import *
+
+
+class MainTest(unittest.TestCase):
+    """
+    main with worker processes against main alone: the same seeded games, whichever process plays them and in
+    whatever order their results come back, add up to the same statistics and logs.
+    """
+
+    def run_main(self, workers):
+        # The Stats of the run, and the logs of its games by game number
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    stats = main(24, workers, seed="main")
+                archive = LogArchive(os.path.join("game_logs", "game_logs"))
+                return stats, [archive.read(game) for game in archive.games()]
+            finally:
+                os.chdir(cwd)
+
+    def test_workers_play_the_same_games(self):
+        serial_stats, serial_logs = self.run_main(1)
+        stats, logs = self.run_main(2)
+        self.assertEqual(len(logs), 24)
+        self.assertEqual(logs, serial_logs)
+        self.assertEqual(stats.games, serial_stats.games)
+        self.assertEqual(stats.outcomes, serial_stats.outcomes)
+        for metric, stat in stats.metrics.items():
+            serial_stat = serial_stats.metrics[metric]
+            self.assertEqual(stat.histogram, serial_stat.histogram, metric)
+            self.assertEqual(stat.total, serial_stat.total, metric)
+            # Updated online, so the order the games came back in shows in the last digits
+            self.assertAlmostEqual(stat.variance(), serial_stat.variance(), msg=metric)
+        row, serial_row = stats.row(), serial_stats.row()
+        for column, value in row.items():
+            if not column.endswith("_std"):
+                self.assertEqual(value, serial_row[column], column)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "code"))
+from game import *
+
+
+def rebuilt_index(game):
+    # The bitboards, occupancy and adventurer cells worked out from the tiles alone, see Tile.update_bitboards
+    boards = dict.fromkeys(("blocked", "flipped", "sand", "tunnel", "storm"), 0)
+    occupancy = [0] * CELLS
+    adventurer_cells = [None] * len(game.adventurer_list)
+    for tile in game.tile_list:
+        bit = 1 << tile.cell
+        for name, is_set in (
+            ("blocked", tile.blocked),
+            ("flipped", tile.flipped),
+            ("sand", tile.sand),
+            ("tunnel", tile.is_tunnel),
+            ("storm", tile.is_storm),
+        ):
+            if is_set:
+                boards[name] |= bit
+        for index in tile.occupants:
+            occupancy[tile.cell] |= 1 << index
+            adventurer_cells[index] = tile.cell
+    return boards, occupancy, adventurer_cells
+
+
+def kept_index(game):
+    # The same, as the game keeps it up to date
+    boards = {
+        "blocked": game.blocked_board,
+        "flipped": game.flipped_board,
+        "sand": game.sand_board,
+        "tunnel": game.tunnel_board,
+        "storm": game.storm_board,
+    }
+    return boards, list(game.occupancy), list(game.adventurer_cells)
+
+
+class OccupancyTest(unittest.TestCase):
+    """
+    The bitboards and the occupancy index kept up to date as the game changes, against the ones rebuilt from the
+    tiles, through actions, storm draws, undo and reset.
+    """
+
+    def check(self, game):
+        self.assertEqual(kept_index(game), rebuilt_index(game), f"seed {game.seed}, round {game.round}")
+        for tile in game.tile_list:
+            self.assertIs(game.cell_to_tile[tile.cell], tile)
+            for index in tile.occupants:
+                self.assertIs(game.adventurer_list[index].tile, tile)
+        self.assertEqual(game.dry_adventurers, sum(adventurer.water <= 0 for adventurer in game.adventurer_list))
+
+    def test_index_matches_the_tiles(self):
+        def policy(game, adventurer, possible_actions):
+            self.check(game)
+            action = game.policy_rng.choice(possible_actions)
+            if action[0] != "pass":
+                game.perform_action(adventurer, action)
+                self.check(game)
+                game.undo()
+                self.check(game)
+            return action
+
+        for seed in range(100):
+            game = Game(seed=f"occupancy:{seed}", policy=policy)
+            game.enable_undo()
+            self.check(game)
+            game.start_game()
+            self.check(game)
+
+    def test_reset_game_matches_a_new_game(self):
+        game = Game(seed="occupancy")
+        for seed in range(20):
+            game.start_game()
+            game.reset(seed=f"occupancy:{seed}")
+            self.check(game)
+            new_game = Game(seed=f"occupancy:{seed}")
+            self.assertEqual(kept_index(game), kept_index(new_game))
+            self.assertEqual([rng.getstate() for rng in game.rngs()], [rng.getstate() for rng in new_game.rngs()])
+
+
+if __name__ == "__main__":
+    unittest.main()
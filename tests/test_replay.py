@@ -0,0 +1,65 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "code"))
+from replay import *
+
+
+def recorded_game(seed):
+    # A game played and recorded, with its board log
+    log_file = io.StringIO()
+    game = Game(log_file, seed=seed, record=True)
+    game.start_game()
+    return game, log_file.getvalue()
+
+
+class ReplayTest(unittest.TestCase):
+    """
+    Replay of the records written by Game(record=True): a replayed game logs and ends like the game played,
+    and records cut short or corrupted are rejected.
+    """
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            for seed in range(20):
+                game, log = recorded_game(f"replay:{seed}")
+                path = os.path.join(log_dir, f"game_record_{seed}.bin")
+                with open(path, "wb") as record_file:
+                    record_file.write(game.recorder.record())
+
+                replay = Replay.from_file(path)
+                self.assertEqual(replay.seed, f"replay:{seed}")
+                replay_log = io.StringIO()
+                replayed = replay.game(log_file=replay_log)
+                self.assertEqual(replay_log.getvalue(), log, f"seed {seed}")
+                self.assertEqual(replayed.snapshot(), game.snapshot(), f"seed {seed}")
+                self.assertEqual(replayed.outcome, game.outcome)
+
+    def test_replay_up_to_an_action(self):
+        game, _ = recorded_game("replay")
+        replay = Replay(game.recorder.record())
+        partial = replay.game(replay.actions // 2)
+        self.assertFalse(partial.is_game_over)
+        self.assertLess(partial.round, game.round)
+
+    def test_truncated_record(self):
+        record = recorded_game("replay")[0].recorder.record()
+        for length in range(len(record)):
+            with self.assertRaises(ReplayError, msg=f"{length} bytes"):
+                Replay(record[:length])
+
+    def test_corrupted_record(self):
+        record = recorded_game("replay")[0].recorder.record()
+        for position in range(len(record)):
+            for bit in range(8):
+                corrupted = bytearray(record)
+                corrupted[position] ^= 1 << bit
+                with self.assertRaises(ReplayError, msg=f"byte {position}, bit {bit}"):
+                    Replay(bytes(corrupted))
+
+
+if __name__ == "__main__":
+    unittest.main()
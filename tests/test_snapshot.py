@@ -0,0 +1,43 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "code"))
+from game import *
+
+
+class SnapshotTest(unittest.TestCase):
+    """
+    Game.snapshot, restore and clone.
+    """
+
+    def test_restore_returns_to_the_snapshot(self):
+        for seed in range(50):
+            game = Game(seed=f"snapshot:{seed}")
+            game.deck.draw()
+            snapshot = game.snapshot()
+            key = game.position_key()
+            game.start_game()
+            game.restore(snapshot)
+            self.assertEqual(game.snapshot(), snapshot)
+            self.assertEqual(game.position_key(), key)
+
+    def test_clone_plays_on_like_the_game(self):
+        for seed in range(50):
+            game = Game(seed=f"snapshot:{seed}")
+            game.deck.draw()
+            copy = game.clone()
+            self.assertEqual(copy.snapshot(), game.snapshot())
+            copy.start_game()
+            game.start_game()
+            self.assertEqual(copy.snapshot(), game.snapshot())
+
+    def test_clone_is_independent(self):
+        game = Game(seed="snapshot")
+        snapshot = game.snapshot()
+        game.clone().start_game()
+        self.assertEqual(game.snapshot(), snapshot)
+
+
+if __name__ == "__main__":
+    unittest.main()
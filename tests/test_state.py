@@ -0,0 +1,127 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "code"))
+from game import *
+from state import *
+
+OUTCOMES = {"water": LOST_WATER, "sand": LOST_SAND, "storm": LOST_STORM, "won": WON}
+
+
+def random_choice(rng, actions):
+    return rng.randrange(len(actions))
+
+
+def busy_choice(rng, actions):
+    # Shares and uses items whenever it can, and never passes otherwise, to reach the rarer actions
+    sharing = [i for i, action in enumerate(actions) if action[0] in (GIVE_ITEM, GIVE_WATER, USE_ITEM)]
+    if sharing:
+        return sharing[rng.randrange(len(sharing))]
+    return 1 + rng.randrange(len(actions) - 1) if len(actions) > 1 else 0
+
+
+def play_game(seed, choose):
+    # The actions offered at every decision, translated with compact_action, and how the game ended
+    offered = []
+
+    def policy(game, adventurer, possible_actions):
+        actions = [compact_action(game, adventurer, action) for action in possible_actions]
+        offered.append(actions)
+        return possible_actions[choose(game.policy_rng, actions)]
+
+    game = Game(seed=seed, policy=policy)
+    game.start_game()
+    return offered, (game.round, OUTCOMES[game.outcome])
+
+
+def play_state(seed, choose):
+    offered = []
+    state = GameState(seed=seed)
+    state.start()
+    while not state.outcome:
+        actions = state.legal_actions(state.current_adventurer)
+        offered.append(actions)
+        state.step(actions[choose(state.policy_rng, actions)])
+    return offered, (state.s[ROUND], state.outcome)
+
+
+class GameStateTest(unittest.TestCase):
+    """
+    The compact engine against Game: with the same seed and the same choices, both offer the same actions in
+    the same order at every decision, and the games end the same way.
+    """
+
+    def check_same_games(self, seeds, choose):
+        for seed in seeds:
+            game_actions, game_end = play_game(seed, choose)
+            state_actions, state_end = play_state(seed, choose)
+            for decision, (actions, compact_actions) in enumerate(zip(game_actions, state_actions)):
+                self.assertEqual(compact_actions, actions, f"seed {seed}, decision {decision}")
+            self.assertEqual(len(state_actions), len(game_actions), f"seed {seed}")
+            self.assertEqual(state_end, game_end, f"seed {seed}")
+
+    def test_random_play(self):
+        self.check_same_games([f"state:{i}" for i in range(300)], random_choice)
+
+    def test_busy_play(self):
+        self.check_same_games([f"state:{i}" for i in range(300)], busy_choice)
+
+    def test_play_matches_stepping(self):
+        for i in range(100):
+            played = GameState(seed=f"state:{i}")
+            played.play()
+            stepped = GameState(seed=f"state:{i}")
+            stepped.start()
+            while not stepped.outcome:
+                stepped.step(stepped.policy_rng.choice(stepped.legal_actions(stepped.current_adventurer)))
+            self.assertEqual(stepped.s, played.s)
+
+    def draw_on_both(self, game):
+        # Draws the storm on the game and on its compact state, and checks that both end up the same
+        state = GameState.from_game(game)
+        game.deck.draw()
+        state.draw_storm()
+        water = [adventurer.water for adventurer in game.adventurer_list]
+        self.assertEqual(state.s[WATER_LEFT:WATER_LEFT + ADVENTURERS], water, f"seed {game.seed}")
+        self.assertEqual(state.outcome, OUTCOMES[game.outcome] if game.is_game_over else PLAYING, f"seed {game.seed}")
+        return water
+
+    def test_storm_ends_the_game_when_water_runs_out(self):
+        # The game is lost in the middle of the draw, without waiting for check_game_status
+        dried = 0
+        for i in range(100):
+            game = Game(seed=f"state:{i}")
+            game.set_player_order()
+            for adventurer in game.adventurer_list:
+                adventurer.water = 1
+            water = self.draw_on_both(game)
+            if 0 in water:
+                dried += 1
+                self.assertEqual(game.outcome, "water")
+        self.assertGreater(dried, 0)
+
+    def test_storm_level_ends_the_game_before_water(self):
+        for i in range(20):
+            game = Game(seed=f"state:{i}")
+            game.set_player_order()
+            game.sand_storm_level = 16
+            for adventurer in game.adventurer_list:
+                adventurer.water = 1
+            self.draw_on_both(game)
+            self.assertEqual(game.outcome, "storm")
+
+    def test_from_game(self):
+        # The compact state of a game in progress plays on like the game
+        for i in range(50):
+            game = Game(seed=f"state:{i}")
+            game.set_player_order()
+            game.deck.draw()
+            state = GameState.from_game(game)
+            for adventurer in game.player_order[:2]:
+                actions = [compact_action(game, adventurer, action) for action in game.get_possible_actions(adventurer)]
+                self.assertEqual(state.legal_actions(adventurer.index), actions)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "code"))
+from stats import *
+
+
+class RunningStatTest(unittest.TestCase):
+    """
+    RunningStat against the statistics computed from all the values at once.
+    """
+
+    def test_statistics(self):
+        values = [2, 3, 2, 2, 3, 2, 2, 3, 2, 2, 5, 1]
+        stat = RunningStat()
+        for value in values:
+            stat.add(value)
+        mean = sum(values) / len(values)
+        self.assertEqual(stat.average(), mean)
+        self.assertAlmostEqual(stat.mean, mean)
+        self.assertAlmostEqual(stat.variance(), sum((value - mean) ** 2 for value in values) / (len(values) - 1))
+        self.assertEqual((stat.minimum(), stat.maximum()), (1, 5))
+        self.assertEqual(stat.quantile(0.5), 2)
+        self.assertEqual(stat.quantile(0.9), 3)
+
+    def test_average_is_exact(self):
+        stat = RunningStat()
+        for value in [2] * 7 + [3] * 3:
+            stat.add(value)
+        self.assertEqual(str(stat.average()), "2.3")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "code"))
+from game import *
+
+
+class UndoTest(unittest.TestCase):
+    """
+    Game.undo against snapshots: every action and storm draw, undone, leaves the game as it was.
+    """
+
+    def test_undo_reverts_every_action(self):
+        def policy(game, adventurer, possible_actions):
+            action = game.policy_rng.choice(possible_actions)
+            if action[0] != "pass":
+                before = game.snapshot()
+                game.perform_action(adventurer, action)
+                game.undo()
+                self.assertEqual(game.snapshot(), before, f"seed {game.seed}, {action}")
+            return action
+
+        for seed in range(100):
+            game = Game(seed=f"undo:{seed}", policy=policy)
+            game.enable_undo()
+            game.start_game()
+
+    def test_undo_reverts_storm_draws(self):
+        for seed in range(100):
+            game = Game(seed=f"undo:{seed}")
+            game.enable_undo()
+            for _ in range(20):
+                before = game.snapshot()
+                game.deck.draw()
+                after = game.snapshot()
+                game.undo()
+                self.assertEqual(game.snapshot(), before, f"seed {game.seed}")
+                game.restore(after)
+                if game.is_game_over:
+                    break
+
+    def test_undo_many_steps(self):
+        # Actions and storm draws undone in reverse order, back to the start
+        for seed in range(100):
+            game = Game(seed=f"undo:{seed}")
+            game.enable_undo()
+            game.set_player_order()
+            start = game.snapshot()
+            for step in range(60):
+                adventurer = game.player_order[step % len(game.player_order)]
+                action = game.policy_rng.choice(game.get_possible_actions(adventurer))
+                if action[0] == "pass":
+                    game.deck.draw()
+                else:
+                    game.perform_action(adventurer, action)
+                if game.is_game_over:
+                    break
+            while game.undo_stack:
+                game.undo()
+            self.assertEqual(game.snapshot(), start, f"seed {game.seed}")
+
+
+if __name__ == "__main__":
+    unittest.main()
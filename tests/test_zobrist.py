@@ -0,0 +1,66 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "code"))
+from game import *
+
+
+def full_key(game):
+    # The Zobrist key computed from scratch, see Game.rehash
+    key = 0
+    for component in game.components():
+        key ^= component.zobrist_key()
+    return key
+
+
+class ZobristTest(unittest.TestCase):
+    """
+    The Zobrist key kept up to date as the game changes (see Game.position_key), against the key computed from
+    scratch, and through undo and clone.
+    """
+
+    def test_incremental_key_matches_full_key(self):
+        def policy(game, adventurer, possible_actions):
+            game.position_key()
+            self.assertEqual(game.zobrist, full_key(game))
+            action = game.policy_rng.choice(possible_actions)
+            if action[0] != "pass":
+                before = game.position_key()
+                game.perform_action(adventurer, action)
+                game.undo()
+                self.assertEqual(game.position_key(), before)
+            return action
+
+        for seed in range(100):
+            game = Game(seed=f"zobrist:{seed}", policy=policy)
+            game.enable_undo()
+            game.start_game()
+            game.position_key()
+            self.assertEqual(game.zobrist, full_key(game))
+
+    def test_clone_has_the_same_key(self):
+        game = Game(seed="zobrist")
+        game.deck.draw()
+        self.assertEqual(game.clone().position_key(), game.position_key())
+
+    def test_cards_still_to_come_change_the_key(self):
+        # Same number of cards left, but a different card discarded
+        game = Game(seed="zobrist")
+        game.deck.draw()
+        other_game = game.clone()
+        other_game.touch(other_game.deck)
+        deck, discard_pile = other_game.deck.deck, other_game.deck.discard_pile
+        deck[0], discard_pile[0] = discard_pile[0], deck[0]
+        self.assertNotEqual(other_game.position_key(), game.position_key())
+
+        game.gear_deck.draw(game.adventurer_list[0])
+        other_game = game.clone()
+        other_game.touch(other_game.gear_deck)
+        drawn_card = next(card for card in range(len(ALL_GEAR_CARDS)) if card not in game.gear_deck.gear_deck)
+        other_game.gear_deck.gear_deck[0] = drawn_card
+        self.assertNotEqual(other_game.position_key(), game.position_key())
+
+
+if __name__ == "__main__":
+    unittest.main()